@@ -0,0 +1,58 @@
+# ============================================================================
+# ALEMBIC/ENV.PY — Migration Runtime
+# ============================================================================
+# Runs migrations on the app's own synchronous engine (same DATABASE_URL
+# normalisation and SSL handling as app/core/database.py).
+#
+# Several uvicorn workers upgrade on boot at the same time, so the run is
+# serialised with a Postgres advisory lock: the first worker migrates, the
+# others wait and then find nothing left to do.
+# ============================================================================
+
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import text
+
+from app.core.database import Base, engine
+from app.models import analysis, pr_analysis, pull_request, repository, user  # noqa: F401
+
+# Arbitrary app-wide key for pg_advisory_lock
+MIGRATION_LOCK_KEY = 7_404_211
+
+config = context.config
+if config.config_file_name is not None and config.attributes.get("configure_logger", True):
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+
+def run_migrations_offline() -> None:
+    """Emit SQL to stdout (alembic upgrade head --sql)."""
+    context.configure(
+        url=engine.url.render_as_string(hide_password=False),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    with engine.connect() as connection:
+        connection.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        connection.commit()  # session-level lock outlives the transaction
+        try:
+            context.configure(connection=connection, target_metadata=target_metadata)
+            with context.begin_transaction():
+                context.run_migrations()
+        finally:
+            connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+            connection.commit()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,127 @@
+"""Baseline: the schema the app used to create with create_all()
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19
+
+Databases created before migrations existed already have these tables,
+so each one is only created when missing — upgrading such a database
+adopts it instead of failing.
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _missing(table: str) -> bool:
+    return not sa.inspect(op.get_bind()).has_table(table)
+
+
+def upgrade() -> None:
+    if _missing("users"):
+        op.create_table(
+            "users",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("github_id", sa.String(), nullable=False),
+            sa.Column("username", sa.String(), nullable=False),
+            sa.Column("email", sa.String(), nullable=True),
+            sa.Column("avatar_url", sa.String(), nullable=True),
+            sa.Column("access_token", sa.Text(), nullable=False),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+            sa.Column("updated_at", sa.DateTime(timezone=True)),
+        )
+        op.create_index("ix_users_id", "users", ["id"])
+        op.create_index("ix_users_github_id", "users", ["github_id"], unique=True)
+        op.create_index("ix_users_username", "users", ["username"])
+        op.create_index("ix_users_email", "users", ["email"])
+
+    if _missing("repositories"):
+        op.create_table(
+            "repositories",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("repo_name", sa.String(), nullable=False),
+            sa.Column("repo_url", sa.String(), nullable=False),
+            sa.Column("github_repo_id", sa.String(), nullable=False),
+            sa.Column("description", sa.Text(), nullable=True),
+            sa.Column("last_analyzed_at", sa.DateTime(timezone=True), nullable=True),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+            sa.Column("updated_at", sa.DateTime(timezone=True)),
+        )
+        op.create_index("ix_repositories_id", "repositories", ["id"])
+        op.create_index("ix_repositories_github_repo_id", "repositories", ["github_repo_id"], unique=True)
+
+    if _missing("pull_requests"):
+        op.create_table(
+            "pull_requests",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("repository_id", sa.Integer(), sa.ForeignKey("repositories.id"), nullable=False),
+            sa.Column("pr_number", sa.Integer(), nullable=False),
+            sa.Column("title", sa.String(), nullable=False),
+            sa.Column("description", sa.Text(), nullable=True),
+            sa.Column("author", sa.String(), nullable=False),
+            sa.Column("state", sa.String(), nullable=False),
+            sa.Column("base_branch", sa.String(), nullable=False),
+            sa.Column("head_branch", sa.String(), nullable=False),
+            sa.Column("github_pr_id", sa.String(), nullable=False),
+            sa.Column("html_url", sa.String(), nullable=False),
+            sa.Column("files_changed", sa.Integer()),
+            sa.Column("lines_added", sa.Integer()),
+            sa.Column("lines_removed", sa.Integer()),
+            sa.Column("last_analyzed_at", sa.DateTime(timezone=True), nullable=True),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+            sa.Column("updated_at", sa.DateTime(timezone=True)),
+        )
+        op.create_index("ix_pull_requests_id", "pull_requests", ["id"])
+        op.create_index("ix_pull_requests_github_pr_id", "pull_requests", ["github_pr_id"], unique=True)
+
+    if _missing("analysis_results"):
+        op.create_table(
+            "analysis_results",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("repository_id", sa.Integer(), sa.ForeignKey("repositories.id"), nullable=False),
+            sa.Column("commit_hash", sa.String(), nullable=False),
+            sa.Column("summary", sa.Text(), nullable=False),
+            sa.Column("changes_data", sa.JSON(), nullable=False),
+            sa.Column("risk_level", sa.String(), nullable=False),
+            sa.Column("files_changed", sa.Integer()),
+            sa.Column("lines_added", sa.Integer()),
+            sa.Column("lines_removed", sa.Integer()),
+            sa.Column("maintainability_score", sa.Integer()),
+            sa.Column("security_score", sa.Integer()),
+            sa.Column("performance_score", sa.Integer()),
+            sa.Column("dependency_complexity", sa.Integer()),
+            sa.Column("technical_debt_ratio", sa.Integer()),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        )
+        op.create_index("ix_analysis_results_id", "analysis_results", ["id"])
+
+    if _missing("pr_analysis_results"):
+        op.create_table(
+            "pr_analysis_results",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("repository_id", sa.Integer(), sa.ForeignKey("repositories.id"), nullable=False),
+            sa.Column("pull_request_id", sa.Integer(), sa.ForeignKey("pull_requests.id"), nullable=True),
+            sa.Column("pr_number", sa.Integer(), nullable=False),
+            sa.Column("summary", sa.Text(), nullable=False),
+            sa.Column("full_analysis", sa.Text(), nullable=False),
+            sa.Column("risk_level", sa.String(), nullable=False),
+            sa.Column("change_type", sa.String(), nullable=False),
+            sa.Column("files_changed", sa.Integer()),
+            sa.Column("lines_added", sa.Integer()),
+            sa.Column("lines_removed", sa.Integer()),
+            sa.Column("overall_score", sa.Integer()),
+            sa.Column("analysis_data", sa.JSON(), nullable=False),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        )
+        op.create_index("ix_pr_analysis_results_id", "pr_analysis_results", ["id"])
+
+
+def downgrade() -> None:
+    for table in ("pr_analysis_results", "analysis_results", "pull_requests", "repositories", "users"):
+        op.drop_table(table)
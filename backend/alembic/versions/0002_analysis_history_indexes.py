@@ -0,0 +1,67 @@
+"""Indexes for analysis history lookups + one analysis per commit
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19
+
+- analysis_results (repository_id, commit_hash): UNIQUE. Serves the
+  create_analysis dedupe check and stops concurrent requests from storing
+  the same commit twice. Existing duplicates are removed first, keeping
+  the oldest row (the one create_analysis has been returning).
+- analysis_results (repository_id, created_at DESC): history listing,
+  newest first, read straight off the index without a sort.
+- pr_analysis_results (repository_id, pr_number): per-PR lookups.
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def _existing_names(table: str) -> set[str]:
+    # Tables created by create_all() from the current models already have them
+    inspector = sa.inspect(op.get_bind())
+    return (
+        {i["name"] for i in inspector.get_indexes(table)}
+        | {c["name"] for c in inspector.get_unique_constraints(table)}
+    )
+
+
+def upgrade() -> None:
+    analysis_names = _existing_names("analysis_results")
+
+    if "uq_analysis_results_repository_commit" not in analysis_names:
+        op.execute(
+            """
+            DELETE FROM analysis_results a
+            USING analysis_results b
+            WHERE a.repository_id = b.repository_id
+              AND a.commit_hash = b.commit_hash
+              AND a.id > b.id
+            """
+        )
+        op.create_unique_constraint(
+            "uq_analysis_results_repository_commit", "analysis_results", ["repository_id", "commit_hash"]
+        )
+
+    if "ix_analysis_results_repository_created" not in analysis_names:
+        op.create_index(
+            "ix_analysis_results_repository_created",
+            "analysis_results",
+            ["repository_id", sa.text("created_at DESC")],
+        )
+
+    if "ix_pr_analysis_results_repository_pr" not in _existing_names("pr_analysis_results"):
+        op.create_index(
+            "ix_pr_analysis_results_repository_pr", "pr_analysis_results", ["repository_id", "pr_number"]
+        )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_pr_analysis_results_repository_pr", table_name="pr_analysis_results")
+    op.drop_index("ix_analysis_results_repository_created", table_name="analysis_results")
+    op.drop_constraint("uq_analysis_results_repository_commit", "analysis_results", type_="unique")
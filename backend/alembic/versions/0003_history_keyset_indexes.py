@@ -0,0 +1,57 @@
+"""Keyset pagination indexes on (created_at DESC, id DESC)
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19
+
+History pages are ordered by (created_at DESC, id DESC) and continue from
+a cursor with a row comparison, so the indexes need id as a tie-breaker:
+- analysis_results (repository_id, created_at DESC, id DESC) replaces
+  ix_analysis_results_repository_created
+- (created_at DESC, id DESC) on both tables for the unfiltered history
+- pr_analysis_results (repository_id, created_at DESC, id DESC)
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+NEWEST_FIRST = [sa.text("created_at DESC"), sa.text("id DESC")]
+
+
+def _existing_indexes(table: str) -> set[str]:
+    return {i["name"] for i in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade() -> None:
+    analysis_indexes = _existing_indexes("analysis_results")
+    if "ix_analysis_results_repository_created" in analysis_indexes:
+        op.drop_index("ix_analysis_results_repository_created", table_name="analysis_results")
+    if "ix_analysis_results_repository_created_id" not in analysis_indexes:
+        op.create_index(
+            "ix_analysis_results_repository_created_id", "analysis_results", ["repository_id", *NEWEST_FIRST]
+        )
+    if "ix_analysis_results_created_id" not in analysis_indexes:
+        op.create_index("ix_analysis_results_created_id", "analysis_results", NEWEST_FIRST)
+
+    pr_indexes = _existing_indexes("pr_analysis_results")
+    if "ix_pr_analysis_results_repository_created_id" not in pr_indexes:
+        op.create_index(
+            "ix_pr_analysis_results_repository_created_id", "pr_analysis_results", ["repository_id", *NEWEST_FIRST]
+        )
+    if "ix_pr_analysis_results_created_id" not in pr_indexes:
+        op.create_index("ix_pr_analysis_results_created_id", "pr_analysis_results", NEWEST_FIRST)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_pr_analysis_results_created_id", table_name="pr_analysis_results")
+    op.drop_index("ix_pr_analysis_results_repository_created_id", table_name="pr_analysis_results")
+    op.drop_index("ix_analysis_results_created_id", table_name="analysis_results")
+    op.drop_index("ix_analysis_results_repository_created_id", table_name="analysis_results")
+    op.create_index(
+        "ix_analysis_results_repository_created", "analysis_results", ["repository_id", sa.text("created_at DESC")]
+    )
@@ -0,0 +1,50 @@
+"""Compress the report blobs with lz4
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19
+
+changes_data, analysis_data and full_analysis are large and only read on
+detail views. Postgres already moves values over ~2 KB out of the row into
+the table's TOAST relation (a compressed side table), so list scans don't
+drag them along; this switches that compression from pglz to lz4, which
+is several times faster to decompress at a similar ratio.
+
+Needs PostgreSQL 14+ built with lz4 — otherwise it is skipped. Applies to
+newly written values; existing rows keep pglz until rewritten.
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+REPORT_COLUMNS = [
+    ("analysis_results", "changes_data"),
+    ("pr_analysis_results", "analysis_data"),
+    ("pr_analysis_results", "full_analysis"),
+]
+
+
+def _lz4_available() -> bool:
+    return bool(op.get_bind().execute(sa.text(
+        "SELECT 1 FROM pg_settings WHERE name = 'default_toast_compression' AND 'lz4' = ANY(enumvals)"
+    )).scalar())
+
+
+def _set_compression(method: str) -> None:
+    if not _lz4_available():
+        return
+    for table, column in REPORT_COLUMNS:
+        op.execute(f"ALTER TABLE {table} ALTER COLUMN {column} SET COMPRESSION {method}")
+
+
+def upgrade() -> None:
+    _set_compression("lz4")
+
+
+def downgrade() -> None:
+    _set_compression("pglz")
@@ -0,0 +1,31 @@
+"""Index users by sha256 of their GitHub token
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19
+
+get_github_user() looked users up by the raw access_token (unindexed
+TEXT). It now looks them up by access_token_hash, backfilled here with
+Postgres' built-in sha256() (PostgreSQL 11+).
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("users", sa.Column("access_token_hash", sa.String(length=64), nullable=True))
+    op.execute(
+        "UPDATE users SET access_token_hash = encode(sha256(convert_to(access_token, 'UTF8')), 'hex')"
+    )
+    op.create_index("ix_users_access_token_hash", "users", ["access_token_hash"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_users_access_token_hash", table_name="users")
+    op.drop_column("users", "access_token_hash")
@@ -0,0 +1,27 @@
+"""Link analysis rows to their RAG document
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19
+
+Deleting an analysis removed every RAG vector of the same commit hash,
+including analyses stored for other repositories. Rows now record the
+document id store_analysis() returned; rows without one (stored before
+this revision) fall back to commit hash + exact repository name.
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("analysis_results", sa.Column("rag_document_id", sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("analysis_results", "rag_document_id")
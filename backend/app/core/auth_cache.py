@@ -0,0 +1,86 @@
+# ============================================================================
+# CORE/AUTH_CACHE.PY — GitHub Token → User Resolution Cache
+# ============================================================================
+# get_github_user() runs on every authenticated request. Resolving the
+# token used to cost a DB query on an unindexed column, and an unknown
+# (often simply invalid) token cost a GitHub /user round trip as well.
+#
+# Tokens are never stored or used as keys in clear — everything is keyed by
+# sha256(token) (users.access_token_hash in the DB, indexed). Two layers:
+#   - in-process dict: LOCAL_TTL_SECONDS, bounded to LOCAL_MAX_ENTRIES, so
+#     a burst of requests from one user costs no I/O at all
+#   - Redis auth:token:{hash}: TTL_AUTH_TOKEN, shared by all workers
+# Each entry holds the user's profile columns (never the token itself) or an
+# "invalid" marker (TTL_AUTH_TOKEN_INVALID) when GitHub rejected the token,
+# so retries with a bad token don't hit GitHub again.
+#
+# When a user's token is replaced (OAuth login, re-verification through
+# GitHub) the old hash is invalidated after the commit; other workers'
+# in-process copies expire within LOCAL_TTL_SECONDS.
+# ============================================================================
+
+import time
+from typing import Any
+
+from app.core.redis import TTL_AUTH_TOKEN, TTL_AUTH_TOKEN_INVALID, CacheManager
+
+LOCAL_TTL_SECONDS = 30
+LOCAL_MAX_ENTRIES = 10_000
+
+# Cached for a rejected token
+INVALID = {"invalid": True}
+
+# User columns kept in the cache (access_token comes from the request)
+USER_FIELDS = ("id", "github_id", "username", "email", "avatar_url")
+
+
+class TokenCache:
+    def __init__(self):
+        self._local: dict[str, tuple[float, dict[str, Any]]] = {}
+        self.stats = {"local_hits": 0, "redis_hits": 0, "misses": 0, "invalid_hits": 0}
+
+    def get(self, token_hash: str) -> dict[str, Any] | None:
+        """Cached user fields, INVALID, or None when unknown."""
+        entry = self._local.get(token_hash)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._count(value, "local_hits")
+                return value
+            del self._local[token_hash]
+
+        value = CacheManager.get_json(f"auth:token:{token_hash}")
+        if value is None:
+            self.stats["misses"] += 1
+            return None
+        self._remember(token_hash, value)
+        self._count(value, "redis_hits")
+        return value
+
+    def set_user(self, token_hash: str, user) -> None:
+        value = {field: getattr(user, field) for field in USER_FIELDS}
+        CacheManager.set_json(f"auth:token:{token_hash}", value, TTL_AUTH_TOKEN)
+        self._remember(token_hash, value)
+
+    def set_invalid(self, token_hash: str) -> None:
+        CacheManager.set_json(f"auth:token:{token_hash}", INVALID, TTL_AUTH_TOKEN_INVALID)
+        self._remember(token_hash, INVALID)
+
+    def invalidate(self, token_hash: str) -> None:
+        CacheManager.delete(f"auth:token:{token_hash}")
+        self._local.pop(token_hash, None)
+
+    def _remember(self, token_hash: str, value: dict[str, Any]) -> None:
+        if len(self._local) >= LOCAL_MAX_ENTRIES:
+            now = time.monotonic()
+            self._local = {k: v for k, v in self._local.items() if v[0] > now}
+            if len(self._local) >= LOCAL_MAX_ENTRIES:
+                self._local.pop(next(iter(self._local)))  # oldest insertion
+        self._local[token_hash] = (time.monotonic() + LOCAL_TTL_SECONDS, value)
+
+    def _count(self, value: dict[str, Any], hit: str) -> None:
+        self.stats["invalid_hits" if value.get("invalid") else hit] += 1
+
+
+# Create global instance
+token_cache = TokenCache()
@@ -38,6 +38,157 @@ class Settings(BaseSettings):
     #   ALLOWED_ORIGINS=https://myapp.vercel.app,https://myapp.com
     ALLOWED_ORIGINS: str = "http://localhost:3000,http://localhost:3001,http://localhost:3002,http://localhost:3003"
 
+    # RAG — chunked indexing stores every finding, recommendation and
+    # file-level summary as its own vector that points back to its analysis
+    RAG_CHUNKED_INDEXING: bool = True
+    RAG_MAX_CHUNKS_PER_ANALYSIS: int = 40
+    RAG_CHUNK_OVERSAMPLE: int = 4  # chunk hits fetched per requested analysis
+
+    # RAG — hybrid retrieval fuses a local BM25 keyword index with vectors;
+    # keyword hits at/above this confidence are served without embedding
+    RAG_HYBRID_SEARCH: bool = True
+    RAG_LEXICAL_FASTPATH_CONFIDENCE: float = 0.8
+    RAG_RRF_K: int = 60
+
+    # RAG — HNSW (approximate nearest neighbour) index parameters. These are
+    # fixed when a collection is created; changing them needs a re-index.
+    RAG_HNSW_SPACE: str = "l2"  # l2 | cosine | ip
+    RAG_HNSW_M: int = 16  # graph degree — higher = better recall, more memory
+    RAG_HNSW_CONSTRUCTION_EF: int = 100
+    RAG_HNSW_SEARCH_EF: int = 64  # query beam width — recall vs latency knob
+
+    # RAG — compact vector storage. When RAG_VECTOR_DIMENSIONS is set, only
+    # the leading N dims are indexed and candidates are reranked on the full
+    # vector kept in metadata as int8 (or float16). None = full 3072 dims.
+    # Changing it (or the codec) switches to new collections; the first
+    # start copies the stored vectors into them (no re-embedding, see RAGService)
+    RAG_VECTOR_DIMENSIONS: int | None = None
+    RAG_VECTOR_QUANTIZATION: str = "int8"  # int8 | float16
+    RAG_RERANK_OVERSAMPLE: int = 3
+
+    # RAG — retention policies, enforced by the background compactor
+    # (None / 0 disables a policy; interval 0 disables the compactor).
+    # Age and per-repo caps DELETE stored analyses, so they are opt-in
+    RAG_RETENTION_MAX_AGE_DAYS: int | None = None
+    RAG_RETENTION_MAX_DOCS_PER_REPO: int | None = None
+    RAG_RETENTION_KEEP_LATEST_PER_COMMIT: bool = True
+    RAG_COMPACTION_INTERVAL_SECONDS: int = 3600
+
+    # LLM prompts — token budget for the diff section of each prompt; files
+    # and hunks are packed riskiest-first (see services/context_packer.py)
+    LLM_CONTEXT_TOKEN_BUDGET: int = 12000
+    LLM_CONTEXT_MAX_HUNK_TOKENS: int = 1500  # longer hunks are truncated
+
+    # PR map-reduce — PRs whose diff exceeds the prompt budget (or has more
+    # than PR_MAP_REDUCE_MIN_FILES files) are analyzed as file groups in
+    # parallel, then merged by a short reduce prompt
+    PR_MAP_REDUCE_ENABLED: bool = True
+    PR_MAP_REDUCE_MIN_FILES: int = 40
+    PR_MAP_REDUCE_GROUP_TOKENS: int = 8000
+    PR_MAP_REDUCE_CONCURRENCY: int = 4
+
+    # Multi-agent context cache — the shared code context is sent once per
+    # run and reused by all agents (see services/agents/context_cache.py).
+    # provider = Gemini context caching | implicit | local (tests / offline)
+    AGENT_CONTEXT_CACHE_BACKEND: str = "provider"
+    AGENT_CONTEXT_CACHE_MIN_TOKENS: int = 1024  # provider minimum for explicit caching
+    AGENT_CONTEXT_CACHE_TTL_SECONDS: int = 300
+
+    # Multi-agent routing — skip agents with nothing to review, or send them
+    # to a cheaper model tier (see services/agents/router.py). Empty
+    # AGENT_LITE_MODEL = no lite tier, those agents run on the full model
+    AGENT_ROUTING_ENABLED: bool = True
+    AGENT_LITE_MODEL: str = "gemini-2.5-flash-lite"
+
+    # Multi-agent deadlines — per-agent timeout, overall SLA for the whole
+    # run, and hedged retries for agents slower than their p95
+    # (see services/agents/hedging.py)
+    AGENT_TIMEOUT_SECONDS: float = 60.0
+    MULTI_AGENT_SLA_SECONDS: float = 90.0
+    AGENT_HEDGING_ENABLED: bool = True
+    AGENT_HEDGE_MIN_SAMPLES: int = 20  # p95 needs this many samples per agent
+    AGENT_HEDGE_FALLBACK_SECONDS: float = 30.0  # hedge delay until then
+
+    # LLM gateway — per-model concurrency cap + tokens-per-minute budget
+    # shared by every Gemini call (see services/llm/gateway.py). Per-model
+    # overrides as JSON, e.g. LLM_MODEL_CONCURRENCY='{"gemini-2.5-flash": 4}'
+    LLM_DEFAULT_CONCURRENCY: int = 8
+    LLM_MODEL_CONCURRENCY: dict[str, int] = {}
+    LLM_DEFAULT_TOKENS_PER_MINUTE: int = 1_000_000
+    LLM_MODEL_TOKENS_PER_MINUTE: dict[str, int] = {}
+    LLM_OUTPUT_TOKEN_ESTIMATE: int = 1500  # reserved per call until usage is known
+    LLM_QUEUE_TIMEOUT_SECONDS: float = 120.0
+
+    # LLM client — retries of transient Gemini errors (429 / 5xx / deadline),
+    # exponential backoff with full jitter (see services/llm/client.py)
+    LLM_MAX_RETRIES: int = 3
+    LLM_RETRY_BASE_DELAY_SECONDS: float = 0.5
+    LLM_RETRY_MAX_DELAY_SECONDS: float = 8.0
+
+    # LLM quotas — token budgets per repository owner and per repository,
+    # shared by all replicas via Redis (see services/llm/quota.py). An
+    # LLM-backed request reserves its estimated tokens up front; the
+    # reservation is corrected with the reported usage when it ends. Over
+    # budget → wait up to LLM_QUOTA_MAX_WAIT_SECONDS for a refill, else 429
+    LLM_QUOTA_ENABLED: bool = True
+    LLM_QUOTA_USER_TOKENS_PER_HOUR: int = 1_000_000
+    LLM_QUOTA_REPOSITORY_TOKENS_PER_HOUR: int = 500_000
+    LLM_QUOTA_MAX_WAIT_SECONDS: float = 10.0
+
+    # Commit prefetch — after GET /repos/{id}/commits, warm the diff and
+    # static-analysis caches of the newest commits in the background
+    # (see services/commit_prefetcher.py)
+    COMMIT_PREFETCH_ENABLED: bool = True
+    COMMIT_PREFETCH_TOP_N: int = 3
+    COMMIT_PREFETCH_CONCURRENCY: int = 2  # commits fetched at once, process-wide
+    COMMIT_PREFETCH_MIN_RATE_REMAINING: int = 1000  # GitHub calls left untouched for user requests
+
+    # Database pool (async engine used by the routes). pool_size +
+    # max_overflow is the most connections ONE worker process will open
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT_SECONDS: float = 10.0  # wait for a free connection, then 500
+    DB_STATEMENT_TIMEOUT_MS: int = 15000  # server-side; 0 disables
+    DB_DISABLE_PREPARED_STATEMENTS: bool = False  # True behind PgBouncer transaction pooling
+
+    # API rate limiting — GCRA in Redis, shared by every replica (see
+    # middleware/rate_limiter.py). Quotas are request units per hour;
+    # RATE_LIMIT_ROUTE_COSTS maps "METHOD /path" (exact) or "METHOD /prefix*"
+    # (longest match wins) to the units a request spends, default 1
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_IP_PER_HOUR: int = 1000  # anonymous / unrecognised token
+    RATE_LIMIT_USER_PER_HOUR: int = 2000
+    RATE_LIMIT_ROUTE_COSTS: dict[str, int] = {
+        "POST /analysis/multi-agent/*": 10,
+        "POST /analysis/": 5,
+        "POST /analysis/stream": 5,
+        "POST /analysis/pr/": 5,
+        "POST /analysis/pr/stream": 5,
+        "POST /analysis/auto-fix*": 5,
+        "POST /analysis/quick": 3,
+        "POST /analysis/pr/quick": 3,
+        "POST /analysis/chat/*": 2,
+        "POST /analysis/rag/*": 2,
+    }
+
+    # Health probes — GET /health/live (process is up) and /health/ready
+    # (Postgres, Redis and ChromaDB probed with a timeout, results cached
+    # per worker). Not ready → 503 so the load balancer routes elsewhere
+    # (see services/health_service.py)
+    HEALTH_PROBE_TIMEOUT_SECONDS: float = 1.0
+    HEALTH_CACHE_SECONDS: float = 5.0
+    HEALTH_REQUIRED_CHECKS: set[str] = {"database", "redis"}  # others down → "degraded" only
+    HEALTH_MAX_DB_POOL_SATURATION: float = 0.9  # checked-out / (pool size + overflow)
+    HEALTH_MAX_LLM_QUEUE_DEPTH: int = 100  # LLM calls waiting in the gateway, all models
+
+    # Tracing — OpenTelemetry spans across the analysis pipeline (see
+    # core/tracing.py). Exporter: otlp (endpoint from the standard
+    # OTEL_EXPORTER_OTLP_ENDPOINT env var) | console | memory (tests)
+    TRACING_ENABLED: bool = False
+    TRACING_EXPORTER: str = "otlp"
+    TRACING_SERVICE_NAME: str = "codeaudit-backend"
+    TRACING_SAMPLE_RATIO: float = 1.0  # of new traces; callers' sampling decisions are kept
+
     # App Settings
     DEBUG: bool = False
     HOST: str = "0.0.0.0"
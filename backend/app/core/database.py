@@ -1,12 +1,17 @@
 # ============================================================================
 # CORE/DATABASE.PY — PostgreSQL Database Connection & Session Management
 # ============================================================================
-# Sets up SQLAlchemy engine connected to PostgreSQL.
+# Sets up SQLAlchemy engines connected to PostgreSQL.
 # Provides:
-#   - engine: The database connection engine with connection pooling
-#   - SessionLocal: Factory for creating database sessions
+#   - async_engine: asyncpg engine used by every route handler — explicit
+#     pool sizing (DB_POOL_*) and a server-side statement timeout, so a
+#     query never blocks the event loop or hangs a worker
+#   - AsyncSessionLocal / get_async_db(): async session per request
+#     (pool usage exported as db_pool_connections, see core/metrics.py;
+#     queries traced as db.* spans, see core/tracing.py)
+#   - engine / SessionLocal / get_db(): synchronous pg8000 engine, used for
+#     startup (create_all), scripts and migrations
 #   - Base: Base class that all database models inherit from
-#   - get_db(): FastAPI dependency that provides a DB session per request
 #   - test_connection(): Helper to verify the database is reachable
 # ============================================================================
 
@@ -14,10 +19,13 @@ import ssl
 from urllib.parse import parse_qs, urlencode, urlparse, urlunparse
 
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.tracing import instrument_engine
 
 database_url = settings.DATABASE_URL
 
@@ -60,6 +68,53 @@ engine = create_engine(
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# ---- Async engine (asyncpg) for the request path ----
+async_database_url = database_url.replace("postgresql+pg8000://", "postgresql+asyncpg://", 1)
+
+async_connect_args: dict = {}
+if needs_ssl:
+    async_connect_args["ssl"] = connect_args["ssl_context"]
+if settings.DB_STATEMENT_TIMEOUT_MS > 0:
+    # Enforced by Postgres itself: a runaway query is cancelled server-side
+    async_connect_args["server_settings"] = {"statement_timeout": str(settings.DB_STATEMENT_TIMEOUT_MS)}
+if settings.DB_DISABLE_PREPARED_STATEMENTS:
+    # PgBouncer in transaction mode can't keep asyncpg's prepared statements
+    async_connect_args["statement_cache_size"] = 0
+    async_connect_args["prepared_statement_cache_size"] = 0
+
+async_engine = create_async_engine(
+    async_database_url,
+    connect_args=async_connect_args,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+    pool_pre_ping=True,
+    pool_recycle=300,
+    echo=settings.DEBUG,
+)
+
+# expire_on_commit=False: handlers return ORM objects after commit, and an
+# expired attribute would need a lazy (sync) reload
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False, autoflush=False)
+
+# One span per SQL statement when tracing is enabled (core/tracing.py)
+instrument_engine(async_engine.sync_engine)
+instrument_engine(engine)
+
+
+@metrics.collector(
+    "db_pool_connections",
+    "Connections of the async engine's pool by state (max = size + overflow).",
+    ("state",),
+)
+def _pool_metrics():
+    pool = async_engine.pool
+    return [
+        ({"state": "checked_out"}, pool.checkedout()),
+        ({"state": "idle"}, pool.checkedin()),
+        ({"state": "max"}, settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW),
+    ]
+
 Base = declarative_base()
 
 
@@ -71,6 +126,12 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    """FastAPI dependency: one AsyncSession per request."""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
 def test_connection():
     try:
         with engine.connect() as connection:
@@ -0,0 +1,182 @@
+# ============================================================================
+# CORE/METRICS.PY — Prometheus Metrics (prometheus_client)
+# ============================================================================
+# The metrics of every component, rendered in the Prometheus text exposition
+# format at GET /metrics.
+#
+#   - Counter    → monotonically increasing, e.g. cache hits
+#   - Histogram  → latency distribution with fixed buckets (p50 / p99 via
+#                  histogram_quantile() on the Prometheus side)
+#   - collector  → a gauge whose values another component already keeps
+#                  (DB pool, LLM gateway): a function read on each scrape and
+#                  after requests (at most every COLLECTOR_REFRESH_SECONDS)
+#
+# Several workers (uvicorn --workers N) are separate processes, and a scrape
+# reaches only one of them. With PROMETHEUS_MULTIPROC_DIR set (an empty
+# directory — the Dockerfile sets it and wipes it on start) every worker
+# writes its values there and /metrics aggregates all workers: counters and
+# histograms summed, collector gauges summed over live workers (a worker's
+# files are dropped when it shuts down). Unset → one in-process registry.
+#
+# Metrics exported (see the modules that record them):
+#   http_request_duration_seconds{method,route,status}   middleware/metrics.py
+#   stage_duration_seconds{component,stage}              GeminiService,
+#       AgentOrchestrator, GitHubService: GitHub fetch, each analyzer,
+#       RAG retrieve, LLM call, RAG store — where a request's time goes
+#       (each stage is also a span of the request's trace, core/tracing.py)
+#   cache_requests_total{cache,result}                   CacheManager
+#   redis_operation_duration_seconds{operation}          CacheManager
+#   db_pool_connections{state}                           core/database.py
+#   llm_tokens_total{caller,model,kind}                  services/llm/client.py
+#   llm_calls_total{caller,model,result}                 services/llm/client.py
+#   llm_gateway_calls{model,state}                       services/llm/gateway.py
+#
+# Usage:
+#   with metrics.stage("gemini_service", "rag_retrieve"):
+#       rag_context = await self._get_rag_context(commit_data)
+#
+#   metrics.cache_requests.labels(cache="repos", result="hit").inc()
+# ============================================================================
+
+import logging
+import os
+import threading
+import time
+from collections.abc import Callable, Iterable
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    disable_created_metrics,
+    generate_latest,
+    multiprocess,
+)
+
+from app.core.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# Seconds; spans a Redis GET (~1 ms) to a multi-agent LLM run (~1 min)
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# Read by prometheus_client itself when it is imported (per-worker value files)
+MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+# Minimum age of collector gauges before a request refreshes them again
+COLLECTOR_REFRESH_SECONDS = 1.0
+
+Sample = tuple[dict[str, str], float]
+
+# No *_created series per counter / histogram (not used by any query here)
+disable_created_metrics()
+
+
+class MetricsRegistry:
+    def __init__(self):
+        # Not the library's global REGISTRY: only our metrics are exported
+        self.registry = CollectorRegistry()
+        self._collectors: list[tuple[str, Gauge, Callable[[], Iterable[Sample]]]] = []
+        self._refresh_lock = threading.Lock()
+        self._refreshed_at = 0.0
+
+        self.http_request_duration = self.histogram(
+            "http_request_duration_seconds",
+            "HTTP request latency by route template, including streamed bodies.",
+            ("method", "route", "status"),
+        )
+        self.stage_duration = self.histogram(
+            "stage_duration_seconds",
+            "Time spent in each stage of the analysis pipelines.",
+            ("component", "stage"),
+        )
+        self.cache_requests = self.counter(
+            "cache_requests_total",
+            "CacheManager lookups by cache (key prefix) and result (hit / miss / error).",
+            ("cache", "result"),
+        )
+        self.redis_duration = self.histogram(
+            "redis_operation_duration_seconds",
+            "Latency of CacheManager Redis operations.",
+            ("operation",),
+        )
+        self.llm_tokens = self.counter(
+            "llm_tokens_total",
+            "Gemini tokens by caller, model and kind (prompt / output / cached).",
+            ("caller", "model", "kind"),
+        )
+        self.llm_calls = self.counter(
+            "llm_calls_total",
+            "Gemini calls by caller, model and result.",
+            ("caller", "model", "result"),
+        )
+
+    def counter(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        return Counter(name, help_text, labelnames, registry=self.registry)
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return Histogram(name, help_text, labelnames, buckets=buckets, registry=self.registry)
+
+    def collector(self, name: str, help_text: str, labelnames: tuple[str, ...]):
+        """Decorator: register a function returning [(labels, value), ...] as a gauge."""
+
+        def register(collect: Callable[[], Iterable[Sample]]):
+            gauge = Gauge(name, help_text, labelnames, registry=self.registry, multiprocess_mode="livesum")
+            self._collectors.append((name, gauge, collect))
+            return collect
+
+        return register
+
+    def refresh(self, force: bool = False) -> None:
+        """Copy the collectors' current values into their gauges."""
+        with self._refresh_lock:
+            now = time.monotonic()
+            if not force and now - self._refreshed_at < COLLECTOR_REFRESH_SECONDS:
+                return
+            self._refreshed_at = now
+
+        for name, gauge, collect in self._collectors:
+            try:
+                samples = list(collect())
+            except Exception as e:
+                logger.warning(f"Metrics collector {name} failed: {e}")
+                continue
+            for labels, value in samples:
+                gauge.labels(**labels).set(value)
+
+    @contextmanager
+    def stage(self, component: str, stage: str):
+        """Time a block as one stage of a pipeline; it is also a trace span.
+
+        Not around a `yield` of an async generator: the span would stay
+        current in the consumer's code between chunks.
+        """
+        with tracer.start_as_current_span(f"{component}.{stage}"):
+            with self.stage_duration.labels(component=component, stage=stage).time():
+                yield
+
+    def render(self) -> bytes:
+        """Text exposition of this worker, or of all workers in multiprocess mode."""
+        self.refresh(force=True)
+        if not MULTIPROC_DIR:
+            return generate_latest(self.registry)
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry, MULTIPROC_DIR)
+        return generate_latest(registry)
+
+    def mark_process_dead(self) -> None:
+        """Drop this worker's live gauges from the aggregate (worker shutdown)."""
+        if MULTIPROC_DIR:
+            multiprocess.mark_process_dead(os.getpid(), MULTIPROC_DIR)
+
+
+# Create global instance
+metrics = MetricsRegistry()
@@ -0,0 +1,31 @@
+# ============================================================================
+# CORE/MIGRATIONS.PY — Apply Schema Migrations on Startup
+# ============================================================================
+# The schema is owned by Alembic (backend/alembic/). upgrade_database()
+# brings the database to the latest revision and replaces the old
+# Base.metadata.create_all() calls in main.py:
+#   - fresh database          → baseline tables + every later migration
+#   - database from create_all → baseline adopts the existing tables, later
+#                                migrations (indexes, constraints) apply
+#   - already at head         → no-op
+# Concurrent workers are serialised inside alembic/env.py.
+# ============================================================================
+
+from pathlib import Path
+
+from alembic import command
+from alembic.config import Config
+
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+
+
+def alembic_config() -> Config:
+    config = Config(str(BACKEND_DIR / "alembic.ini"))
+    config.set_main_option("script_location", str(BACKEND_DIR / "alembic"))
+    config.attributes["configure_logger"] = False  # keep the app's logging setup
+    return config
+
+
+def upgrade_database() -> None:
+    """Upgrade the database to the latest migration."""
+    command.upgrade(alembic_config(), "head")
@@ -0,0 +1,61 @@
+# ============================================================================
+# CORE/PAGINATION.PY — Keyset (Cursor) Pagination on (created_at, id)
+# ============================================================================
+# History lists are ordered newest first by (created_at DESC, id DESC); id
+# breaks ties so the order is total and stable while rows are inserted.
+#
+# Instead of OFFSET (which scans and throws away every skipped row), each
+# page ends with an opaque cursor encoding the last row's (created_at, id).
+# The next page asks for rows strictly "older" than it:
+#
+#   WHERE (created_at, id) < (:created_at, :id)
+#   ORDER BY created_at DESC, id DESC LIMIT :limit + 1
+#
+# which a (…, created_at DESC, id DESC) index answers by seeking straight to
+# the cursor, so page 1000 costs the same as page 1. The extra row tells
+# whether another page exists. Routes return the cursor in X-Next-Cursor.
+# ============================================================================
+
+import base64
+import json
+from datetime import datetime
+from typing import Any
+
+from fastapi import HTTPException
+from sqlalchemy import Select, tuple_
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """Parse a cursor from a client; 400 if it was not issued by us."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def keyset_page(query: Select, created_col, id_col, cursor: str | None, limit: int) -> Select:
+    """Order `query` newest first and restrict it to the page after `cursor`.
+
+    Fetches limit + 1 rows; pass the result to split_page().
+    """
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        query = query.where(tuple_(created_col, id_col) < tuple_(created_at, row_id))
+    return query.order_by(created_col.desc(), id_col.desc()).limit(limit + 1)
+
+
+def split_page(rows: list[Any], limit: int) -> tuple[list[Any], str | None]:
+    """Drop the look-ahead row; return (page rows, cursor of the next page)."""
+    if len(rows) <= limit:
+        return rows, None
+    last = rows[limit - 1]
+    return rows[:limit], encode_cursor(last.created_at, last.id)
@@ -6,7 +6,8 @@
 #   - redis_client: Global Redis connection instance
 #   - test_redis_connection(): Verifies Redis is reachable
 #   - CacheManager: Helper class with set/get/delete/exists methods
-#     for easy caching with automatic expiration (default: 1 hour)
+#     for easy caching with automatic expiration (default: 1 hour),
+#     instrumented with hit / miss counts and Redis latency
 # ============================================================================
 
 import json
@@ -15,6 +16,7 @@ import logging
 import redis
 
 from app.core.config import settings
+from app.core.metrics import metrics
 
 logger = logging.getLogger(__name__)
 
@@ -46,14 +48,23 @@ TTL_REPO_DETAIL  = 600     # 10 min
 TTL_ANALYSIS     = 3600    # 1 h   — analyses are immutable once stored
 TTL_ANALYSIS_LIST= 120     # 2 min — list changes when new analysis added
 TTL_KB_INFO      = 300     # 5 min — knowledge-base stats
+TTL_RAG_CONTEXT  = 600     # 10 min — formatted RAG context (keyed by index version)
+TTL_STATIC_ANALYSIS = 86400  # 24 h — static analysis of an (immutable) commit diff
+TTL_AUTH_TOKEN   = 300     # 5 min — token hash → user (see core/auth_cache.py)
+TTL_AUTH_TOKEN_INVALID = 60  # 1 min — token GitHub rejected
 
 
 class CacheManager:
+    # Every operation is timed (redis_operation_duration_seconds) and every
+    # lookup counted as hit / miss / error per cache — the key prefix, e.g.
+    # "commit_diff" (cache_requests_total, see core/metrics.py)
+
     @staticmethod
     def set(key: str, value: str, expire: int = 3600):
         """Set cache value with expiration"""
         try:
-            return redis_client.setex(key, expire, value)
+            with metrics.redis_duration.labels(operation="set").time():
+                return redis_client.setex(key, expire, value)
         except Exception as e:
             logger.warning(f"Cache SET failed for {key}: {e}")
 
@@ -61,16 +72,21 @@ class CacheManager:
     def get(key: str):
         """Get cache value"""
         try:
-            return redis_client.get(key)
+            with metrics.redis_duration.labels(operation="get").time():
+                value = redis_client.get(key)
         except Exception as e:
+            _count_lookup(key, "error")
             logger.warning(f"Cache GET failed for {key}: {e}")
             return None
+        _count_lookup(key, "miss" if value is None else "hit")
+        return value
 
     @staticmethod
     def delete(key: str):
         """Delete cache key"""
         try:
-            return redis_client.delete(key)
+            with metrics.redis_duration.labels(operation="delete").time():
+                return redis_client.delete(key)
         except Exception as e:
             logger.warning(f"Cache DELETE failed for {key}: {e}")
 
@@ -78,9 +94,10 @@ class CacheManager:
     def delete_pattern(pattern: str):
         """Delete all keys matching a pattern (use sparingly)"""
         try:
-            keys = redis_client.keys(pattern)
-            if keys:
-                redis_client.delete(*keys)
+            with metrics.redis_duration.labels(operation="delete_pattern").time():
+                keys = redis_client.keys(pattern)
+                if keys:
+                    redis_client.delete(*keys)
         except Exception as e:
             logger.warning(f"Cache DELETE_PATTERN failed for {pattern}: {e}")
 
@@ -88,7 +105,8 @@ class CacheManager:
     def exists(key: str):
         """Check if key exists"""
         try:
-            return redis_client.exists(key)
+            with metrics.redis_duration.labels(operation="exists").time():
+                return redis_client.exists(key)
         except Exception:
             return False
 
@@ -96,7 +114,9 @@ class CacheManager:
     def set_json(key: str, value, expire: int = 3600):
         """Serialize value to JSON and cache it"""
         try:
-            redis_client.setex(key, expire, json.dumps(value, default=str))
+            payload = json.dumps(value, default=str)
+            with metrics.redis_duration.labels(operation="set").time():
+                redis_client.setex(key, expire, payload)
         except Exception as e:
             logger.warning(f"Cache SET_JSON failed for {key}: {e}")
 
@@ -104,8 +124,16 @@ class CacheManager:
     def get_json(key: str):
         """Get and deserialize a cached JSON value. Returns None on miss/error."""
         try:
-            raw = redis_client.get(key)
-            return json.loads(raw) if raw else None
+            with metrics.redis_duration.labels(operation="get").time():
+                raw = redis_client.get(key)
+            value = json.loads(raw) if raw else None
         except Exception as e:
+            _count_lookup(key, "error")
             logger.warning(f"Cache GET_JSON failed for {key}: {e}")
             return None
+        _count_lookup(key, "miss" if value is None else "hit")
+        return value
+
+
+def _count_lookup(key: str, result: str) -> None:
+    metrics.cache_requests.labels(cache=key.split(":", 1)[0], result=result).inc()
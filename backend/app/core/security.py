@@ -6,6 +6,8 @@
 #   - verify_token()        → Decodes and validates a JWT token
 #   - get_current_user()    → FastAPI dependency — extracts user from token
 #   - get_current_user_optional() → Same but returns None if no token
+#   - get_github_user()     → FastAPI dependency — resolves the GitHub token
+#     sent by the frontend to a User (cached by token hash, core/auth_cache.py)
 # Tokens expire after 30 minutes (configurable in config.py).
 # Used as a dependency in route handlers: Depends(get_current_user)
 # ============================================================================
@@ -16,10 +18,12 @@ import httpx
 from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from jose import JWTError, jwt
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.auth_cache import USER_FIELDS, token_cache
 from app.core.config import settings
-from app.core.database import get_db
+from app.core.database import get_async_db
 from app.models.user import User
 
 # OAuth2 scheme
@@ -47,7 +51,7 @@ def verify_token(token: str) -> dict | None:
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> User:
     """Get current authenticated user"""
     credentials_exception = HTTPException(
@@ -64,7 +68,7 @@ async def get_current_user(
     if user_id is None:
         raise credentials_exception
 
-    user = db.query(User).filter(User.id == int(user_id)).first()
+    user = await db.scalar(select(User).where(User.id == int(user_id)))
     if user is None:
         raise credentials_exception
 
@@ -72,7 +76,7 @@ async def get_current_user(
 
 async def get_current_user_optional(
     credentials: HTTPAuthorizationCredentials | None = Depends(HTTPBearer(auto_error=False)),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> User | None:
     """Get current user if authenticated, else None"""
     if not credentials:
@@ -86,15 +90,20 @@ async def get_current_user_optional(
 
 async def get_github_user(
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> User:
     """
     Resolve the current user from a GitHub OAuth token.
 
     The frontend sends: Authorization: token <github_access_token>
-    We look up the user in the DB by their stored token. If they don't
-    exist yet (e.g. fresh Docker DB), we call the GitHub API to fetch
-    their profile and create the record automatically.
+    Resolution order, keyed by sha256(token):
+      1. token cache (in-process, then Redis) — no DB or GitHub call;
+         also remembers tokens GitHub rejected
+      2. users.access_token_hash (indexed)
+      3. GitHub /user — creates/updates the user (e.g. fresh Docker DB)
+
+    On a cache hit the returned User is a transient object carrying the
+    cached columns plus the request's token; it is not attached to `db`.
     """
     auth_header = request.headers.get("Authorization", "")
     if not auth_header:
@@ -107,9 +116,19 @@ async def get_github_user(
     else:
         raise HTTPException(status_code=401, detail="Invalid authorization header format")
 
-    # Fast path: token already in DB
-    user = db.query(User).filter(User.access_token == github_token).first()
-    if user:
+    token_hash = User.hash_token(github_token)
+
+    # Hot path: recently resolved (or rejected) token
+    cached = token_cache.get(token_hash)
+    if cached is not None:
+        if cached.get("invalid"):
+            raise HTTPException(status_code=401, detail="Invalid or expired GitHub token")
+        return User(**{field: cached[field] for field in USER_FIELDS}, access_token=github_token)
+
+    # Token already in DB
+    user = await db.scalar(select(User).where(User.access_token_hash == token_hash))
+    if user and user.access_token == github_token:
+        token_cache.set_user(token_hash, user)
         return user
 
     # Slow path: unknown token — verify with GitHub and create/update user
@@ -120,6 +139,8 @@ async def get_github_user(
                 headers={"Authorization": f"token {github_token}", "Accept": "application/json"},
                 timeout=10.0,
             )
+        if resp.status_code == 401:
+            token_cache.set_invalid(token_hash)
         if resp.status_code != 200:
             raise HTTPException(status_code=401, detail="Invalid or expired GitHub token")
         gh = resp.json()
@@ -129,13 +150,17 @@ async def get_github_user(
         raise HTTPException(status_code=401, detail=f"Failed to verify GitHub token: {exc}") from exc
 
     # Find by GitHub ID and update, or create fresh
-    user = db.query(User).filter(User.github_id == str(gh["id"])).first()
+    user = await db.scalar(select(User).where(User.github_id == str(gh["id"])))
     if user:
+        previous_hash = user.access_token_hash
         user.access_token = github_token
         user.username = gh.get("login", user.username)
         user.avatar_url = gh.get("avatar_url", user.avatar_url)
-        db.commit()
-        db.refresh(user)
+        await db.commit()
+        await db.refresh(user)
+        # The replaced token must stop resolving to this user
+        if previous_hash and previous_hash != token_hash:
+            token_cache.invalidate(previous_hash)
     else:
         user = User(
             github_id=str(gh["id"]),
@@ -145,7 +170,8 @@ async def get_github_user(
             access_token=github_token,
         )
         db.add(user)
-        db.commit()
-        db.refresh(user)
+        await db.commit()
+        await db.refresh(user)
 
+    token_cache.set_user(token_hash, user)
     return user
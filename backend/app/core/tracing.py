@@ -0,0 +1,169 @@
+# ============================================================================
+# CORE/TRACING.PY — Distributed Tracing (OpenTelemetry)
+# ============================================================================
+# One analysis request fans out to GitHub, the static analyzers, ChromaDB,
+# three agents and Postgres; metrics (core/metrics.py) say which stage is
+# slow on average, a trace says where ONE slow request spent its time.
+#
+# Spans recorded:
+#   - HTTP server span per request          FastAPI instrumentation (W3C
+#                                           traceparent from the caller)
+#   - every metrics.stage() block           analyzers, RAG retrieve/store,
+#                                           LLM calls, GitHub diff fetches
+#   - GitHubService calls                   @traced on each public method
+#   - RAGService.search_similar / store     @traced
+#   - BaseAgent.analyze                     @traced, agent.name attribute
+#   - DB queries                            SQLAlchemy cursor events
+#   - background work                       commit prefetch, RAG compaction
+#
+# Propagation: the current span lives in a contextvar, so asyncio tasks
+# (create_task copies the context) and asyncio.to_thread() calls inherit
+# their parent span — parallel agents, hedged retries and prefetches
+# started by a request are all part of that request's trace.
+#
+# Exporters (TRACING_EXPORTER):
+#   otlp    → OTLP/gRPC collector (standard OTEL_EXPORTER_OTLP_* env vars)
+#   console → stdout, for local debugging
+#   memory  → kept in `memory_exporter`, for tests:
+#               memory_exporter.get_finished_spans()
+# TRACING_ENABLED=False → the OpenTelemetry API stays a no-op.
+#
+# Usage:
+#   @traced("github.get_commit_diff")
+#   async def get_commit_diff(...): ...
+#
+#   with tracer.start_as_current_span("rag.compact"):
+#       ...
+# ============================================================================
+
+import functools
+import inspect
+
+from opentelemetry import trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter, SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+from opentelemetry.trace import SpanKind, Status, StatusCode
+
+from app.core.config import settings
+
+# Long statements (bulk inserts) are cut so one span can't bloat the export
+MAX_STATEMENT_LENGTH = 2000
+
+# No-op until setup_tracing() installs the SDK provider (proxy tracer)
+tracer = trace.get_tracer("app")
+
+# Finished spans when TRACING_EXPORTER=memory (tests)
+memory_exporter = InMemorySpanExporter()
+
+_provider: TracerProvider | None = None
+
+
+def _span_processor(exporter_name: str):
+    if exporter_name == "memory":
+        return SimpleSpanProcessor(memory_exporter)
+    if exporter_name == "console":
+        return SimpleSpanProcessor(ConsoleSpanExporter())
+    if exporter_name == "otlp":
+        # Imported here: grpc is only loaded when traces are actually shipped
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+
+        return BatchSpanProcessor(OTLPSpanExporter())
+    raise ValueError(f"Unknown TRACING_EXPORTER: {exporter_name!r} (otlp | console | memory)")
+
+
+def setup_tracing(app) -> None:
+    """Install the tracer provider and the HTTP server spans (once, at startup)."""
+    global _provider
+    if not settings.TRACING_ENABLED or _provider is not None:
+        return
+
+    _provider = TracerProvider(
+        resource=Resource.create({"service.name": settings.TRACING_SERVICE_NAME}),
+        sampler=ParentBased(TraceIdRatioBased(settings.TRACING_SAMPLE_RATIO)),
+    )
+    _provider.add_span_processor(_span_processor(settings.TRACING_EXPORTER))
+    trace.set_tracer_provider(_provider)
+
+    from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+
+    FastAPIInstrumentor.instrument_app(
+        app,
+        tracer_provider=_provider,
+        excluded_urls="/health,/metrics",
+        # One span per SSE chunk would drown the pipeline spans
+        exclude_spans=["receive", "send"],
+    )
+
+
+def shutdown_tracing() -> None:
+    """Flush buffered spans (app shutdown)."""
+    if _provider is not None:
+        _provider.shutdown()
+
+
+def traced(name: str):
+    """Decorator: run a function (sync or async) inside a span called `name`."""
+
+    def decorate(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with tracer.start_as_current_span(name):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with tracer.start_as_current_span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def instrument_engine(engine) -> None:
+    """Record a CLIENT span per SQL statement run by a (sync) SQLAlchemy engine.
+
+    For an AsyncEngine pass `async_engine.sync_engine`; SQLAlchemy runs the
+    events inside the calling task's context, so queries nest under the span
+    of the route or service that issued them.
+    """
+    if not settings.TRACING_ENABLED:
+        return
+
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start_query_span(conn, cursor, statement, parameters, context, executemany):
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "QUERY"
+        span = tracer.start_span(
+            f"db.{operation}",
+            kind=SpanKind.CLIENT,
+            attributes={
+                "db.system": "postgresql",
+                "db.operation": operation,
+                "db.statement": statement[:MAX_STATEMENT_LENGTH],
+            },
+        )
+        conn.info.setdefault("trace_spans", []).append(span)
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _end_query_span(conn, cursor, statement, parameters, context, executemany):
+        spans = conn.info.get("trace_spans")
+        if spans:
+            spans.pop().end()
+
+    @event.listens_for(engine, "handle_error")
+    def _fail_query_span(exception_context):
+        conn = exception_context.connection
+        spans = conn.info.get("trace_spans") if conn is not None else None
+        if spans:
+            span = spans.pop()
+            span.record_exception(exception_context.original_exception)
+            span.set_status(Status(StatusCode.ERROR))
+            span.end()
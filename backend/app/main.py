@@ -2,41 +2,72 @@
 # MAIN.PY — FastAPI Application Entry Point
 # ============================================================================
 # The main file that starts the entire backend server. It:
-#   1. Creates all database tables on startup (users, repositories, etc.)
+#   1. Applies Alembic migrations on startup (creates tables on a fresh DB)
 #   2. Configures CORS to allow the Next.js frontend (localhost:3000)
-#   3. Adds rate limiting middleware (1000 requests/hour per IP)
+#   3. Adds rate limiting middleware (Redis GCRA, per user / per IP, weighted
+#      by route cost), tags each request with an LLM priority (chat/streaming
+#      first, webhooks last) and opens its LLM token-quota charge
 #   4. Registers all route groups:
 #      - /auth/*       → GitHub OAuth authentication
 #      - /repos/*      → Repository & commit management
 #      - /analysis/*   → AI-powered code analysis (single + multi-agent)
-#      - /analysis/*   → AI chat, RAG memory, auto-fix
+#      - /analysis/*   → AI chat, RAG memory, auto-fix, LLM call metrics
 #      - /webhooks/*   → GitHub webhook listener
-#   5. Provides health check endpoints (/ and /health)
+#   5. Provides probe endpoints — /health/live (liveness), /health/ready and
+#      /health (readiness: Postgres, Redis, ChromaDB, pool saturation, LLM
+#      queue depth; 503 when not ready) — and Prometheus metrics (/metrics —
+#      request latency, pipeline stages, caches, pools)
+#   6. Starts/stops background workers (RAG compactor, commit prefetcher)
+#      via the lifespan hook
+#   7. Traces each request across GitHub, analyzers, RAG, agents and the
+#      database when TRACING_ENABLED (OpenTelemetry, see core/tracing.py)
 #
 # Run with: uvicorn app.main:app --reload --host 0.0.0.0 --port 8000
 # Swagger docs available at: http://localhost:8000/docs
 # ============================================================================
 
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
+from prometheus_client import CONTENT_TYPE_LATEST
 
 from app.core.config import settings
-from app.core.database import engine
-from app.middleware.rate_limiter import RateLimitMiddleware
-from app.models import analysis, pr_analysis, pull_request, repository, user  # noqa: F401
+from app.core.database import async_engine
+from app.core.metrics import metrics
+from app.core.migrations import upgrade_database
+from app.core.pagination import NEXT_CURSOR_HEADER
+from app.core.tracing import setup_tracing, shutdown_tracing
+from app.middleware.llm_priority import LLMPriorityMiddleware
+from app.middleware.llm_quota import LLMQuotaMiddleware
+from app.middleware.metrics import MetricsMiddleware
+from app.middleware.rate_limiter import RATE_LIMIT_HEADERS, RateLimitMiddleware
+from app.services.commit_prefetcher import commit_prefetcher
+from app.services.health_service import health_service
+from app.services.rag_compactor import rag_compactor
 from app.webhooks.github_webhooks import router as webhook_router
 
-# Create all database tables (order matters — pull_requests before pr_analysis_results)
-user.Base.metadata.create_all(bind=engine)
-repository.Base.metadata.create_all(bind=engine)
-pull_request.Base.metadata.create_all(bind=engine)
-analysis.Base.metadata.create_all(bind=engine)
-pr_analysis.Base.metadata.create_all(bind=engine)
+# Bring the schema to the latest Alembic revision (creates tables on a fresh DB)
+upgrade_database()
 
 # Hide Swagger/ReDoc in production to avoid exposing internals
 _docs_url = "/docs" if settings.DEBUG else None
 _redoc_url = "/redoc" if settings.DEBUG else None
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start background workers on boot, stop them on shutdown."""
+    rag_compactor.start()
+    yield
+    await commit_prefetcher.stop()
+    await rag_compactor.stop()
+    await async_engine.dispose()
+    shutdown_tracing()
+    metrics.mark_process_dead()
+
+
 # Create FastAPI app
 app = FastAPI(
     title="AI Code Review Assistant",
@@ -44,18 +75,9 @@ app = FastAPI(
     version="5.0.0",
     docs_url=_docs_url,
     redoc_url=_redoc_url,
+    lifespan=lifespan,
 )
 
-# Add CORS middleware — origins driven by ALLOWED_ORIGINS env var
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=settings.cors_origins,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-
 @app.get("/")
 async def root():
     """Health check endpoint"""
@@ -66,17 +88,54 @@ async def root():
     }
 
 
+@app.get("/health/live")
+async def liveness():
+    """Liveness probe — the process and its event loop answer (no dependency I/O)"""
+    return {"status": "alive"}
+
+
+@app.get("/health/ready")
+async def readiness():
+    """Readiness probe — 503 when a required dependency is down or the worker is saturated"""
+    report = await health_service.readiness()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+
 @app.get("/health")
 async def health_check():
-    """Detailed health check"""
-    return {
-        "status": "healthy",
-        "database": "connected",
-        "redis": "connected"
+    """Detailed health check (readiness report, plus the original summary fields)"""
+    report = await health_service.readiness()
+    summary = {
+        "status": "healthy" if report["ready"] else "unhealthy",
+        "database": "connected" if report["checks"]["database"]["status"] == "ok" else "unavailable",
+        "redis": "connected" if report["checks"]["redis"]["status"] == "ok" else "unavailable",
     }
+    return JSONResponse({**report, **summary}, status_code=200 if report["ready"] else 503)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Prometheus scrape endpoint (all workers in multiprocess mode, see core/metrics.py)"""
+    return Response(metrics.render(), media_type=CONTENT_TYPE_LATEST)
+
 
+# Middleware added last runs first
+app.add_middleware(RateLimitMiddleware)  # quotas: RATE_LIMIT_* settings
+app.add_middleware(LLMPriorityMiddleware)
+app.add_middleware(LLMQuotaMiddleware)
+app.add_middleware(MetricsMiddleware)  # times everything below it
 
-app.add_middleware(RateLimitMiddleware, calls_per_hour=1000)
+# CORS outermost, so 429s from the limiters above still carry CORS headers
+# (and the browser can read them) — origins driven by ALLOWED_ORIGINS env var
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=settings.cors_origins,
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, *RATE_LIMIT_HEADERS],  # history cursor, quota
+)
+setup_tracing(app)  # server span per request when TRACING_ENABLED
 
 # Import and include routers (must be after app creation to avoid circular imports)
 from app.routes.agents import router as agent_router  # noqa: E402
@@ -84,6 +143,7 @@ from app.routes.analysis import router as analysis_router  # noqa: E402
 from app.routes.auth import router as auth_router  # noqa: E402
 from app.routes.autofix import router as autofix_router  # noqa: E402
 from app.routes.chat import router as chat_router  # noqa: E402
+from app.routes.llm import router as llm_router  # noqa: E402
 from app.routes.rag import router as rag_router  # noqa: E402
 from app.routes.repositories import router as repo_router  # noqa: E402
 
@@ -94,6 +154,7 @@ app.include_router(agent_router, prefix="/analysis", tags=["multi-agent"])
 app.include_router(autofix_router, prefix="/analysis", tags=["auto-fix"])
 app.include_router(chat_router, prefix="/analysis", tags=["ai-chat"])
 app.include_router(rag_router, prefix="/analysis", tags=["rag-memory"])
+app.include_router(llm_router, prefix="/analysis", tags=["llm"])
 
 app.include_router(webhook_router, prefix="/webhooks", tags=["webhooks"])
 
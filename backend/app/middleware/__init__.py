@@ -1 +1 @@
-# Middleware package — Rate limiting middleware
+# Middleware package — Rate limiting + LLM request priority middleware
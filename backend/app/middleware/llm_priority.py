@@ -0,0 +1,38 @@
+# ============================================================================
+# MIDDLEWARE/LLM_PRIORITY.PY — Tag Each Request with an LLM Priority
+# ============================================================================
+# Sets the LLM gateway priority (services/llm/gateway.py) for everything a
+# request does, including the body of streaming (SSE) responses:
+#   - INTERACTIVE → chat + streaming endpoints (a user is watching)
+#   - BACKGROUND  → GitHub webhooks
+#   - STANDARD    → everything else
+#
+# Pure ASGI middleware (not BaseHTTPMiddleware) so the contextvar stays set
+# while the response streams.
+# ============================================================================
+
+from app.services.llm.gateway import Priority, llm_priority
+
+INTERACTIVE_MARKERS = ("/stream", "/chat/")
+BACKGROUND_PREFIXES = ("/webhooks/",)
+
+
+def priority_for_path(path: str) -> Priority:
+    if path.startswith(BACKGROUND_PREFIXES):
+        return Priority.BACKGROUND
+    if any(marker in path for marker in INTERACTIVE_MARKERS):
+        return Priority.INTERACTIVE
+    return Priority.STANDARD
+
+
+class LLMPriorityMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with llm_priority(priority_for_path(scope["path"])):
+            await self.app(scope, receive, send)
@@ -0,0 +1,26 @@
+# ============================================================================
+# MIDDLEWARE/LLM_QUOTA.PY — One LLM Quota Charge per Request
+# ============================================================================
+# Opens the LLM quota charge of each request (services/llm/quota.py): routes
+# reserve their estimated tokens into it, LLM calls report actual usage,
+# and when the request is over — including the body of streaming (SSE)
+# responses — the difference is refunded or charged.
+#
+# Pure ASGI middleware (not BaseHTTPMiddleware) so the charge stays open
+# while the response streams.
+# ============================================================================
+
+from app.services.llm.quota import llm_quota
+
+
+class LLMQuotaMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with llm_quota.request_scope():
+            await self.app(scope, receive, send)
@@ -0,0 +1,49 @@
+# ============================================================================
+# MIDDLEWARE/METRICS.PY — Request Latency by Route
+# ============================================================================
+# Records every HTTP request in http_request_duration_seconds{method, route,
+# status} (core/metrics.py). The route label is the path TEMPLATE
+# ("/analysis/{analysis_id}"), not the raw path, so ids don't explode the
+# number of series; requests no route matched are labelled "unmatched".
+#
+# Pure ASGI middleware (not BaseHTTPMiddleware) so a streaming (SSE)
+# response is measured until its last event, not its first byte. Added
+# after the other middleware in main.py, so the time includes them. Also
+# refreshes the collector gauges (throttled, core/metrics.py) so a scrape
+# answered by another worker sees this worker's pool / gateway state.
+# ============================================================================
+
+import time
+
+from app.core.metrics import metrics
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            metrics.http_request_duration.labels(
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=str(status),
+            ).observe(time.perf_counter() - started)
+            # Keeps this worker's collector gauges current for multiprocess scrapes
+            metrics.refresh()
@@ -1,65 +1,156 @@
 # ============================================================================
-# MIDDLEWARE/RATE_LIMITER.PY — IP-Based Rate Limiting Middleware
+# MIDDLEWARE/RATE_LIMITER.PY — Redis GCRA Rate Limiting Middleware
 # ============================================================================
-# Limits how many API requests each IP address can make per hour.
-# Default: 1000 requests per hour per IP (configurable).
-# How it works:
-#   - Tracks request timestamps per IP in memory (defaultdict)
-#   - On each request, removes timestamps older than 1 hour
-#   - If count exceeds limit → returns HTTP 429 "Too Many Requests"
-#   - Adds X-RateLimit-Remaining header to every response
-# Applied globally to all endpoints via middleware in main.py.
+# Limits how many API requests each client can make per hour, consistently
+# across workers and replicas (state lives in Redis, not process memory).
+#
+# Algorithm: GCRA (generic cell rate algorithm), run as one atomic Lua
+# script per request. Per client Redis stores a single number — the
+# "theoretical arrival time" (TAT) — so a check is O(1) whatever the
+# window size, and the key expires by itself once the client is idle.
+# Equivalent to a sliding window with smooth refill: `limit` units per
+# hour, and up to `limit` units may be spent in a burst.
+#
+# Who is limited:
+#   - authenticated users (GitHub token the auth cache already knows)
+#     → user:{id}, RATE_LIMIT_USER_PER_HOUR
+#   - everyone else → ip:{address}, RATE_LIMIT_IP_PER_HOUR
+#     (unknown tokens fall back to the IP, so rotating fake tokens
+#     doesn't buy fresh quota)
+#
+# What a request costs: RATE_LIMIT_ROUTE_COSTS, e.g. a multi-agent run
+# spends 10 units where a list endpoint spends 1.
+#
+# Every response carries RateLimit-Limit / RateLimit-Remaining /
+# RateLimit-Reset (IETF RateLimit header fields); a rejected one is a 429
+# with Retry-After. If Redis is unreachable the request is let through.
 # ============================================================================
 
-import time
-from collections import defaultdict
+import logging
+import math
 
-from fastapi import HTTPException, Request
+from fastapi import Request
+from fastapi.responses import JSONResponse
 from starlette.middleware.base import BaseHTTPMiddleware
 
+from app.core.auth_cache import token_cache
+from app.core.config import settings
+from app.core.redis import redis_client
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+WINDOW_US = 3_600_000_000  # Redis TIME has µs resolution; integers keep the maths exact
+SKIP_PATHS = {"/", "/health", "/health/live", "/health/ready", "/metrics", "/docs", "/redoc", "/openapi.json"}
+RATE_LIMIT_HEADERS = ("RateLimit-Limit", "RateLimit-Remaining", "RateLimit-Reset", "Retry-After")
+
+# KEYS[1] = bucket   ARGV = emission interval (µs per unit), burst (µs), cost
+# Returns {allowed, remaining units, retry after µs, reset µs}
+GCRA_SCRIPT = """
+local interval = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+
+local t = redis.call('TIME')
+local now = t[1] * 1000000 + t[2]
+
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then tat = now end
+
+local new_tat = tat + cost * interval
+local allow_at = new_tat - burst
+if now < allow_at then
+  local remaining = math.floor((burst - (tat - now)) / interval)
+  return {0, remaining, allow_at - now, tat - now}
+end
+
+redis.call('SET', KEYS[1], string.format('%d', new_tat), 'PX', math.ceil((new_tat - now) / 1000))
+return {1, math.floor((burst - (new_tat - now)) / interval), 0, new_tat - now}
+"""
+
 
 class RateLimiter:
     def __init__(self):
-        self.requests = defaultdict(list)
+        self._script = redis_client.register_script(GCRA_SCRIPT)
 
-    def is_allowed(self, key: str, limit: int = 100, window: int = 3600) -> bool:
-        """Check if request is allowed based on rate limit"""
-        now = time.time()
+    def hit(self, key: str, limit: int, cost: int = 1) -> tuple[bool, int, int, int] | None:
+        """Spend `cost` units of `key`'s hourly `limit`.
+
+        Returns (allowed, remaining, retry_after_seconds, reset_seconds), or
+        None if Redis is unavailable.
+        """
+        interval = WINDOW_US // limit
+        try:
+            allowed, remaining, retry_after, reset = self._script(
+                keys=[f"ratelimit:{key}"], args=[interval, interval * limit, cost]
+            )
+        except Exception as e:
+            logger.warning(f"Rate limiter unavailable, allowing request: {e}")
+            return None
+        return (
+            bool(allowed), max(int(remaining), 0),
+            math.ceil(int(retry_after) / 1_000_000), math.ceil(int(reset) / 1_000_000),
+        )
+
+
+def route_cost(method: str, path: str) -> int:
+    """Units a request spends: exact rule, else longest "…*" prefix rule, else 1."""
+    request_line = f"{method} {path}"
+    costs = settings.RATE_LIMIT_ROUTE_COSTS
+    if request_line in costs:
+        return costs[request_line]
+    best, best_len = 1, -1
+    for rule, cost in costs.items():
+        if rule.endswith("*") and request_line.startswith(rule[:-1]) and len(rule) > best_len:
+            best, best_len = cost, len(rule)
+    return best
 
-        # Clean old requests outside the window
-        self.requests[key] = [req_time for req_time in self.requests[key] if req_time > now - window]
 
-        # Check if limit exceeded
-        if len(self.requests[key]) >= limit:
-            return False
+def client_identity(request: Request) -> tuple[str, int]:
+    """(bucket key, hourly limit) — the user when the token is known, else the IP."""
+    auth_header = request.headers.get("Authorization", "")
+    token = auth_header.partition(" ")[2]
+    if token:
+        cached = token_cache.get(User.hash_token(token))
+        if cached and not cached.get("invalid"):
+            return f"user:{cached['id']}", settings.RATE_LIMIT_USER_PER_HOUR
+    client_ip = request.client.host if request.client else "unknown"
+    return f"ip:{client_ip}", settings.RATE_LIMIT_IP_PER_HOUR
 
-        # Add current request
-        self.requests[key].append(now)
-        return True
 
 class RateLimitMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app, calls_per_hour: int = 1000):
+    def __init__(self, app):
         super().__init__(app)
         self.rate_limiter = RateLimiter()
-        self.calls_per_hour = calls_per_hour
 
     async def dispatch(self, request: Request, call_next):
-        # Get client IP
-        client_ip = request.client.host
+        if not settings.RATE_LIMIT_ENABLED or request.url.path in SKIP_PATHS or request.method == "OPTIONS":
+            return await call_next(request)
 
-        # Skip rate limiting for health checks
-        if request.url.path in ["/", "/health", "/docs"]:
+        key, limit = client_identity(request)
+        cost = route_cost(request.method, request.url.path)
+        result = self.rate_limiter.hit(key, limit, cost)
+        if result is None:
             return await call_next(request)
 
-        # Check rate limit
-        if not self.rate_limiter.is_allowed(client_ip, self.calls_per_hour, 3600):
-            raise HTTPException(
+        allowed, remaining, retry_after, reset = result
+        headers = {
+            "RateLimit-Limit": str(limit),
+            "RateLimit-Remaining": str(remaining),
+            "RateLimit-Reset": str(reset),
+        }
+
+        if not allowed:
+            retry_after = str(max(retry_after, 1))
+            return JSONResponse(
                 status_code=429,
-                detail=f"Rate limit exceeded. Maximum {self.calls_per_hour} requests per hour."
+                content={
+                    "detail": f"Rate limit exceeded. Maximum {limit} request units per hour; "
+                              f"this request costs {cost}. Retry in {retry_after}s."
+                },
+                headers={**headers, "Retry-After": retry_after},
             )
 
         response = await call_next(request)
+        response.headers.update(headers)
         return response
-
-# Global rate limiter instance
-rate_limiter = RateLimiter()
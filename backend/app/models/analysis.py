@@ -6,10 +6,17 @@
 # and quantified scores — maintainability, security, performance,
 # dependency complexity, and technical debt ratio.
 # Created when user triggers POST /analysis/ for a specific commit.
+# One row per (repository, commit) — enforced by a unique constraint that
+# also serves the dedupe lookup; history pages are read newest first off
+# the (created_at DESC, id DESC) indexes (keyset pagination).
+# changes_data (the full AI report) is deferred: queries only load it when
+# they ask for it with undefer(), and touching it otherwise raises instead
+# of silently issuing a second query.
+# rag_document_id links the row to its RAG vectors, removed with the row.
 # ============================================================================
 
-from sqlalchemy import JSON, Column, DateTime, ForeignKey, Integer, String, Text
-from sqlalchemy.orm import relationship
+from sqlalchemy import JSON, Column, DateTime, ForeignKey, Index, Integer, String, Text, UniqueConstraint
+from sqlalchemy.orm import deferred, relationship
 from sqlalchemy.sql import func
 
 from app.core.database import Base
@@ -22,7 +29,7 @@ class Analysis(Base):
     repository_id = Column(Integer, ForeignKey("repositories.id"), nullable=False)
     commit_hash = Column(String, nullable=False)
     summary = Column(Text, nullable=False)  # AI-generated summary
-    changes_data = Column(JSON, nullable=False)  # Detailed changes info
+    changes_data = deferred(Column(JSON, nullable=False), raiseload=True)  # Detailed changes info
     risk_level = Column(String, nullable=False, default="low")  # low, medium, high
     files_changed = Column(Integer, default=0)
     lines_added = Column(Integer, default=0)
@@ -32,8 +39,15 @@ class Analysis(Base):
     performance_score = Column(Integer, default=100)
     dependency_complexity = Column(Integer, default=0)
     technical_debt_ratio = Column(Integer, default=0)
+    rag_document_id = Column(String, nullable=True)  # RAG knowledge-base document (RAGService.store_analysis)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    __table_args__ = (
+        UniqueConstraint("repository_id", "commit_hash", name="uq_analysis_results_repository_commit"),
+        Index("ix_analysis_results_repository_created_id", repository_id, created_at.desc(), id.desc()),
+        Index("ix_analysis_results_created_id", created_at.desc(), id.desc()),
+    )
+
     # Relationship to repository
     repository = relationship("Repository", back_populates="analyses")
 
@@ -6,10 +6,11 @@
 # full analysis text, risk level, change type, overall score (1-10),
 # and complete analysis data as JSON.
 # Created when user triggers POST /analysis/pr/ for a specific PR.
+# full_analysis / analysis_data are deferred like Analysis.changes_data.
 # ============================================================================
 
-from sqlalchemy import JSON, Column, DateTime, ForeignKey, Integer, String, Text
-from sqlalchemy.orm import relationship
+from sqlalchemy import JSON, Column, DateTime, ForeignKey, Index, Integer, String, Text
+from sqlalchemy.orm import deferred, relationship
 from sqlalchemy.sql import func
 
 from app.core.database import Base
@@ -23,16 +24,22 @@ class PRAnalysis(Base):
     pull_request_id = Column(Integer, ForeignKey("pull_requests.id"), nullable=True)
     pr_number = Column(Integer, nullable=False)
     summary = Column(Text, nullable=False)
-    full_analysis = Column(Text, nullable=False)
+    full_analysis = deferred(Column(Text, nullable=False), raiseload=True)
     risk_level = Column(String, nullable=False, default="medium")
     change_type = Column(String, nullable=False, default="other")
     files_changed = Column(Integer, default=0)
     lines_added = Column(Integer, default=0)
     lines_removed = Column(Integer, default=0)
     overall_score = Column(Integer, default=7)  # 1-10 rating
-    analysis_data = Column(JSON, nullable=False)  # Complete analysis details
+    analysis_data = deferred(Column(JSON, nullable=False), raiseload=True)  # Complete analysis details
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    __table_args__ = (
+        Index("ix_pr_analysis_results_repository_pr", "repository_id", "pr_number"),
+        Index("ix_pr_analysis_results_repository_created_id", repository_id, created_at.desc(), id.desc()),
+        Index("ix_pr_analysis_results_created_id", created_at.desc(), id.desc()),
+    )
+
     # Relationships
     repository = relationship("Repository", back_populates="pr_analyses")
     pull_request = relationship("PullRequest", back_populates="pr_analysis")
@@ -4,9 +4,14 @@
 # Stores authenticated users who logged in via GitHub OAuth.
 # Fields: github_id, username, email, avatar_url, access_token (GitHub token)
 # This is the first table — all other tables reference users via user_id.
+# access_token_hash (sha256 of the token, indexed) is what requests are
+# authenticated by; it is kept in sync whenever access_token is assigned.
 # ============================================================================
 
+import hashlib
+
 from sqlalchemy import Column, DateTime, Integer, String, Text
+from sqlalchemy.orm import validates
 from sqlalchemy.sql import func
 
 from app.core.database import Base
@@ -21,8 +26,18 @@ class User(Base):
     email = Column(String, index=True, nullable=True)
     avatar_url = Column(String, nullable=True)
     access_token = Column(Text, nullable=False)  # GitHub access token
+    access_token_hash = Column(String(64), index=True, nullable=True)  # sha256 hex of access_token
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+    @staticmethod
+    def hash_token(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    @validates("access_token")
+    def _sync_token_hash(self, key, token):
+        self.access_token_hash = self.hash_token(token) if token else None
+        return token
+
     def __repr__(self):
         return f"<User(id={self.id}, username='{self.username}')>"
@@ -9,4 +9,5 @@
 #   - rag.py          → RAG knowledge base endpoints
 #   - agents.py       → Multi-agent analysis endpoints
 #   - autofix.py      → AI auto-fix generation endpoints
+#   - llm.py          → LLM client + gateway metrics
 # ============================================================================
@@ -15,10 +15,11 @@
 import json
 
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sse_starlette.sse import EventSourceResponse
 
-from app.core.database import get_db
+from app.core.database import get_async_db
 from app.models.repository import Repository
 from app.models.user import User
 from app.schemas.agent import (
@@ -27,6 +28,7 @@ from app.schemas.agent import (
 )
 from app.services.agents.orchestrator import agent_orchestrator
 from app.services.github_service import github_service
+from app.services.llm.quota import llm_quota
 
 router = APIRouter()
 
@@ -34,24 +36,26 @@ router = APIRouter()
 @router.post("/multi-agent/quick")
 async def multi_agent_quick_analysis(
     request: MultiAgentAnalysisRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Run multi-agent AI analysis on a commit — 3 specialist agents in parallel."""
-    repository = db.query(Repository).filter(Repository.id == request.repository_id).first()
+    repository = await db.scalar(select(Repository).where(Repository.id == request.repository_id))
     if not repository:
         raise HTTPException(status_code=404, detail="Repository not found")
 
-    user = db.query(User).filter(User.id == repository.user_id).first()
+    user = await db.scalar(select(User).where(User.id == repository.user_id))
     if not user:
         raise HTTPException(status_code=401, detail="Repository owner not found")
 
     try:
-        commit_data = await github_service.get_commit_diff(
-            user, repository.repo_name, request.commit_sha
+        commit_data = await github_service.get_commit_diff_cached(
+            user, repository.id, repository.repo_name, request.commit_sha
         )
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to fetch commit: {str(e)}")
 
+    await llm_quota.admit(user.id, repository.id, agent_orchestrator.estimate_commit_tokens(commit_data))
+
     result = await agent_orchestrator.run_multi_agent_analysis(commit_data)
     return result
 
@@ -59,14 +63,14 @@ async def multi_agent_quick_analysis(
 @router.post("/multi-agent/pr/quick")
 async def multi_agent_quick_pr_analysis(
     request: MultiAgentPRAnalysisRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Run multi-agent AI analysis on a pull request — 3 specialist agents in parallel."""
-    repository = db.query(Repository).filter(Repository.id == request.repository_id).first()
+    repository = await db.scalar(select(Repository).where(Repository.id == request.repository_id))
     if not repository:
         raise HTTPException(status_code=404, detail="Repository not found")
 
-    user = db.query(User).filter(User.id == repository.user_id).first()
+    user = await db.scalar(select(User).where(User.id == repository.user_id))
     if not user:
         raise HTTPException(status_code=401, detail="Repository owner not found")
 
@@ -77,6 +81,8 @@ async def multi_agent_quick_pr_analysis(
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to fetch PR: {str(e)}")
 
+    await llm_quota.admit(user.id, repository.id, agent_orchestrator.estimate_pr_tokens(pr_data))
+
     result = await agent_orchestrator.run_multi_agent_pr_analysis(pr_data)
     return result
 
@@ -84,24 +90,26 @@ async def multi_agent_quick_pr_analysis(
 @router.post("/multi-agent/stream")
 async def stream_multi_agent_analysis(
     request: MultiAgentAnalysisRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Stream multi-agent analysis progress via Server-Sent Events (SSE)."""
-    repository = db.query(Repository).filter(Repository.id == request.repository_id).first()
+    repository = await db.scalar(select(Repository).where(Repository.id == request.repository_id))
     if not repository:
         raise HTTPException(status_code=404, detail="Repository not found")
 
-    user = db.query(User).filter(User.id == repository.user_id).first()
+    user = await db.scalar(select(User).where(User.id == repository.user_id))
     if not user:
         raise HTTPException(status_code=401, detail="Repository owner not found")
 
     try:
-        commit_data = await github_service.get_commit_diff(
-            user, repository.repo_name, request.commit_sha
+        commit_data = await github_service.get_commit_diff_cached(
+            user, repository.id, repository.repo_name, request.commit_sha
         )
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to fetch commit: {str(e)}")
 
+    await llm_quota.admit(user.id, repository.id, agent_orchestrator.estimate_commit_tokens(commit_data))
+
     async def event_generator():
         async for event in agent_orchestrator.stream_multi_agent_analysis(commit_data):
             yield {
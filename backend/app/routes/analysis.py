@@ -6,12 +6,14 @@
 #   STANDARD ENDPOINTS (JSON request/response):
 #   - POST /analysis/quick             → Quick AI summary of a commit
 #   - POST /analysis/                  → Full detailed AI analysis (saves to DB)
-#   - GET  /analysis/                  → List all past analyses (with filters)
+#   - GET  /analysis/                  → Analysis history, newest first
+#                                        (cursor paging, see core/pagination.py)
 #   - GET  /analysis/{id}              → Get a specific analysis by ID
 #   - GET  /analysis/compare/{id1}/{id2} → Compare two analyses side-by-side
 #   - DELETE /analysis/{id}            → Delete an analysis
 #   - POST /analysis/pr/quick          → Quick AI PR analysis
 #   - POST /analysis/pr/               → Full AI PR analysis (saves to DB)
+#   - GET  /analysis/pr/               → PR analysis history (cursor paging)
 #
 #   STREAMING ENDPOINTS (Server-Sent Events):
 #   - POST /analysis/stream            → Real-time streaming commit analysis
@@ -19,16 +21,23 @@
 #
 # Quick analysis returns results WITHOUT saving to DB.
 # Full analysis saves results to the database for history tracking.
-# Stream endpoints send real-time progress events via SSE.
+# Stream endpoints send real-time progress events via SSE; the commit stream
+# also forwards the model's output field by field while it is generated
+# ("delta" / "item" / "field" events, see services/llm/json_stream.py).
 # ============================================================================
 
 import json
+import logging
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import case, func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only, selectinload, undefer
 from sse_starlette.sse import EventSourceResponse
 
-from app.core.database import get_db
+from app.core.database import get_async_db
+from app.core.pagination import NEXT_CURSOR_HEADER, keyset_page, split_page
 from app.core.redis import TTL_ANALYSIS, TTL_ANALYSIS_LIST, CacheManager
 from app.core.security import get_github_user
 from app.models.analysis import Analysis
@@ -39,6 +48,7 @@ from app.schemas.analysis import (
     AnalysisCreate,
     AnalysisRequest,
     AnalysisResponse,
+    AnalysisSummaryResponse,
     DetailedAnalysisResponse,
     FixableIssue,
     QuickAnalysisResponse,
@@ -47,14 +57,17 @@ from app.schemas.analysis import (
 from app.schemas.pr_analysis import (
     PRAnalysisRequest,
     PRAnalysisResponse,
+    PRAnalysisSummaryResponse,
     QuickPRAnalysisRequest,
     QuickPRAnalysisResponse,
     StreamPRAnalysisRequest,
 )
 from app.services.gemini_service import gemini_service
 from app.services.github_service import github_service
+from app.services.llm.quota import llm_quota
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 
 # ====================================================================
@@ -62,21 +75,23 @@ router = APIRouter()
 # ====================================================================
 
 @router.post("/stream")
-async def stream_analysis(request: StreamAnalysisRequest, db: Session = Depends(get_db)):
+async def stream_analysis(request: StreamAnalysisRequest, db: AsyncSession = Depends(get_async_db)):
     """Stream AI analysis in real-time via Server-Sent Events (SSE)."""
-    repository = db.query(Repository).filter(Repository.id == request.repository_id).first()
+    repository = await db.scalar(select(Repository).where(Repository.id == request.repository_id))
     if not repository:
         raise HTTPException(status_code=404, detail="Repository not found")
 
-    user = db.query(User).filter(User.id == repository.user_id).first()
+    user = await db.scalar(select(User).where(User.id == repository.user_id))
     if not user:
         raise HTTPException(status_code=401, detail="Repository owner not found")
 
     try:
-        commit_data = await github_service.get_commit_diff(user, repository.repo_name, request.commit_sha)
+        commit_data = await github_service.get_commit_diff_cached(user, repository.id, repository.repo_name, request.commit_sha)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to fetch commit: {str(e)}")
 
+    await llm_quota.admit(user.id, repository.id, gemini_service.estimate_commit_tokens(commit_data))
+
     async def event_generator():
         async for event in gemini_service.stream_analysis(commit_data):
             yield {
@@ -88,13 +103,13 @@ async def stream_analysis(request: StreamAnalysisRequest, db: Session = Depends(
 
 
 @router.post("/pr/stream")
-async def stream_pr_analysis(request: StreamPRAnalysisRequest, db: Session = Depends(get_db)):
+async def stream_pr_analysis(request: StreamPRAnalysisRequest, db: AsyncSession = Depends(get_async_db)):
     """Stream PR analysis in real-time via Server-Sent Events (SSE)."""
-    repository = db.query(Repository).filter(Repository.id == request.repository_id).first()
+    repository = await db.scalar(select(Repository).where(Repository.id == request.repository_id))
     if not repository:
         raise HTTPException(status_code=404, detail="Repository not found")
 
-    user = db.query(User).filter(User.id == repository.user_id).first()
+    user = await db.scalar(select(User).where(User.id == repository.user_id))
     if not user:
         raise HTTPException(status_code=401, detail="Repository owner not found")
 
@@ -103,6 +118,8 @@ async def stream_pr_analysis(request: StreamPRAnalysisRequest, db: Session = Dep
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to fetch PR: {str(e)}")
 
+    await llm_quota.admit(user.id, repository.id, gemini_service.estimate_pr_tokens(pr_data))
+
     async def event_generator():
         async for event in gemini_service.stream_pr_analysis(pr_data):
             yield {
@@ -118,22 +135,24 @@ async def stream_pr_analysis(request: StreamPRAnalysisRequest, db: Session = Dep
 # ====================================================================
 
 @router.post("/quick", response_model=QuickAnalysisResponse)
-async def quick_analysis(request: AnalysisRequest, db: Session = Depends(get_db)):
+async def quick_analysis(request: AnalysisRequest, db: AsyncSession = Depends(get_async_db)):
     """Quick AI analysis of a commit — returns results without saving to DB"""
 
-    repository = db.query(Repository).filter(Repository.id == request.repository_id).first()
+    repository = await db.scalar(select(Repository).where(Repository.id == request.repository_id))
     if not repository:
         raise HTTPException(status_code=404, detail="Repository not found")
 
-    user = db.query(User).filter(User.id == repository.user_id).first()
+    user = await db.scalar(select(User).where(User.id == repository.user_id))
     if not user:
         raise HTTPException(status_code=401, detail="Repository owner not found")
 
     try:
-        commit_data = await github_service.get_commit_diff(user, repository.repo_name, request.commit_sha)
+        commit_data = await github_service.get_commit_diff_cached(user, repository.id, repository.repo_name, request.commit_sha)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to fetch commit: {str(e)}")
 
+    await llm_quota.admit(user.id, repository.id, gemini_service.estimate_commit_tokens(commit_data))
+
     try:
         analysis_result = await gemini_service.analyze_code_changes(commit_data)
     except Exception as e:
@@ -182,31 +201,33 @@ async def quick_analysis(request: AnalysisRequest, db: Session = Depends(get_db)
 @router.post("/", response_model=AnalysisResponse)
 async def create_analysis(
     analysis_data: AnalysisCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create and save a detailed analysis to the database"""
 
-    repository = db.query(Repository).filter(Repository.id == analysis_data.repository_id).first()
+    repository = await db.scalar(select(Repository).where(Repository.id == analysis_data.repository_id))
     if not repository:
         raise HTTPException(status_code=404, detail="Repository not found")
 
-    user = db.query(User).filter(User.id == repository.user_id).first()
+    user = await db.scalar(select(User).where(User.id == repository.user_id))
     if not user:
         raise HTTPException(status_code=401, detail="Repository owner not found")
 
-    existing_analysis = db.query(Analysis).filter(
+    existing_analysis = await db.scalar(select(Analysis).options(undefer(Analysis.changes_data)).where(
         Analysis.repository_id == analysis_data.repository_id,
         Analysis.commit_hash == analysis_data.commit_hash
-    ).first()
+    ))
 
     if existing_analysis:
         return existing_analysis
 
     try:
-        commit_diff = await github_service.get_commit_diff(user, repository.repo_name, analysis_data.commit_hash)
+        commit_diff = await github_service.get_commit_diff_cached(user, repository.id, repository.repo_name, analysis_data.commit_hash)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to fetch commit: {str(e)}")
 
+    await llm_quota.admit(user.id, repository.id, gemini_service.estimate_commit_tokens(commit_diff))
+
     try:
         analysis_result = await gemini_service.analyze_code_changes(commit_diff)
     except Exception as e:
@@ -226,60 +247,113 @@ async def create_analysis(
             security_score=analysis_result.get("security_score", 100),
             performance_score=analysis_result.get("performance_score", 100),
             dependency_complexity=len(analysis_result.get("dependency_analysis", {}).get("cross_file_connections", [])),
-            technical_debt_ratio=sum(a.get("technical_debt_ratio", 0) for a in analysis_result.get("ast_analysis", {}).get("complexity_summary", []))
+            technical_debt_ratio=sum(a.get("technical_debt_ratio", 0) for a in analysis_result.get("ast_analysis", {}).get("complexity_summary", [])),
+            rag_document_id=analysis_result.get("rag_document_id"),
         )
 
         db.add(analysis)
-        db.commit()
-        db.refresh(analysis)
+        await db.commit()
+        await db.refresh(analysis, ["created_at"])  # server default; the rest is already in memory
 
         # Invalidate analysis list caches — a new analysis was stored
         CacheManager.delete_pattern("analyses:list:*")
 
         return analysis
+    except IntegrityError:
+        # A concurrent request stored this commit first (unique constraint)
+        await db.rollback()
+        existing_analysis = await db.scalar(select(Analysis).options(undefer(Analysis.changes_data)).where(
+            Analysis.repository_id == analysis_data.repository_id,
+            Analysis.commit_hash == analysis_data.commit_hash
+        ))
+        if existing_analysis:
+            return existing_analysis
+        raise HTTPException(status_code=500, detail="Failed to save analysis")
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to save analysis: {str(e)}")
 
 
-@router.get("/", response_model=list[AnalysisResponse])
+# List projection: every column except changes_data. The two values the
+# dashboard reads from the report are extracted by Postgres instead.
+_ANALYSIS_SUMMARY_COLUMNS = (
+    Analysis.id,
+    Analysis.repository_id,
+    Analysis.commit_hash,
+    Analysis.summary,
+    Analysis.risk_level,
+    Analysis.files_changed,
+    Analysis.lines_added,
+    Analysis.lines_removed,
+    Analysis.maintainability_score,
+    Analysis.security_score,
+    Analysis.performance_score,
+    Analysis.dependency_complexity,
+    Analysis.technical_debt_ratio,
+    Analysis.created_at,
+    case(
+        (func.json_typeof(Analysis.changes_data["overall_score"]) == "number",
+         Analysis.changes_data["overall_score"].as_float()),
+        else_=None,
+    ).label("overall_score"),
+    case(
+        (func.json_typeof(Analysis.changes_data["recommendations"]) == "array",
+         func.json_array_length(Analysis.changes_data["recommendations"])),
+        else_=0,
+    ).label("recommendation_count"),
+)
+
+
+@router.get("/", response_model=list[AnalysisSummaryResponse])
 async def get_analyses(
+    response: Response,
     repository_id: int | None = Query(None),
-    limit: int = Query(50, le=100),
-    db: Session = Depends(get_db)
+    limit: int = Query(50, ge=1, le=100),
+    cursor: str | None = Query(None, description="X-Next-Cursor value from the previous page"),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get analysis history"""
-    cache_key = f"analyses:list:{repository_id or 'all'}:{limit}"
+    """Get analysis history, newest first. The next page's cursor is in X-Next-Cursor."""
+    cache_key = f"analyses:list:{repository_id or 'all'}:{limit}:{cursor or 'first'}"
     cached = CacheManager.get_json(cache_key)
     if cached is not None:
-        return cached
+        if cached["next_cursor"]:
+            response.headers[NEXT_CURSOR_HEADER] = cached["next_cursor"]
+        return cached["items"]
 
-    query = db.query(Analysis)
+    query = select(*_ANALYSIS_SUMMARY_COLUMNS)
     if repository_id:
-        query = query.filter(Analysis.repository_id == repository_id)
+        query = query.where(Analysis.repository_id == repository_id)
+    query = keyset_page(query, Analysis.created_at, Analysis.id, cursor, limit)
 
-    analyses = query.order_by(Analysis.created_at.desc()).limit(limit).all()
+    rows, next_cursor = split_page((await db.execute(query)).all(), limit)
 
-    result = [AnalysisResponse.model_validate(a).model_dump() for a in analyses]
-    CacheManager.set_json(cache_key, result, TTL_ANALYSIS_LIST)
-    return analyses
+    items = [AnalysisSummaryResponse.model_validate(row).model_dump() for row in rows]
+    CacheManager.set_json(cache_key, {"items": items, "next_cursor": next_cursor}, TTL_ANALYSIS_LIST)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return items
 
 
 @router.get("/{analysis_id}", response_model=DetailedAnalysisResponse)
-async def get_analysis(analysis_id: int, db: Session = Depends(get_db)):
+async def get_analysis(analysis_id: int, db: AsyncSession = Depends(get_async_db)):
     """Get detailed analysis by ID"""
     cache_key = f"analysis:{analysis_id}"
     cached = CacheManager.get_json(cache_key)
     if cached is not None:
         return cached
 
-    analysis = db.query(Analysis).filter(Analysis.id == analysis_id).first()
+    # Eager-load the repository (an AsyncSession cannot lazy-load it later)
+    # and the deferred report column
+    analysis = await db.scalar(
+        select(Analysis)
+        .options(selectinload(Analysis.repository), undefer(Analysis.changes_data))
+        .where(Analysis.id == analysis_id)
+    )
     if not analysis:
         raise HTTPException(status_code=404, detail="Analysis not found")
 
     changes = analysis.changes_data or {}
 
-    # Safely resolve repo name — relationship may not always lazy-load cleanly
     try:
         repo_name = analysis.repository.repo_name if analysis.repository else f"repo-{analysis.repository_id}"
     except Exception:
@@ -320,12 +394,19 @@ async def get_analysis(analysis_id: int, db: Session = Depends(get_db)):
 @router.post("/pr/quick", response_model=QuickPRAnalysisResponse)
 async def quick_pr_analysis(
     request: QuickPRAnalysisRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user: User = Depends(get_github_user),
 ):
 
     try:
         pr_data = await github_service.get_pull_request_files(user, request.repo_full_name, request.pr_number)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Failed to fetch PR: {str(e)}")
+
+    # Not a tracked repository — billed to the user's budget only
+    await llm_quota.admit(user.id, None, gemini_service.estimate_pr_tokens(pr_data))
+
+    try:
         analysis_result = await gemini_service.analyze_pull_request(pr_data)
 
         return QuickPRAnalysisResponse(
@@ -350,19 +431,72 @@ async def quick_pr_analysis(
         raise HTTPException(status_code=400, detail=f"PR analysis failed: {str(e)}")
 
 
+@router.get("/pr/", response_model=list[PRAnalysisSummaryResponse])
+async def get_pr_analyses(
+    response: Response,
+    repository_id: int | None = Query(None),
+    pr_number: int | None = Query(None),
+    limit: int = Query(50, ge=1, le=100),
+    cursor: str | None = Query(None, description="X-Next-Cursor value from the previous page"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get PR analysis history, newest first. The next page's cursor is in X-Next-Cursor."""
+    cache_key = f"pr_analyses:list:{repository_id or 'all'}:{pr_number or 'all'}:{limit}:{cursor or 'first'}"
+    cached = CacheManager.get_json(cache_key)
+    if cached is not None:
+        if cached["next_cursor"]:
+            response.headers[NEXT_CURSOR_HEADER] = cached["next_cursor"]
+        return cached["items"]
+
+    # full_analysis / analysis_data are the report blobs — not selected
+    query = select(
+        PRAnalysis.id,
+        PRAnalysis.repository_id,
+        PRAnalysis.pull_request_id,
+        PRAnalysis.pr_number,
+        PRAnalysis.summary,
+        PRAnalysis.risk_level,
+        PRAnalysis.change_type,
+        PRAnalysis.files_changed,
+        PRAnalysis.lines_added,
+        PRAnalysis.lines_removed,
+        PRAnalysis.overall_score,
+        PRAnalysis.created_at,
+    )
+    if repository_id:
+        query = query.where(PRAnalysis.repository_id == repository_id)
+    if pr_number:
+        query = query.where(PRAnalysis.pr_number == pr_number)
+    query = keyset_page(query, PRAnalysis.created_at, PRAnalysis.id, cursor, limit)
+
+    rows, next_cursor = split_page((await db.execute(query)).all(), limit)
+
+    items = [PRAnalysisSummaryResponse.model_validate(row).model_dump() for row in rows]
+    CacheManager.set_json(cache_key, {"items": items, "next_cursor": next_cursor}, TTL_ANALYSIS_LIST)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return items
+
+
 @router.post("/pr/", response_model=PRAnalysisResponse)
-async def create_pr_analysis(analysis_request: PRAnalysisRequest, db: Session = Depends(get_db)):
+async def create_pr_analysis(analysis_request: PRAnalysisRequest, db: AsyncSession = Depends(get_async_db)):
     """Create and save PR analysis to database"""
-    repository = db.query(Repository).filter(Repository.id == analysis_request.repository_id).first()
+    repository = await db.scalar(select(Repository).where(Repository.id == analysis_request.repository_id))
     if not repository:
         raise HTTPException(status_code=404, detail="Repository not found")
 
-    user = db.query(User).filter(User.id == repository.user_id).first()
+    user = await db.scalar(select(User).where(User.id == repository.user_id))
     if not user:
         raise HTTPException(status_code=401, detail="Repository owner not found")
 
     try:
         pr_data = await github_service.get_pull_request_files(user, repository.repo_name, analysis_request.pr_number)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Failed to fetch PR: {str(e)}")
+
+    await llm_quota.admit(user.id, repository.id, gemini_service.estimate_pr_tokens(pr_data))
+
+    try:
         analysis_result = await gemini_service.analyze_pull_request(pr_data)
 
         pr_analysis = PRAnalysis(
@@ -380,8 +514,10 @@ async def create_pr_analysis(analysis_request: PRAnalysisRequest, db: Session =
         )
 
         db.add(pr_analysis)
-        db.commit()
-        db.refresh(pr_analysis)
+        await db.commit()
+        await db.refresh(pr_analysis, ["created_at"])
+
+        CacheManager.delete_pattern("pr_analyses:list:*")
 
         return PRAnalysisResponse(
             id=pr_analysis.id,
@@ -413,15 +549,32 @@ async def create_pr_analysis(analysis_request: PRAnalysisRequest, db: Session =
 # ====================================================================
 
 @router.delete("/{analysis_id}")
-async def delete_analysis(analysis_id: int, db: Session = Depends(get_db)):
+async def delete_analysis(analysis_id: int, db: AsyncSession = Depends(get_async_db)):
     """Delete an analysis"""
-    analysis = db.query(Analysis).filter(Analysis.id == analysis_id).first()
+    analysis = await db.scalar(
+        select(Analysis).options(selectinload(Analysis.repository)).where(Analysis.id == analysis_id)
+    )
 
     if not analysis:
         raise HTTPException(status_code=404, detail="Analysis not found")
 
-    db.delete(analysis)
-    db.commit()
+    commit_hash = analysis.commit_hash
+    rag_document_id = analysis.rag_document_id
+    repository_name = analysis.repository.repo_name if analysis.repository else None
+
+    await db.delete(analysis)
+    await db.commit()
+
+    # Remove its vectors too, so deleted analyses stop showing up in RAG context
+    try:
+        from app.services.rag_service import rag_service
+        if rag_document_id:
+            rag_service.delete_analyses([rag_document_id])
+        else:
+            rag_service.delete_legacy_analyses([commit_hash], repository_name)
+        CacheManager.delete("rag:kb_info")
+    except Exception as e:
+        logger.warning(f"RAG delete failed (non-fatal): {e}")
 
     # Invalidate cached detail and all list variants
     CacheManager.delete(f"analysis:{analysis_id}")
@@ -431,10 +584,21 @@ async def delete_analysis(analysis_id: int, db: Session = Depends(get_db)):
 
 
 @router.get("/compare/{analysis_id1}/{analysis_id2}")
-async def compare_analyses(analysis_id1: int, analysis_id2: int, db: Session = Depends(get_db)):
+async def compare_analyses(analysis_id1: int, analysis_id2: int, db: AsyncSession = Depends(get_async_db)):
     """Compare two analyses side-by-side"""
-    analysis1 = db.query(Analysis).filter(Analysis.id == analysis_id1).first()
-    analysis2 = db.query(Analysis).filter(Analysis.id == analysis_id2).first()
+    # Scores only — one round trip, no report columns
+    rows = (await db.scalars(
+        select(Analysis).options(load_only(
+            Analysis.commit_hash,
+            Analysis.maintainability_score,
+            Analysis.security_score,
+            Analysis.performance_score,
+            Analysis.dependency_complexity,
+            Analysis.created_at,
+        )).where(Analysis.id.in_((analysis_id1, analysis_id2)))
+    )).all()
+    by_id = {a.id: a for a in rows}
+    analysis1, analysis2 = by_id.get(analysis_id1), by_id.get(analysis_id2)
 
     if not analysis1 or not analysis2:
         raise HTTPException(status_code=404, detail="Analysis not found")
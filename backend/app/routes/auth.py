@@ -13,10 +13,12 @@
 import secrets
 
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.auth_cache import token_cache
 from app.core.config import settings
-from app.core.database import get_db
+from app.core.database import get_async_db
 from app.models.user import User
 from app.schemas.auth import GitHubCallbackRequest
 from app.services.github_oauth import github_oauth
@@ -37,7 +39,7 @@ async def github_login():
 
 
 @router.get("/github/callback")
-async def github_callback(code: str, state: str = None, db: Session = Depends(get_db)):
+async def github_callback(code: str, state: str = None, db: AsyncSession = Depends(get_async_db)):
     """Handle GitHub OAuth callback"""
     try:
         from app.core.security import create_access_token
@@ -50,7 +52,7 @@ async def github_callback(code: str, state: str = None, db: Session = Depends(ge
 
         github_user = await github_oauth.get_user_info(access_token)
 
-        db_user = db.query(User).filter(User.github_id == str(github_user["id"])).first()
+        db_user = await db.scalar(select(User).where(User.github_id == str(github_user["id"])))
 
         if not db_user:
             db_user = User(
@@ -61,14 +63,18 @@ async def github_callback(code: str, state: str = None, db: Session = Depends(ge
                 access_token=access_token
             )
             db.add(db_user)
-            db.commit()
-            db.refresh(db_user)
+            await db.commit()
+            await db.refresh(db_user)
         else:
+            # The replaced token must stop resolving to this user
+            previous_hash = db_user.access_token_hash
             db_user.access_token = access_token
             db_user.username = github_user["login"]
             db_user.email = github_user.get("email")
             db_user.avatar_url = github_user.get("avatar_url")
-            db.commit()
+            await db.commit()
+            if previous_hash and previous_hash != db_user.access_token_hash:
+                token_cache.invalidate(previous_hash)
 
         create_access_token(data={"sub": str(db_user.id)})
 
@@ -89,7 +95,7 @@ async def github_callback(code: str, state: str = None, db: Session = Depends(ge
 @router.post("/github/callback")
 async def github_callback_post(
     callback_data: GitHubCallbackRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Handle GitHub OAuth callback via POST (for frontend)"""
     return await github_callback(
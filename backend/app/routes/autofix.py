@@ -19,9 +19,10 @@
 # ============================================================================
 
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.database import get_db
+from app.core.database import get_async_db
 from app.models.repository import Repository
 from app.models.user import User
 from app.schemas.autofix import (
@@ -34,6 +35,7 @@ from app.schemas.autofix import (
 from app.services.autofix_service import autofix_service
 from app.services.gemini_service import gemini_service
 from app.services.github_service import github_service
+from app.services.llm.quota import llm_quota
 
 router = APIRouter()
 
@@ -41,24 +43,27 @@ router = APIRouter()
 @router.post("/auto-fix", response_model=AutoFixResponse)
 async def generate_auto_fix(
     request: AutoFixRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Generate AI code fixes for issues found in a commit analysis."""
-    repository = db.query(Repository).filter(Repository.id == request.repository_id).first()
+    repository = await db.scalar(select(Repository).where(Repository.id == request.repository_id))
     if not repository:
         raise HTTPException(status_code=404, detail="Repository not found")
 
-    user = db.query(User).filter(User.id == repository.user_id).first()
+    user = await db.scalar(select(User).where(User.id == repository.user_id))
     if not user:
         raise HTTPException(status_code=401, detail="Repository owner not found")
 
     try:
-        commit_data = await github_service.get_commit_diff(
-            user, repository.repo_name, request.commit_sha
+        commit_data = await github_service.get_commit_diff_cached(
+            user, repository.id, repository.repo_name, request.commit_sha
         )
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to fetch commit: {str(e)}")
 
+    # Analysis + fix generation — both prompts carry the diff
+    await llm_quota.admit(user.id, repository.id, 2 * gemini_service.estimate_commit_tokens(commit_data))
+
     try:
         analysis_result = await gemini_service.analyze_code_changes(commit_data)
     except Exception as e:
@@ -14,13 +14,21 @@
 #   4. Repeat step 3 for more follow-up questions
 #
 # Sessions are stored in Redis and auto-expire after 2 hours.
+#
+# LLM quota: each message is admitted against the LLM token budgets of the
+# analysis' repository and its owner (llm_quota.admit) before Gemini is
+# called. Starting a session makes no LLM call; sessions started from a raw
+# context have no repository to bill and are bounded by the API rate limiter.
 # ============================================================================
 
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import undefer
 
-from app.core.database import get_db
+from app.core.database import get_async_db
 from app.models.analysis import Analysis
+from app.models.repository import Repository
 from app.schemas.chat import (
     ChatHistoryResponse,
     ChatMessage,
@@ -30,6 +38,7 @@ from app.schemas.chat import (
     ChatStartResponse,
 )
 from app.services.chat_service import SESSION_TTL, chat_service
+from app.services.llm.quota import llm_quota
 
 router = APIRouter()
 
@@ -38,15 +47,22 @@ router = APIRouter()
 # START CHAT SESSION — Link to an analysis and begin conversation
 # ====================================================================
 @router.post("/chat/start", response_model=ChatStartResponse)
-async def start_chat_session(request: ChatStartRequest, db: Session = Depends(get_db)):
+async def start_chat_session(request: ChatStartRequest, db: AsyncSession = Depends(get_async_db)):
     """Start a new chat session linked to a code analysis."""
     analysis_data = None
+    owner_id = repository_id = None
 
     if request.analysis_id:
-        analysis = db.query(Analysis).filter(Analysis.id == request.analysis_id).first()
+        analysis = await db.scalar(
+            select(Analysis).options(undefer(Analysis.changes_data)).where(Analysis.id == request.analysis_id)
+        )
         if not analysis:
             raise HTTPException(status_code=404, detail="Analysis not found")
 
+        # Billed for the session's LLM tokens
+        repository_id = analysis.repository_id
+        owner_id = await db.scalar(select(Repository.user_id).where(Repository.id == repository_id))
+
         changes = analysis.changes_data or {}
         analysis_data = {
             "summary": analysis.summary,
@@ -83,7 +99,7 @@ async def start_chat_session(request: ChatStartRequest, db: Session = Depends(ge
         )
 
     try:
-        session_id = chat_service.start_session(analysis_data)
+        session_id = chat_service.start_session(analysis_data, owner_id, repository_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to create chat session: {str(e)}")
 
@@ -100,6 +116,17 @@ async def start_chat_session(request: ChatStartRequest, db: Session = Depends(ge
 @router.post("/chat/message", response_model=ChatMessageResponse)
 async def send_chat_message(request: ChatMessageRequest):
     """Send a follow-up question about the analysis."""
+    try:
+        session = chat_service.get_session(request.session_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    await llm_quota.admit(
+        session.get("owner_id"),
+        session.get("repository_id"),
+        chat_service.estimate_message_tokens(session, request.message),
+    )
+
     try:
         result = await chat_service.send_message(request.session_id, request.message)
     except ValueError as e:
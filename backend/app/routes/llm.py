@@ -0,0 +1,56 @@
+# ============================================================================
+# ROUTES/LLM.PY — LLM Client + Gateway Metrics
+# ============================================================================
+#   GET /analysis/llm/gateway → per-model in-flight calls, queue depth,
+#                               token budget and queue-wait stats by priority
+#   GET /analysis/llm/calls   → per caller + model: calls, errors, retries,
+#                               latency and token usage
+#   GET /analysis/llm/quota   → token budget left for the signed-in user
+#                               and optionally one of their repositories,
+#                               plus admission counts
+#
+# All three require a GitHub session (Prometheus scrapes /metrics instead).
+# See services/llm/ for how calls are admitted, retried and measured.
+# ============================================================================
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database import get_async_db
+from app.core.security import get_github_user
+from app.models.repository import Repository
+from app.models.user import User
+from app.services.llm.client import llm_client
+from app.services.llm.gateway import llm_gateway
+from app.services.llm.quota import llm_quota
+
+router = APIRouter()
+
+
+@router.get("/llm/gateway")
+async def llm_gateway_stats(user: User = Depends(get_github_user)):
+    """Current load and queue-wait metrics of the shared LLM gateway."""
+    return llm_gateway.stats()
+
+
+@router.get("/llm/calls")
+async def llm_call_stats(user: User = Depends(get_github_user)):
+    """Latency, token and error metrics of every Gemini call, per caller."""
+    return llm_client.stats()
+
+
+@router.get("/llm/quota")
+async def llm_quota_stats(
+    repository_id: int | None = None,
+    db: AsyncSession = Depends(get_async_db),
+    user: User = Depends(get_github_user),
+):
+    """Tokens left this hour in the caller's LLM budget (and one of their repositories')."""
+    if repository_id is not None:
+        repository = await db.scalar(select(Repository).where(
+            Repository.id == repository_id, Repository.user_id == user.id
+        ))
+        if not repository:
+            raise HTTPException(status_code=404, detail="Repository not found")
+    return llm_quota.remaining(user.id, repository_id)
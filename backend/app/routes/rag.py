@@ -7,6 +7,7 @@
 #   POST /analysis/rag/search        → Search for similar past analyses
 #   GET  /analysis/rag/knowledge-base → View knowledge base overview
 #   GET  /analysis/rag/context       → Preview RAG context for a query
+#   POST /analysis/rag/compact       → Enforce retention policies now
 #   DELETE /analysis/rag/clear       → Clear the entire knowledge base
 #
 # The knowledge base is powered by ChromaDB (vector database) and
@@ -20,6 +21,7 @@ from fastapi import APIRouter, HTTPException, Query
 
 from app.core.redis import TTL_KB_INFO, CacheManager
 from app.schemas.rag import (
+    RAGCompactionResponse,
     RAGContextResponse,
     RAGKnowledgeBaseResponse,
     RAGSearchRequest,
@@ -40,7 +42,7 @@ router = APIRouter()
 async def store_analysis(request: RAGStoreRequest):
     """Store a completed analysis in the RAG knowledge base."""
     try:
-        result = rag_service.store_analysis(
+        result = await rag_service.store_analysis(
             analysis_data=request.analysis_data,
             repository_name=request.repository_name,
         )
@@ -54,6 +56,7 @@ async def store_analysis(request: RAGStoreRequest):
         document_id=result["document_id"],
         message="Analysis stored in knowledge base successfully.",
         total_documents=result["total_documents"],
+        chunks_stored=result.get("chunks_stored", 0),
     )
 
 
@@ -64,10 +67,11 @@ async def store_analysis(request: RAGStoreRequest):
 async def search_analyses(request: RAGSearchRequest):
     """Search the knowledge base for similar past analyses."""
     try:
-        results = rag_service.search_similar(
+        results = await rag_service.search_similar(
             query=request.query,
             repository_name=request.repository_name,
             top_k=request.top_k,
+            chunk_types=request.chunk_types,
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
@@ -98,6 +102,18 @@ async def get_knowledge_base():
     return RAGKnowledgeBaseResponse(**info)
 
 
+@router.post("/rag/compact", response_model=RAGCompactionResponse)
+async def compact_knowledge_base():
+    """Apply retention policies immediately (normally done by the background compactor)."""
+    try:
+        result = rag_service.compact()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to compact knowledge base: {str(e)}")
+
+    CacheManager.delete("rag:kb_info")
+    return RAGCompactionResponse(**result)
+
+
 @router.delete("/rag/clear")
 async def clear_knowledge_base():
     """Clear the entire RAG knowledge base."""
@@ -121,7 +137,7 @@ async def preview_rag_context(
 ):
     """Preview the RAG context that would be injected into an analysis prompt."""
     try:
-        result = rag_service.get_rag_context(
+        result = await rag_service.get_rag_context(
             current_analysis_text=query,
             repository_name=repository_name,
             top_k=top_k,
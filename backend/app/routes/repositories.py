@@ -7,6 +7,7 @@
 #   - GET    /repos/{id}                    → Get single repo details
 #   - DELETE /repos/{id}                    → Remove repo from tracking
 #   - GET    /repos/{id}/commits            → Fetch recent commits from GitHub
+#                                             (then prefetches the newest diffs)
 #   - GET    /repos/{id}/commits/{sha}/diff → Get full code diff of a commit
 #   - GET    /repos/{id}/pulls              → Fetch pull requests from GitHub
 #   - GET    /repos/{id}/pulls/{num}        → Get detailed PR info + diff
@@ -15,10 +16,13 @@
 # Commits/PRs are fetched live from GitHub, not stored locally.
 # ============================================================================
 
+import logging
+
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.database import get_db
+from app.core.database import get_async_db
 from app.core.redis import (
     TTL_COMMIT_DIFF,
     TTL_COMMITS_LIST,
@@ -36,15 +40,17 @@ from app.schemas.pull_request import (
     PullRequestFilesResponse,
 )
 from app.schemas.repository import CommitDiffResponse, CommitResponse, GitHubRepositoryResponse, RepositoryResponse
+from app.services.commit_prefetcher import commit_prefetcher
 from app.services.github_service import github_service
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 
 @router.get("/github/list", response_model=list[GitHubRepositoryResponse])
 async def list_github_repositories(
     per_page: int = Query(30, le=100),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user: User = Depends(get_github_user),
 ):
 
@@ -58,16 +64,16 @@ async def list_github_repositories(
 @router.post("/add-github-repo", response_model=RepositoryResponse)
 async def add_github_repository(
     repo_name: str = Query(..., description="Repository full name like 'username/repo-name'"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user: User = Depends(get_github_user),
 ):
 
     try:
         repo_details = await github_service.get_repository_details(user, repo_name)
 
-        existing_repo = db.query(Repository).filter(
+        existing_repo = await db.scalar(select(Repository).where(
             Repository.github_repo_id == str(repo_details["id"])
-        ).first()
+        ))
 
         if existing_repo:
             raise HTTPException(status_code=400, detail="Repository already added")
@@ -81,8 +87,8 @@ async def add_github_repository(
         )
 
         db.add(repository)
-        db.commit()
-        db.refresh(repository)
+        await db.commit()
+        await db.refresh(repository)
 
         # New repo added — invalidate user's repo list cache
         CacheManager.delete(f"repos:user:{user.id}")
@@ -97,7 +103,7 @@ async def add_github_repository(
 
 @router.get("/", response_model=list[RepositoryResponse])
 async def get_user_repositories(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user: User = Depends(get_github_user),
 ):
     """Get user's added repositories for analysis"""
@@ -106,9 +112,9 @@ async def get_user_repositories(
     if cached is not None:
         return cached
 
-    repositories = db.query(Repository).filter(
+    repositories = (await db.scalars(select(Repository).where(
         Repository.user_id == user.id
-    ).order_by(Repository.created_at.desc()).all()
+    ).order_by(Repository.created_at.desc()))).all()
 
     result = [RepositoryResponse.model_validate(r).model_dump() for r in repositories]
     CacheManager.set_json(cache_key, result, TTL_REPO_LIST)
@@ -116,14 +122,14 @@ async def get_user_repositories(
 
 
 @router.get("/{repo_id}", response_model=RepositoryResponse)
-async def get_repository(repo_id: int, db: Session = Depends(get_db)):
+async def get_repository(repo_id: int, db: AsyncSession = Depends(get_async_db)):
     """Get specific repository details"""
     cache_key = f"repo:{repo_id}"
     cached = CacheManager.get_json(cache_key)
     if cached is not None:
         return cached
 
-    repository = db.query(Repository).filter(Repository.id == repo_id).first()
+    repository = await db.scalar(select(Repository).where(Repository.id == repo_id))
     if not repository:
         raise HTTPException(status_code=404, detail="Repository not found")
 
@@ -133,25 +139,28 @@ async def get_repository(repo_id: int, db: Session = Depends(get_db)):
 
 
 @router.delete("/{repo_id}")
-async def remove_repository(repo_id: int, db: Session = Depends(get_db)):
+async def remove_repository(repo_id: int, db: AsyncSession = Depends(get_async_db)):
     """Remove repository from analysis"""
-    repository = db.query(Repository).filter(Repository.id == repo_id).first()
+    repository = await db.scalar(select(Repository).where(Repository.id == repo_id))
 
     if not repository:
         raise HTTPException(status_code=404, detail="Repository not found")
 
     try:
         from app.models.analysis import Analysis
-        db.query(Analysis).filter(Analysis.repository_id == repo_id).delete()
+        stored = (await db.execute(
+            select(Analysis.commit_hash, Analysis.rag_document_id).where(Analysis.repository_id == repo_id)
+        )).all()
+        await db.execute(delete(Analysis).where(Analysis.repository_id == repo_id))
 
         try:
             from app.models.pr_analysis import PRAnalysis
-            db.query(PRAnalysis).filter(PRAnalysis.repository_id == repo_id).delete()
+            await db.execute(delete(PRAnalysis).where(PRAnalysis.repository_id == repo_id))
         except Exception:
             pass
 
-        db.delete(repository)
-        db.commit()
+        await db.delete(repository)
+        await db.commit()
 
         # Invalidate caches for this repo and the user's repo list
         CacheManager.delete(f"repo:{repo_id}")
@@ -159,11 +168,22 @@ async def remove_repository(repo_id: int, db: Session = Depends(get_db)):
         CacheManager.delete_pattern(f"commits:{repo_id}:*")
         CacheManager.delete_pattern(f"commit_diff:{repo_id}:*")
         CacheManager.delete_pattern(f"prs:{repo_id}:*")
+        CacheManager.delete_pattern("analyses:list:*")
+        CacheManager.delete_pattern("pr_analyses:list:*")
+
+        # Drop the repository's analyses from the RAG knowledge base as well
+        try:
+            from app.services.rag_service import rag_service
+            rag_service.delete_analyses([doc_id for _, doc_id in stored if doc_id])
+            rag_service.delete_legacy_analyses([commit for commit, doc_id in stored if not doc_id], repository.repo_name)
+            CacheManager.delete("rag:kb_info")
+        except Exception as e:
+            logger.warning(f"RAG delete failed (non-fatal): {e}")
 
         return {"message": "Repository removed successfully"}
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to delete repository: {str(e)}")
 
 
@@ -171,45 +191,50 @@ async def remove_repository(repo_id: int, db: Session = Depends(get_db)):
 async def get_repository_commits(
     repo_id: int,
     limit: int = Query(10, le=50),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get recent commits from a repository"""
-    repository = db.query(Repository).filter(Repository.id == repo_id).first()
+    repository = await db.scalar(select(Repository).where(Repository.id == repo_id))
 
     if not repository:
         raise HTTPException(status_code=404, detail="Repository not found")
 
-    user = db.query(User).filter(User.id == repository.user_id).first()
+    user = await db.scalar(select(User).where(User.id == repository.user_id))
     if not user:
         raise HTTPException(status_code=401, detail="Repository owner not found")
 
     cache_key = f"commits:{repo_id}:{limit}"
     cached = CacheManager.get_json(cache_key)
     if cached is not None:
+        commit_prefetcher.schedule(repo_id, repository.repo_name, user.access_token, [c["sha"] for c in cached])
         return cached
 
     try:
         commits = await github_service.get_recent_commits(user, repository.repo_name, limit)
         result = [CommitResponse(**c).model_dump() for c in commits]
         CacheManager.set_json(cache_key, result, TTL_COMMITS_LIST)
-        return commits
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to fetch commits: {str(e)}")
 
+    # The next click is almost always one of the newest commits — warm its
+    # diff + static analysis in the background
+    commit_prefetcher.schedule(repo_id, repository.repo_name, user.access_token, [c["sha"] for c in commits])
+    return commits
+
 
 @router.get("/{repo_id}/commits/{commit_sha}/diff", response_model=CommitDiffResponse)
 async def get_commit_diff(
     repo_id: int,
     commit_sha: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get detailed diff for a specific commit"""
-    repository = db.query(Repository).filter(Repository.id == repo_id).first()
+    repository = await db.scalar(select(Repository).where(Repository.id == repo_id))
 
     if not repository:
         raise HTTPException(status_code=404, detail="Repository not found")
 
-    user = db.query(User).filter(User.id == repository.user_id).first()
+    user = await db.scalar(select(User).where(User.id == repository.user_id))
     if not user:
         raise HTTPException(status_code=401, detail="Repository owner not found")
 
@@ -232,14 +257,14 @@ async def get_repository_pull_requests(
     repo_id: int,
     state: str = Query("open", description="PR state: open, closed, or all"),
     limit: int = Query(10, le=50),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get pull requests from a repository"""
-    repository = db.query(Repository).filter(Repository.id == repo_id).first()
+    repository = await db.scalar(select(Repository).where(Repository.id == repo_id))
     if not repository:
         raise HTTPException(status_code=404, detail="Repository not found")
 
-    user = db.query(User).filter(User.id == repository.user_id).first()
+    user = await db.scalar(select(User).where(User.id == repository.user_id))
     if not user:
         raise HTTPException(status_code=401, detail="Repository owner not found")
 
@@ -261,14 +286,14 @@ async def get_repository_pull_requests(
 async def get_pull_request_files(
     repo_id: int,
     pr_number: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get detailed file changes for a specific pull request"""
-    repository = db.query(Repository).filter(Repository.id == repo_id).first()
+    repository = await db.scalar(select(Repository).where(Repository.id == repo_id))
     if not repository:
         raise HTTPException(status_code=404, detail="Repository not found")
 
-    user = db.query(User).filter(User.id == repository.user_id).first()
+    user = await db.scalar(select(User).where(User.id == repository.user_id))
     if not user:
         raise HTTPException(status_code=401, detail="Repository owner not found")
 
@@ -8,6 +8,8 @@
 #   - PerformanceAgentReport:      Detailed findings from PerformanceAgent
 #   - ArchitectureAgentReport:     Detailed findings from ArchitectureAgent
 #   - AgentReports:                Container for all agent reports
+#   - AgentRoutingDecision:        Why an agent ran, ran on the lite tier, or was skipped
+#   - DegradedAgent:               An agent that timed out / failed (partial review)
 #   - MultiAgentAnalysisResponse:  Full combined response
 #
 # Top-level fields are backward-compatible with single-agent analysis.
@@ -113,6 +115,29 @@ class AgentReports(BaseModel):
     architecture: ArchitectureAgentReport = ArchitectureAgentReport()
 
 
+class AgentRoutingDecision(BaseModel):
+    """Routing decision for one agent (see services/agents/router.py)."""
+    agent: str
+    action: str = "run"  # run | lite | skip
+    model_tier: str | None = "full"
+    reason: str = ""
+
+
+class AgentRouting(BaseModel):
+    """All routing decisions for one analysis run."""
+    decisions: list[AgentRoutingDecision] = []
+    llm_calls: int = 3
+    skipped: list[str] = []
+    lite: list[str] = []
+
+
+class DegradedAgent(BaseModel):
+    """An agent whose report is missing from the merged review."""
+    agent: str
+    status: str = "degraded"  # degraded (missed deadline) | error
+    error: str = ""
+
+
 # ─── Combined Response ──────────────────────────────────────────────────────
 
 class MultiAgentAnalysisResponse(BaseModel):
@@ -142,3 +167,10 @@ class MultiAgentAnalysisResponse(BaseModel):
 
     # Individual agent reports with deep specialist insights
     agent_reports: AgentReports = AgentReports()
+
+    # Which agents ran (and on which model tier) for this change
+    agent_routing: AgentRouting = AgentRouting()
+
+    # Agents that missed their deadline or failed; partial=True when any did
+    degraded_agents: list[DegradedAgent] = []
+    partial: bool = False
@@ -6,6 +6,7 @@
 #   Commit Analysis:
 #   - AnalysisCreate / AnalysisRequest → Input for full/quick analysis
 #   - AnalysisResponse              → Full analysis result from database
+#   - AnalysisSummaryResponse       → History list item (no changes_data)
 #   - QuickAnalysisResponse         → Quick AI result (NOT saved to DB)
 #   - DetailedAnalysisResponse      → Detailed view with all fields
 #   - StreamAnalysisRequest         → Input for streaming analysis (SSE)
@@ -62,6 +63,33 @@ class AnalysisResponse(BaseModel):
         from_attributes = True
 
 
+class AnalysisSummaryResponse(BaseModel):
+    """One row of GET /analysis/ — scores only, the report stays in the DB.
+
+    overall_score and recommendation_count are read out of changes_data by
+    Postgres, so the JSON column itself is never transferred.
+    """
+    id: int
+    repository_id: int
+    commit_hash: str
+    summary: str
+    risk_level: str
+    files_changed: int | None = 0
+    lines_added: int | None = 0
+    lines_removed: int | None = 0
+    maintainability_score: int | None = 70
+    security_score: int | None = 100
+    performance_score: int | None = 100
+    dependency_complexity: int | None = 0
+    technical_debt_ratio: int | None = 0
+    overall_score: float | None = None
+    recommendation_count: int = 0
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
 class FixableIssue(BaseModel):
     """An issue found during analysis with a fixable flag.
 
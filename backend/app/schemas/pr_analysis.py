@@ -5,6 +5,7 @@
 #   - PRAnalysisRequest: Input for triggering PR analysis (repo_id + pr_number)
 #   - QuickPRAnalysisRequest: Input for quick PR analysis (repo name + pr_number)
 #   - PRAnalysisResponse: Full PR analysis result saved to DB
+#   - PRAnalysisSummaryResponse: PR history list item (no report blobs)
 #   - QuickPRAnalysisResponse: Quick PR result with AI scores (not saved)
 #   - StreamPRAnalysisRequest: Input for streaming PR analysis
 # ============================================================================
@@ -53,6 +54,25 @@ class PRAnalysisResponse(BaseModel):
         from_attributes = True
 
 
+class PRAnalysisSummaryResponse(BaseModel):
+    """One row of GET /analysis/pr/ — without full_analysis / analysis_data."""
+    id: int
+    repository_id: int
+    pull_request_id: int | None = None
+    pr_number: int
+    summary: str
+    risk_level: str
+    change_type: str
+    files_changed: int | None = 0
+    lines_added: int | None = 0
+    lines_removed: int | None = 0
+    overall_score: int | None = 7
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
 class QuickPRAnalysisResponse(BaseModel):
     pr_number: int
     title: str
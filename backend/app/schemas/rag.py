@@ -5,8 +5,11 @@
 #   - RAGStoreRequest/Response:   Store an analysis into vector database
 #   - RAGSearchRequest/Response:  Search for similar past analyses
 #   - RAGSearchResult:            A single search result with similarity score
+#   - RAGMatchedChunk:            The finding / recommendation / file summary
+#                                 that matched (chunked indexing mode)
 #   - RAGKnowledgeBaseResponse:   Overview of what's stored in memory
 #   - RAGContextResponse:         The context injected into AI prompts
+#   - RAGCompactionResponse:      What a retention/compaction run removed
 #
 # Uses ChromaDB for vector storage and Google Embeddings for vectorization.
 # ============================================================================
@@ -25,6 +28,7 @@ class RAGStoreResponse(BaseModel):
     document_id: str
     message: str
     total_documents: int
+    chunks_stored: int = 0
 
 
 class RAGSearchRequest(BaseModel):
@@ -32,6 +36,15 @@ class RAGSearchRequest(BaseModel):
     query: str  # Natural language search query
     repository_name: str | None = None  # Optional: filter by repo
     top_k: int = 5  # Number of results to return
+    chunk_types: list[str] | None = None  # Optional: finding | recommendation | file_summary
+
+
+class RAGMatchedChunk(BaseModel):
+    """A chunk of a past analysis that matched the query"""
+    chunk_type: str
+    text: str
+    file: str | None = None
+    similarity_score: float
 
 
 class RAGSearchResult(BaseModel):
@@ -44,6 +57,8 @@ class RAGSearchResult(BaseModel):
     repository: str | None = None
     similarity_score: float
     metadata: dict = {}
+    matched_chunks: list[RAGMatchedChunk] = []
+    retrieval: str = "vector"  # vector | lexical | hybrid
 
 
 class RAGSearchResponse(BaseModel):
@@ -56,6 +71,7 @@ class RAGSearchResponse(BaseModel):
 class RAGKnowledgeBaseResponse(BaseModel):
     """Overview of the RAG knowledge base"""
     total_documents: int
+    total_chunks: int = 0
     repositories: list[str]
     message: str
 
@@ -65,3 +81,13 @@ class RAGContextResponse(BaseModel):
     context: str
     sources_used: int
     message: str
+
+
+class RAGCompactionResponse(BaseModel):
+    """Result of enforcing the retention policies"""
+    expired: int
+    superseded: int
+    over_repository_cap: int
+    deleted: int
+    total_documents: int
+    total_chunks: int
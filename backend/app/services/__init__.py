@@ -8,6 +8,12 @@
 #   - chat_service.py     → Multi-turn conversational AI (Redis-backed)
 #   - rag_service.py      → RAG engine (ChromaDB + Google Embeddings)
 #   - autofix_service.py  → AI code fix generator
+#   - context_packer.py   → Token-budgeted diff packing for prompts
+#   - commit_prefetcher.py → Background warm-up of commit diffs + static analysis
+#   - llm/                → Shared LLM infrastructure
+#     ├── client.py           → Model registry, retry, streaming, per-call metrics
+#     ├── gateway.py          → Concurrency cap, token budget, priority queue
+#     └── json_stream.py      → Incremental JSON parser for streamed output
 #   - agents/             → Multi-agent specialist system
 #     ├── base_agent.py       → Abstract base for all agents
 #     ├── security_agent.py   → Cybersecurity specialist
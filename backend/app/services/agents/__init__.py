@@ -7,4 +7,7 @@
 #   - performance_agent.py → Performance engineer specialist
 #   - architecture_agent.py → Senior architect specialist
 #   - orchestrator.py     → Coordinates all agents in parallel
+#   - context_cache.py    → Shared (cached) code-context prefix for all agents
+#   - router.py           → Picks which agents run (full / lite tier / skip)
+#   - hedging.py          → Per-agent deadlines + hedged retries
 # ============================================================================
@@ -3,9 +3,16 @@
 # ============================================================================
 # Provides the shared foundation that all specialist agents inherit from:
 #
-#   - Initializes the Gemini model with structured JSON output
-#   - Defines the common interface: analyze(code_diff, context) → dict
+#   - Calls Gemini through the shared LLM client ("agent" / "agent_lite"
+#     profiles: structured JSON output, low temperature)
+#   - Defines the common interface: analyze(code_context, shared_prefix) → dict
+#   - Prompts are laid out prefix-first: the shared code context, then this
+#     agent's role + schema, so all agents can reuse one cached prefix
+#     (see context_cache.py)
 #   - Handles error wrapping so individual agent failures don't crash the system
+#   - Calls Gemini asynchronously, so the orchestrator can cancel / hedge it
+#   - Supports a cheaper "lite" model tier and "skipped" placeholder reports
+#     for routing (see router.py)
 #   - Each subclass overrides: agent_name, system_prompt, output_schema
 #
 # The base agent enforces structured JSON output from Gemini, ensuring
@@ -16,10 +23,12 @@ import json
 from abc import ABC, abstractmethod
 from typing import Any
 
-import google.generativeai as genai
-from google.generativeai.types import GenerationConfig
+from opentelemetry import trace
 
-from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.tracing import traced
+from app.services.agents.context_cache import SharedPrefix
+from app.services.llm.client import llm_client
 
 
 class BaseAgent(ABC):
@@ -29,16 +38,6 @@ class BaseAgent(ABC):
     that makes it focus on one domain (security, performance, architecture).
     """
 
-    def __init__(self):
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-        self.model = genai.GenerativeModel(
-            'gemini-2.5-flash',
-            generation_config=GenerationConfig(
-                response_mime_type="application/json",
-                temperature=0.2,  # Low temp = focused, consistent specialist output
-            )
-        )
-
     @property
     @abstractmethod
     def agent_name(self) -> str:
@@ -54,36 +53,67 @@ class BaseAgent(ABC):
     def output_schema(self) -> str:
         """JSON schema string that this agent MUST return."""
 
-    def _build_prompt(self, code_context: str) -> str:
-        """Combines the system prompt + code context + output schema into one prompt."""
+    def _build_instructions(self) -> str:
+        """The agent-specific part of the prompt: role + output schema."""
         return f"""{self.system_prompt}
 
-{code_context}
+Review the code changes above.
 
 Return your analysis as JSON matching this EXACT schema:
 {self.output_schema}
 
 Return ONLY valid JSON. Be thorough, specific, and actionable."""
 
-    async def analyze(self, code_context: str) -> dict[str, Any]:
+    def _build_prompt(self, code_context: str) -> str:
+        """Shared code context first (cacheable prefix), then this agent's instructions."""
+        return f"""{code_context}
+
+{self._build_instructions()}"""
+
+    @traced("agent.analyze")
+    async def analyze(
+        self,
+        code_context: str,
+        shared_prefix: SharedPrefix | None = None,
+        tier: str = "full",
+    ) -> dict[str, Any]:
         """Run this agent's analysis on the given code context.
 
         Args:
             code_context: Pre-formatted string containing code diffs,
                           file info, commit metadata, and static analysis results.
+            shared_prefix: Cached copy of code_context shared with the other
+                           agents. In provider mode only the instructions are sent.
+            tier: "full" or "lite" (cheaper model; never uses the cached prefix,
+                  which is bound to the full model).
 
         Returns:
             Dict containing the agent's structured analysis result.
             On failure, returns a dict with agent_name, status='error', and error message.
         """
+        trace.get_current_span().set_attributes({"agent.name": self.agent_name, "agent.tier": tier})
         try:
-            prompt = self._build_prompt(code_context)
-            response = self.model.generate_content(prompt)
+            caller = f"agents.{self.agent_name}"
+            with metrics.stage("agent_orchestrator", f"llm_call.{self.agent_name}"):
+                if tier == "lite":
+                    # Cheaper tier for changes the router judged low-signal
+                    response = await llm_client.generate("agent_lite", self._build_prompt(code_context), caller=caller)
+                elif shared_prefix and shared_prefix.mode == "provider":
+                    response = await llm_client.generate(
+                        "agent",
+                        self._build_instructions(),
+                        caller=caller,
+                        model=llm_client.cached_model("agent", shared_prefix.cached_content),
+                        extra_tokens=shared_prefix.tokens,
+                    )
+                else:
+                    response = await llm_client.generate("agent", self._build_prompt(code_context), caller=caller)
             result = json.loads(response.text)
 
             # Tag the result with which agent produced it
             result["_agent"] = self.agent_name
             result["_status"] = "success"
+            result["_usage"] = self._usage(response)
             return result
 
         except json.JSONDecodeError as e:
@@ -98,3 +128,16 @@ Return ONLY valid JSON. Be thorough, specific, and actionable."""
                 "_status": "error",
                 "error": f"Agent analysis failed: {str(e)}",
             }
+
+    def skipped(self, reason: str) -> dict[str, Any]:
+        """Placeholder report for an agent the router decided not to run."""
+        return {"_agent": self.agent_name, "_status": "skipped", "_skip_reason": reason}
+
+    def _usage(self, response) -> dict[str, int]:
+        """Token counts reported by the API (cached_tokens = served from a context cache)."""
+        usage = getattr(response, "usage_metadata", None)
+        return {
+            "prompt_tokens": getattr(usage, "prompt_token_count", 0) or 0,
+            "cached_tokens": getattr(usage, "cached_content_token_count", 0) or 0,
+            "output_tokens": getattr(usage, "candidates_token_count", 0) or 0,
+        }
@@ -0,0 +1,147 @@
+# ============================================================================
+# SERVICES/AGENTS/CONTEXT_CACHE.PY — Shared Prompt Prefix for All Agents
+# ============================================================================
+# The three specialist agents review the SAME code context; only their
+# instructions differ. Prompts are therefore laid out as:
+#
+#   [shared prefix: code context]  +  [agent suffix: role + schema]
+#
+# and the prefix is uploaded ONCE per run instead of once per agent.
+#
+# Backends (AGENT_CONTEXT_CACHE_BACKEND):
+#   - "provider": Gemini explicit context caching — the prefix becomes a
+#                 CachedContent and each agent calls a model bound to it
+#                 with only its suffix. Prefixes below the provider minimum
+#                 (AGENT_CONTEXT_CACHE_MIN_TOKENS) or failed cache creation
+#                 fall back to "implicit".
+#   - "implicit": full prompt per agent, prefix-first so Gemini's implicit
+#                 prefix cache can still match it
+#   - "local":    in-process stand-in for tests / offline dev: same API
+#                 and handle reuse, but agents still send full prompts, so
+#                 it reports no savings
+#
+# Handles are reused while their TTL lasts, so reviewing the same commit
+# via /agents/analyze and /agents/stream shares one cache entry.
+#
+# Token savings per run are reported in the result as "context_cache":
+# provider-reported cached tokens when the API returns them, otherwise
+# the estimated prefix tokens that were not re-sent (provider mode only).
+# ============================================================================
+
+import hashlib
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any
+
+from app.core.config import settings
+from app.services.context_packer import estimate_tokens
+from app.services.llm.client import llm_client
+
+logger = logging.getLogger(__name__)
+
+TTL_SAFETY_MARGIN_SECONDS = 30
+
+
+@dataclass
+class SharedPrefix:
+    """A code context shared by all agents in one run."""
+
+    text: str
+    key: str
+    tokens: int
+    mode: str  # provider | implicit | local
+    cached_content: Any = None  # google.generativeai CachedContent (provider mode)
+    reused: bool = False  # handle already existed before this run
+
+
+class AgentContextCache:
+    """Creates (or reuses) the cached prefix for a code context."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: dict[str, tuple[SharedPrefix, float]] = {}  # key → (prefix, expires_at)
+
+    def acquire(self, code_context: str, model_name: str) -> SharedPrefix:
+        backend = settings.AGENT_CONTEXT_CACHE_BACKEND
+        key = hashlib.sha256(code_context.encode("utf-8")).hexdigest()
+        tokens = estimate_tokens(code_context)
+
+        if backend not in ("provider", "local"):
+            return SharedPrefix(code_context, key, tokens, "implicit")
+
+        with self._lock:
+            self._evict_expired()
+            entry = self._entries.get(key)
+            if entry:
+                prefix = entry[0]
+                return SharedPrefix(prefix.text, key, tokens, prefix.mode, prefix.cached_content, reused=True)
+
+        if backend == "local":
+            prefix = SharedPrefix(code_context, key, tokens, "local")
+        elif tokens < settings.AGENT_CONTEXT_CACHE_MIN_TOKENS:
+            return SharedPrefix(code_context, key, tokens, "implicit")
+        else:
+            prefix = self._create_provider_prefix(code_context, key, tokens, model_name)
+            if prefix.mode != "provider":
+                return prefix
+
+        # Stop handing out a handle shortly before the provider expires it
+        ttl = max(settings.AGENT_CONTEXT_CACHE_TTL_SECONDS - TTL_SAFETY_MARGIN_SECONDS, 0)
+        with self._lock:
+            self._entries[key] = (prefix, time.monotonic() + ttl)
+        return prefix
+
+    def report(self, prefix: SharedPrefix, agent_results: list[dict[str, Any]]) -> dict[str, Any]:
+        """Summarize input tokens saved by sharing the prefix across agents.
+
+        agent_results: results of the agents that were given the prefix.
+        """
+        agents = len(agent_results)
+        reported = sum(r.get("_usage", {}).get("cached_tokens", 0) for r in agent_results)
+
+        if reported:
+            saved = reported
+        elif prefix.mode == "provider":
+            # Every agent read the prefix from cache; it was uploaded once
+            # (or not at all when an earlier run created the handle).
+            # Implicit / local modes send the full prompt to every agent
+            saved = prefix.tokens * (agents if prefix.reused else agents - 1)
+        else:
+            saved = 0
+
+        return {
+            "mode": prefix.mode,
+            "prefix_tokens": prefix.tokens,
+            "agents": agents,
+            "reused_cache": prefix.reused,
+            "provider_cached_tokens": reported,
+            "input_tokens_saved": max(saved, 0),
+        }
+
+    def _create_provider_prefix(self, code_context: str, key: str, tokens: int, model_name: str) -> SharedPrefix:
+        try:
+            from google.generativeai import caching
+
+            llm_client.configure()
+            cached = caching.CachedContent.create(
+                model=model_name,
+                display_name=f"agent-context-{key[:12]}",
+                contents=[code_context],
+                ttl=timedelta(seconds=settings.AGENT_CONTEXT_CACHE_TTL_SECONDS),
+            )
+            return SharedPrefix(code_context, key, tokens, "provider", cached)
+        except Exception as e:
+            logger.warning(f"Context cache creation failed, sending full prompts: {e}")
+            return SharedPrefix(code_context, key, tokens, "implicit")
+
+    def _evict_expired(self) -> None:
+        now = time.monotonic()
+        for key in [k for k, (_, expires_at) in self._entries.items() if expires_at <= now]:
+            del self._entries[key]
+
+
+# Create global instance
+agent_context_cache = AgentContextCache()
@@ -0,0 +1,127 @@
+# ============================================================================
+# SERVICES/AGENTS/HEDGING.PY — Agent Deadlines + Hedged Requests
+# ============================================================================
+# Caps the tail latency of multi-agent reviews.
+#
+# WHY: asyncio.gather() waits for the slowest agent, and one hung Gemini
+# call used to hold the whole review forever.
+#
+# HOW IT WORKS:
+#   - Every agent call gets a deadline: min(AGENT_TIMEOUT_SECONDS, what is
+#     left of the run's MULTI_AGENT_SLA_SECONDS)
+#   - Recent successful latencies are tracked per (agent, model tier).
+#     Once a call runs longer than that agent's p95, an identical HEDGE
+#     request is fired; whichever succeeds first wins, the other is cancelled
+#     (before AGENT_HEDGE_MIN_SAMPLES are recorded, AGENT_HEDGE_FALLBACK_SECONDS
+#     is used instead of the p95)
+#   - A call that misses its deadline returns a "degraded" report, so the
+#     orchestrator can merge what it has and answer on time
+#
+# Latency history is in-process — each worker learns its own p95.
+# ============================================================================
+
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from app.core.config import settings
+
+# Successful latencies kept per (agent, tier) for the p95
+LATENCY_WINDOW = 200
+
+
+class AgentLatencyTracker:
+    """Rolling per-agent latency samples → hedge delay."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples: dict[str, deque] = {}
+
+    def record(self, key: str, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault(key, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+
+    def p95(self, key: str) -> float | None:
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        return self._p95(samples)
+
+    @staticmethod
+    def _p95(samples: list[float]) -> float | None:
+        """p95 of sorted samples, None until there are enough of them."""
+        if len(samples) < settings.AGENT_HEDGE_MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, math.ceil(0.95 * len(samples)) - 1)]
+
+    def hedge_delay(self, key: str) -> float:
+        return self.p95(key) or settings.AGENT_HEDGE_FALLBACK_SECONDS
+
+    def snapshot(self) -> dict[str, dict[str, Any]]:
+        # Copied under the lock: record() appends from worker threads
+        with self._lock:
+            samples = {key: sorted(values) for key, values in self._samples.items()}
+        return {key: {"samples": len(values), "p95_seconds": self._p95(values)} for key, values in samples.items()}
+
+
+async def call_with_deadline(
+    key: str,
+    agent_name: str,
+    make_call: Callable[[], Awaitable[dict[str, Any]]],
+    deadline: float,
+) -> dict[str, Any]:
+    """Run make_call() until it succeeds or `deadline` (time.monotonic()) passes.
+
+    Fires one hedge request once the primary exceeds the agent's p95.
+    Always returns a result dict — "degraded" on timeout.
+    """
+    started = time.monotonic()
+    hedge_at = started + agent_latency.hedge_delay(key) if settings.AGENT_HEDGING_ENABLED else math.inf
+    pending = {asyncio.create_task(make_call())}
+    attempts = 1
+    last_error: dict[str, Any] | None = None
+
+    try:
+        while pending:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+
+            wake_at = deadline if attempts > 1 else min(deadline, hedge_at)
+            done, pending = await asyncio.wait(pending, timeout=max(wake_at - now, 0), return_when=asyncio.FIRST_COMPLETED)
+
+            for task in done:
+                result = task.result()
+                if result.get("_status") == "success":
+                    elapsed = time.monotonic() - started
+                    agent_latency.record(key, elapsed)
+                    result["_latency_seconds"] = round(elapsed, 3)
+                    result["_attempts"] = attempts
+                    return result
+                last_error = result
+
+            if not done and attempts == 1 and time.monotonic() >= hedge_at:
+                pending.add(asyncio.create_task(make_call()))
+                attempts += 1
+    finally:
+        for task in pending:
+            task.cancel()
+
+    if last_error is not None and time.monotonic() < deadline:
+        return last_error
+
+    # Timed out — count the deadline as a sample so the p95 reflects slow calls
+    agent_latency.record(key, deadline - started)
+    return {
+        "_agent": agent_name,
+        "_status": "degraded",
+        "_attempts": attempts,
+        "error": f"{agent_name} missed its {deadline - started:.1f}s deadline",
+    }
+
+
+# Create global instance
+agent_latency = AgentLatencyTracker()
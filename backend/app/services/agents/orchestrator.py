@@ -6,22 +6,37 @@
 #   1. Takes code diff + commit metadata as input
 #   2. Runs static analysis pipeline (AST, security, dependency, performance)
 #   3. Retrieves RAG context (past analyses from AI memory)
-#   4. Builds a shared code context string for all agents
+#   4. Builds a shared code context string for all agents (diff hunks
+#      packed riskiest-first into a token budget — see context_packer.py)
 #   5. Launches SecurityAgent, PerformanceAgent, ArchitectureAgent IN PARALLEL
+#      — the code context is a shared, cached prompt prefix uploaded once
+#      per run (see context_cache.py); tokens saved → "context_cache"
+#      The router (router.py) first decides per agent: run / lite / skip,
+#      based on static-analysis signals and file types → "agent_routing"
 #   6. Collects all agent results
 #   7. Merges them into a single unified report (same JSON shape as before)
 #   8. Auto-stores the result in RAG for future reference
 #
 # Key advantage: All 3 agents run at the SAME TIME using asyncio.gather(),
-# so the total time ≈ slowest agent, not sum of all agents.
+# so the total time ≈ slowest agent, not sum of all agents. Each agent has
+# a deadline within the run's SLA and slow calls are hedged (hedging.py);
+# agents that miss it are reported as degraded and the rest is merged.
 #
 # Key methods:
 #   - run_multi_agent_analysis()  → Full parallel analysis for commits
 #   - run_multi_agent_pr_analysis() → Full parallel analysis for PRs
-#   - stream_multi_agent_analysis() → SSE streaming with per-agent progress
+#   - stream_multi_agent_analysis() → SSE streaming: each agent's report is
+#                                     sent as soon as that agent finishes
+#                                     ("agent_complete"), then the merged one
+#   - estimate_*_tokens()           → What a run will cost (LLM quota admission)
+#
+# Stages (analyzers, RAG retrieve / store, the agent fan-out and each
+# agent's LLM call) are timed into stage_duration_seconds{component=
+# "agent_orchestrator"} (core/metrics.py).
 # ============================================================================
 
 import asyncio
+import time
 from collections.abc import AsyncGenerator
 from typing import Any
 
@@ -29,9 +44,17 @@ from app.analyzers.ast_parser import ast_parser
 from app.analyzers.dependency_analyzer import dependency_analyzer
 from app.analyzers.performance_analyzer import performance_analyzer
 from app.analyzers.security_scanner import security_scanner
+from app.core.config import settings
+from app.core.metrics import metrics
 from app.services.agents.architecture_agent import architecture_agent
+from app.services.agents.context_cache import SharedPrefix, agent_context_cache
+from app.services.agents.hedging import call_with_deadline
 from app.services.agents.performance_agent import performance_agent
+from app.services.agents.router import agent_router
 from app.services.agents.security_agent import security_agent
+from app.services.context_packer import context_packer, estimate_tokens
+from app.services.gemini_service import NO_STATIC_RESULTS, cache_static_analysis, get_cached_static_analysis
+from app.services.llm.client import llm_client
 
 
 class AgentOrchestrator:
@@ -48,34 +71,10 @@ class AgentOrchestrator:
         commit_data: dict[str, Any],
         static_results: dict[str, Any],
         rag_context: str = "",
-    ) -> str:
-        """Build the shared code context string that all agents will receive."""
-        ast_analyses = static_results["ast_analyses"]
-
-        # Build file summaries with AST insights
-        files_info = []
-        for i, file in enumerate(commit_data.get("files", [])):
-            file_summary = (
-                f"File: {file['filename']} | Status: {file['status']} "
-                f"| +{file['additions']} -{file['deletions']}"
-            )
-
-            if i < len(ast_analyses) and not ast_analyses[i].get("error"):
-                ast = ast_analyses[i]
-                file_summary += (
-                    f"\n  Structure: {ast.get('functions', 0)} functions, "
-                    f"{ast.get('classes', 0)} classes, "
-                    f"complexity={ast.get('complexity_score', 0)}"
-                )
-                if ast.get("security_patterns"):
-                    file_summary += f"\n  Security flags: {', '.join(ast['security_patterns'])}"
-                if ast.get("code_quality_issues"):
-                    file_summary += f"\n  Quality issues: {', '.join(ast['code_quality_issues'])}"
-
-            if file.get("patch"):
-                file_summary += f"\n  Diff:\n{file['patch'][:800]}"
-
-            files_info.append(file_summary)
+    ) -> tuple[str, dict[str, Any]]:
+        """Build the shared code context all agents receive + the packing report."""
+        # File summaries with AST insights, riskiest hunks first within budget
+        packed = context_packer.pack(commit_data.get("files", []), static_results)
 
         # Static analysis summaries
         sec = static_results["security_analysis"]
@@ -106,24 +105,16 @@ STATIC ANALYSIS RESULTS:
 {dep_summary}
 
 FILES CHANGED:
-{chr(10).join(files_info)}
-{rag_section}"""
+{packed["text"]}
+{rag_section}""", packed["report"]
 
     def _build_pr_context(
         self,
         pr_data: dict[str, Any],
         rag_context: str = "",
-    ) -> str:
-        """Build code context string for PR analysis."""
-        files_info = []
-        for file in pr_data.get("files", [])[:20]:
-            file_summary = (
-                f"File: {file['filename']} | Status: {file['status']} "
-                f"| +{file['additions']} -{file['deletions']}"
-            )
-            if file.get("patch") and len(file["patch"]) < 1000:
-                file_summary += f"\n  Diff:\n{file['patch'][:600]}"
-            files_info.append(file_summary)
+    ) -> tuple[str, dict[str, Any]]:
+        """Build code context string for PR analysis + the packing report."""
+        packed = context_packer.pack(pr_data.get("files", []))
 
         rag_section = ""
         if rag_context:
@@ -142,40 +133,69 @@ Description:
 {pr_data.get('description', 'No description')[:500]}
 
 FILES CHANGED:
-{chr(10).join(files_info)}
-{rag_section}"""
+{packed["text"]}
+{rag_section}""", packed["report"]
+
+    # ====================================================================
+    # COST ESTIMATES — Tokens a run will spend (services/llm/quota.py)
+    # ====================================================================
+    def estimate_commit_tokens(self, commit_data: dict[str, Any]) -> int:
+        """Every agent's prompt + output, as if none were skipped or routed lite."""
+        static_results = get_cached_static_analysis(commit_data) or NO_STATIC_RESULTS
+        code_context, _ = self._build_code_context(commit_data, static_results)
+        return self._estimate_agents(code_context)
+
+    def estimate_pr_tokens(self, pr_data: dict[str, Any]) -> int:
+        code_context, _ = self._build_pr_context(pr_data)
+        return self._estimate_agents(code_context)
+
+    def _estimate_agents(self, code_context: str) -> int:
+        return sum(
+            estimate_tokens(agent._build_prompt(code_context)) + settings.LLM_OUTPUT_TOKEN_ESTIMATE
+            for agent in self.agents
+        )
 
     # ====================================================================
     # STATIC ANALYSIS — Same pipeline as the generalist
     # ====================================================================
     def _run_static_analysis(self, commit_data: dict[str, Any]) -> dict[str, Any]:
-        """Run all static analysis tools on the code files."""
+        """Run all static analysis tools on the code files (shares the generalist's cache)."""
+        cached = get_cached_static_analysis(commit_data)
+        if cached is not None:
+            return cached
+
         ast_analyses = []
         files_for_analysis = []
 
-        for file in commit_data.get("files", []):
-            if file.get("patch"):
-                filename = file["filename"]
-                patch_content = file["patch"]
-                ast_analysis = ast_parser.calculate_advanced_metrics(patch_content, filename)
-                ast_analyses.append(ast_analysis)
-                files_for_analysis.append({"filename": filename, "content": patch_content})
-
-        dependency_analysis = dependency_analyzer.analyze_dependencies(files_for_analysis)
-        security_analysis = security_scanner.scan_multiple_files(files_for_analysis)
-        performance_analysis = performance_analyzer.analyze_performance(files_for_analysis)
-
-        return {
+        with metrics.stage("agent_orchestrator", "ast"):
+            for file in commit_data.get("files", []):
+                if file.get("patch"):
+                    filename = file["filename"]
+                    patch_content = file["patch"]
+                    ast_analysis = ast_parser.calculate_advanced_metrics(patch_content, filename)
+                    ast_analyses.append(ast_analysis)
+                    files_for_analysis.append({"filename": filename, "content": patch_content})
+
+        with metrics.stage("agent_orchestrator", "dependency"):
+            dependency_analysis = dependency_analyzer.analyze_dependencies(files_for_analysis)
+        with metrics.stage("agent_orchestrator", "security"):
+            security_analysis = security_scanner.scan_multiple_files(files_for_analysis)
+        with metrics.stage("agent_orchestrator", "performance"):
+            performance_analysis = performance_analyzer.analyze_performance(files_for_analysis)
+
+        static_results = {
             "ast_analyses": ast_analyses,
             "dependency_analysis": dependency_analysis,
             "security_analysis": security_analysis,
             "performance_analysis": performance_analysis,
         }
+        cache_static_analysis(commit_data, static_results)
+        return static_results
 
     # ====================================================================
     # RAG HELPERS — Retrieve past analyses + auto-store new ones
     # ====================================================================
-    def _get_rag_context(self, commit_data: dict[str, Any]) -> str:
+    async def _get_rag_context(self, commit_data: dict[str, Any]) -> str:
         """Retrieve relevant past analyses from RAG knowledge base."""
         try:
             from app.services.rag_service import rag_service
@@ -184,15 +204,17 @@ FILES CHANGED:
             for file in commit_data.get("files", [])[:5]:
                 search_text += f"{file.get('filename', '')} "
 
-            rag_result = rag_service.get_rag_context(
-                current_analysis_text=search_text.strip(),
-                top_k=3,
-            )
+            with metrics.stage("agent_orchestrator", "rag_retrieve"):
+                rag_result = await rag_service.get_rag_context(
+                    current_analysis_text=search_text.strip(),
+                    repository_name=commit_data.get("repository"),
+                    top_k=3,
+                )
             return rag_result.get("context", "")
         except Exception:
             return ""
 
-    def _get_rag_context_for_pr(self, pr_data: dict[str, Any]) -> str:
+    async def _get_rag_context_for_pr(self, pr_data: dict[str, Any]) -> str:
         """Retrieve relevant past PR analyses from RAG knowledge base."""
         try:
             from app.services.rag_service import rag_service
@@ -201,23 +223,28 @@ FILES CHANGED:
             for file in pr_data.get("files", [])[:5]:
                 search_text += f"{file.get('filename', '')} "
 
-            rag_result = rag_service.get_rag_context(
-                current_analysis_text=search_text.strip(),
-                top_k=3,
-            )
+            with metrics.stage("agent_orchestrator", "rag_retrieve"):
+                rag_result = await rag_service.get_rag_context(
+                    current_analysis_text=search_text.strip(),
+                    repository_name=pr_data.get("repository"),
+                    top_k=3,
+                )
             return rag_result.get("context", "")
         except Exception:
             return ""
 
-    def _store_in_rag(self, analysis_result: dict[str, Any]) -> None:
+    async def _store_in_rag(self, analysis_result: dict[str, Any]) -> None:
         """Auto-store completed analysis in RAG for future reference."""
         try:
             from app.services.rag_service import rag_service
 
-            rag_service.store_analysis(
-                analysis_data=analysis_result,
-                repository_name=analysis_result.get("repository_name"),
-            )
+            with metrics.stage("agent_orchestrator", "rag_store"):
+                stored = await rag_service.store_analysis(
+                    analysis_data=analysis_result,
+                    repository_name=analysis_result.get("repository_name"),
+                )
+            # Saved on the Analysis row, so deleting the row removes exactly this document
+            analysis_result["rag_document_id"] = stored["document_id"]
         except Exception:
             pass
 
@@ -275,6 +302,7 @@ FILES CHANGED:
             "lines_added": commit_data["stats"]["additions"],
             "lines_removed": commit_data["stats"]["deletions"],
             "commit_hash": commit_data["sha"],
+            "repository_name": commit_data.get("repository"),
             "commit_message": commit_data["message"],
             "author": commit_data["author"],
             "analysis_date": commit_data.get("date", ""),
@@ -382,6 +410,7 @@ FILES CHANGED:
             "lines_added": pr_data["stats"]["additions"],
             "lines_removed": pr_data["stats"]["deletions"],
             "pr_number": pr_data["pr_number"],
+            "repository_name": pr_data.get("repository"),
             "pr_title": pr_data["title"],
             "author": pr_data["author"],
             "agent_reports": {
@@ -504,6 +533,102 @@ FILES CHANGED:
 
         return sorted(areas) if areas else ["General"]
 
+    # ====================================================================
+    # AGENT FAN-OUT — All agents in parallel over one shared prefix
+    # ====================================================================
+    async def _launch_agents(
+        self,
+        code_context: str,
+        routing: list[dict[str, Any]],
+        sla_deadline: float,
+    ) -> tuple[list[asyncio.Task], SharedPrefix | None]:
+        """Start the routed agents in parallel; returns (one task per agent, shared prefix).
+
+        Full-tier agents share one cached code-context prefix; lite-tier agents
+        send the full prompt to the cheaper model; skipped agents get a
+        placeholder report. Every call must finish by min(now +
+        AGENT_TIMEOUT_SECONDS, sla_deadline) or it is reported as degraded.
+        """
+        actions = {d["agent"]: d for d in routing}
+        full_agents = [a for a in self.agents if actions[a.agent_name]["action"] == "run"]
+
+        # A provider cache only pays off when 2+ agents read it
+        shared_prefix = None
+        if len(full_agents) > 1:
+            # Creating a provider cache is a blocking API call
+            shared_prefix = await asyncio.to_thread(
+                agent_context_cache.acquire, code_context, llm_client.model_name("agent")
+            )
+
+        deadline = min(time.monotonic() + settings.AGENT_TIMEOUT_SECONDS, sla_deadline)
+
+        async def run(agent) -> dict[str, Any]:
+            decision = actions[agent.agent_name]
+            if decision["action"] == "skip":
+                return agent.skipped(decision["reason"])
+            if decision["action"] == "lite":
+                def make_call():
+                    return agent.analyze(code_context, tier="lite")
+            else:
+                def make_call():
+                    return agent.analyze(code_context, shared_prefix)
+            return await call_with_deadline(
+                f"{agent.agent_name}:{decision['model_tier']}", agent.agent_name, make_call, deadline
+            )
+
+        return [asyncio.create_task(run(agent)) for agent in self.agents], shared_prefix
+
+    async def _run_agents(
+        self,
+        code_context: str,
+        routing: list[dict[str, Any]],
+        sla_deadline: float,
+    ) -> tuple[list[dict[str, Any]], dict[str, Any]]:
+        """Run the routed agents in parallel; returns (results in agent order, cache report)."""
+        with metrics.stage("agent_orchestrator", "agents"):
+            tasks, shared_prefix = await self._launch_agents(code_context, routing, sla_deadline)
+            agent_results = list(await asyncio.gather(*tasks))
+        return agent_results, self._cache_report(shared_prefix, routing, agent_results)
+
+    def _cache_report(
+        self,
+        shared_prefix: SharedPrefix | None,
+        routing: list[dict[str, Any]],
+        agent_results: list[dict[str, Any]],
+    ) -> dict[str, Any]:
+        full_agents = [d["agent"] for d in routing if d["action"] == "run"]
+        if shared_prefix is None:
+            return {
+                "mode": "none",
+                "prefix_tokens": 0,
+                "agents": len(full_agents),
+                "reused_cache": False,
+                "provider_cached_tokens": 0,
+                "input_tokens_saved": 0,
+            }
+        return agent_context_cache.report(shared_prefix, [r for r in agent_results if r["_agent"] in full_agents])
+
+    def _mark_degraded(self, final_result: dict[str, Any], agent_results: list[dict[str, Any]]) -> None:
+        """Flag a merged report built without some agents (timeout / error)."""
+        degraded = [
+            {"agent": r["_agent"], "status": r["_status"], "error": r.get("error", "")}
+            for r in agent_results
+            if r.get("_status") in ("degraded", "error")
+        ]
+        final_result["degraded_agents"] = degraded
+        final_result["partial"] = bool(degraded)
+        if degraded:
+            names = ", ".join(d["agent"] for d in degraded)
+            final_result["summary"] = f"[Partial review — {names} unavailable] {final_result['summary']}"
+
+    def _routing_report(self, routing: list[dict[str, Any]]) -> dict[str, Any]:
+        return {
+            "decisions": routing,
+            "llm_calls": sum(1 for d in routing if d["action"] != "skip"),
+            "skipped": [d["agent"] for d in routing if d["action"] == "skip"],
+            "lite": [d["agent"] for d in routing if d["action"] == "lite"],
+        }
+
     # ====================================================================
     # MAIN ENTRY POINT — Run multi-agent commit analysis
     # ====================================================================
@@ -511,21 +636,23 @@ FILES CHANGED:
         self, commit_data: dict[str, Any]
     ) -> dict[str, Any]:
         """Run all specialist agents in parallel on a commit."""
+        sla_deadline = time.monotonic() + settings.MULTI_AGENT_SLA_SECONDS
         static_results = self._run_static_analysis(commit_data)
-        rag_context = self._get_rag_context(commit_data)
-        code_context = self._build_code_context(commit_data, static_results, rag_context)
+        rag_context = await self._get_rag_context(commit_data)
+        code_context, packing_report = self._build_code_context(commit_data, static_results, rag_context)
+        routing = agent_router.route(commit_data.get("files", []), static_results)
 
-        agent_results = await asyncio.gather(
-            security_agent.analyze(code_context),
-            performance_agent.analyze(code_context),
-            architecture_agent.analyze(code_context),
-        )
+        agent_results, cache_report = await self._run_agents(code_context, routing, sla_deadline)
 
         final_result = self._merge_agent_results(
-            list(agent_results), commit_data, static_results
+            agent_results, commit_data, static_results
         )
+        final_result["context_packing"] = packing_report
+        final_result["context_cache"] = cache_report
+        final_result["agent_routing"] = self._routing_report(routing)
+        self._mark_degraded(final_result, agent_results)
 
-        self._store_in_rag(final_result)
+        await self._store_in_rag(final_result)
         return final_result
 
     # ====================================================================
@@ -535,17 +662,20 @@ FILES CHANGED:
         self, pr_data: dict[str, Any]
     ) -> dict[str, Any]:
         """Run all specialist agents in parallel on a pull request."""
-        rag_context = self._get_rag_context_for_pr(pr_data)
-        code_context = self._build_pr_context(pr_data, rag_context)
-
-        agent_results = await asyncio.gather(
-            security_agent.analyze(code_context),
-            performance_agent.analyze(code_context),
-            architecture_agent.analyze(code_context),
-        )
-
-        final_result = self._merge_pr_results(list(agent_results), pr_data)
-        self._store_in_rag(final_result)
+        sla_deadline = time.monotonic() + settings.MULTI_AGENT_SLA_SECONDS
+        rag_context = await self._get_rag_context_for_pr(pr_data)
+        code_context, packing_report = self._build_pr_context(pr_data, rag_context)
+        # Static analysis is only used for routing here — PR prompts don't include it
+        routing = agent_router.route(pr_data.get("files", []), self._run_static_analysis(pr_data))
+
+        agent_results, cache_report = await self._run_agents(code_context, routing, sla_deadline)
+
+        final_result = self._merge_pr_results(agent_results, pr_data)
+        final_result["context_packing"] = packing_report
+        final_result["context_cache"] = cache_report
+        final_result["agent_routing"] = self._routing_report(routing)
+        self._mark_degraded(final_result, agent_results)
+        await self._store_in_rag(final_result)
         return final_result
 
     # ====================================================================
@@ -555,6 +685,7 @@ FILES CHANGED:
         self, commit_data: dict[str, Any]
     ) -> AsyncGenerator[dict[str, Any]]:
         """Stream multi-agent analysis progress as SSE events."""
+        sla_deadline = time.monotonic() + settings.MULTI_AGENT_SLA_SECONDS
 
         yield {
             "event": "progress",
@@ -571,17 +702,20 @@ FILES CHANGED:
             "event": "progress",
             "data": {"step": "rag", "message": "Retrieving past analyses from AI memory...", "progress": 25},
         }
-        rag_context = self._get_rag_context(commit_data)
+        rag_context = await self._get_rag_context(commit_data)
 
-        code_context = self._build_code_context(commit_data, static_results, rag_context)
+        code_context, packing_report = self._build_code_context(commit_data, static_results, rag_context)
+        routing = agent_router.route(commit_data.get("files", []), static_results)
+        active = [d["agent"] for d in routing if d["action"] != "skip"]
 
         yield {
             "event": "progress",
             "data": {
                 "step": "agents_launch",
-                "message": "Launching 3 specialist agents in parallel...",
+                "message": f"Launching {len(active)} specialist agents in parallel...",
                 "progress": 35,
-                "agents": ["SecurityAgent", "PerformanceAgent", "ArchitectureAgent"],
+                "agents": active,
+                "routing": routing,
             },
         }
 
@@ -589,42 +723,60 @@ FILES CHANGED:
             "event": "progress",
             "data": {
                 "step": "agents_running",
-                "message": "SecurityAgent + PerformanceAgent + ArchitectureAgent analyzing...",
+                "message": f"{' + '.join(active)} analyzing...",
                 "progress": 55,
             },
         }
 
-        agent_results = await asyncio.gather(
-            security_agent.analyze(code_context),
-            performance_agent.analyze(code_context),
-            architecture_agent.analyze(code_context),
-        )
-
-        for result in agent_results:
-            status = "completed" if result.get("_status") == "success" else "failed"
-            yield {
-                "event": "agent_complete",
-                "data": {
-                    "agent": result.get("_agent", "Unknown"),
-                    "status": result.get("_status", "error"),
-                    "message": f"{result.get('_agent', 'Unknown')} {status}",
-                    "progress": 75,
-                },
-            }
+        # Emit each agent's report the moment it finishes — the fastest
+        # agent is not held back by the slowest one
+        started = time.monotonic()
+        tasks, shared_prefix = await self._launch_agents(code_context, routing, sla_deadline)
+        try:
+            for completed, next_result in enumerate(asyncio.as_completed(tasks), start=1):
+                result = await next_result
+                status = {"success": "completed", "skipped": "skipped", "degraded": "timed out"}.get(
+                    result.get("_status"), "failed"
+                )
+                yield {
+                    "event": "agent_complete",
+                    "data": {
+                        "agent": result.get("_agent", "Unknown"),
+                        "status": result.get("_status", "error"),
+                        "message": f"{result.get('_agent', 'Unknown')} {status}",
+                        "progress": 55 + 25 * completed // len(tasks),
+                        "completed": completed,
+                        "total": len(tasks),
+                        "elapsed_seconds": round(time.monotonic() - started, 2),
+                        "report": {k: v for k, v in result.items() if not k.startswith("_")},
+                    },
+                }
+        finally:
+            # Client went away mid-stream → stop paying for the remaining agents
+            for task in tasks:
+                task.cancel()
+
+        metrics.stage_duration.labels(component="agent_orchestrator", stage="agents").observe(time.monotonic() - started)
+        agent_results = [task.result() for task in tasks]  # agent order, for the merge
+        cache_report = self._cache_report(shared_prefix, routing, agent_results)
 
         yield {
             "event": "progress",
             "data": {"step": "merge", "message": "Merging specialist reports...", "progress": 85},
         }
         final_result = self._merge_agent_results(
-            list(agent_results), commit_data, static_results
+            agent_results, commit_data, static_results
         )
+        final_result["context_packing"] = packing_report
+        final_result["context_cache"] = cache_report
+        final_result["agent_routing"] = self._routing_report(routing)
+        self._mark_degraded(final_result, agent_results)
 
         yield {
             "event": "progress",
             "data": {"step": "rag_store", "message": "Storing in knowledge base...", "progress": 95},
         }
-        self._store_in_rag(final_result)
+        await self._store_in_rag(final_result)
 
         yield {
             "event": "complete",
@@ -632,7 +784,7 @@ FILES CHANGED:
                 "result": final_result,
                 "progress": 100,
                 "message": "Multi-agent analysis complete!",
-                "agents_used": 3,
+                "agents_used": len(active),
             },
         }
 
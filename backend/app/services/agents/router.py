@@ -0,0 +1,153 @@
+# ============================================================================
+# SERVICES/AGENTS/ROUTER.PY — Adaptive Agent Selection
+# ============================================================================
+# Decides, BEFORE any LLM call, which specialist agents a change needs.
+#
+# WHY: Most commits are small — docs, config, a one-line fix — and the
+# static analyzers already tell us when there is nothing for the security
+# or performance specialist to look at. Running all three agents on those
+# triples the cost for no extra insight.
+#
+# HOW IT WORKS:
+#   1. Every changed file is classified by path: code, config, test, docs
+#      (doc extensions only), asset (images, lockfiles, generated files).
+#      Unknown extensions count as code, so they are never skipped
+#   2. Static analysis signals are counted: security scanner findings +
+#      AST security patterns, performance anti-patterns, AST complexity
+#   3. Each agent gets one decision:
+#        run  → full model (gemini-2.5-flash, shared cached prefix)
+#        lite → cheaper tier (AGENT_LITE_MODEL) — relevant files, no signals
+#        skip → nothing in its domain; a neutral "skipped" report is merged
+#
+#   SecurityAgent:     run on code with findings or on config (secrets);
+#                      lite on code without findings; skip docs/assets only
+#   PerformanceAgent:  run on code with anti-patterns or high complexity;
+#                      lite on other code; skip when no code changed
+#   ArchitectureAgent: always invoked (it writes the summary + change_type);
+#                      lite when no code changed or the change is tiny
+#
+# Decisions (with reasons) are stored in the result as "agent_routing".
+# ============================================================================
+
+from pathlib import PurePosixPath
+from typing import Any
+
+from app.core.config import settings
+
+CODE_EXTENSIONS = {
+    ".py", ".js", ".jsx", ".ts", ".tsx", ".java", ".go", ".rb", ".php", ".cs", ".c", ".cc", ".cpp",
+    ".h", ".hpp", ".rs", ".kt", ".swift", ".scala", ".sql", ".sh", ".vue", ".svelte",
+}
+CONFIG_EXTENSIONS = {".json", ".yaml", ".yml", ".toml", ".ini", ".cfg", ".conf", ".env", ".xml", ".properties"}
+CONFIG_NAMES = {"dockerfile", "makefile", "procfile", ".env", ".gitignore", ".dockerignore"}
+DOCS_EXTENSIONS = {".md", ".rst", ".txt", ".adoc"}
+ASSET_EXTENSIONS = {".png", ".jpg", ".jpeg", ".gif", ".svg", ".ico", ".webp", ".lock", ".map", ".snap", ".pdf"}
+ASSET_NAMES = {"package-lock.json", "yarn.lock", "pnpm-lock.yaml", "poetry.lock", "pipfile.lock"}
+
+# Below this many changed lines of code a change counts as "tiny"
+TINY_CHANGE_LINES = 20
+# AST complexity at/above which the performance agent always runs
+HIGH_COMPLEXITY = 10
+
+
+def classify_file(filename: str) -> str:
+    """code | config | test | docs | asset"""
+    path = PurePosixPath(filename.lower())
+    name, suffix = path.name, path.suffix
+
+    if name in ASSET_NAMES or suffix in ASSET_EXTENSIONS or ".min." in name:
+        return "asset"
+    if suffix in DOCS_EXTENSIONS:
+        return "docs"
+    if name in CONFIG_NAMES or suffix in CONFIG_EXTENSIONS or name.startswith(".env"):
+        return "config"
+    if suffix in CODE_EXTENSIONS:
+        is_test = (
+            name.startswith("test_") or name.endswith(("_test.py", ".test.js", ".test.ts", ".spec.js", ".spec.ts"))
+            or any(part in ("test", "tests", "__tests__") for part in path.parts[:-1])
+        )
+        if is_test:
+            return "test"
+    # Anything not known to be harmless is reviewed as code (.mjs, .tf, .html,
+    # a script under docs/ ...) — an unknown type must not skip the agents
+    return "code"
+
+
+class AgentRouter:
+    """Maps a change's file types + static signals to per-agent decisions."""
+
+    def route(self, files: list[dict[str, Any]], static_results: dict[str, Any]) -> list[dict[str, Any]]:
+        """Return one {agent, action, model_tier, reason} decision per agent."""
+        if not settings.AGENT_ROUTING_ENABLED:
+            return [
+                self._decision(agent, "run", "routing disabled")
+                for agent in ("SecurityAgent", "PerformanceAgent", "ArchitectureAgent")
+            ]
+
+        kinds: dict[str, int] = {}
+        code_lines = 0
+        for file in files:
+            kind = classify_file(file["filename"])
+            kinds[kind] = kinds.get(kind, 0) + 1
+            if kind in ("code", "test"):
+                code_lines += file.get("additions", 0) + file.get("deletions", 0)
+
+        has_code = bool(kinds.get("code") or kinds.get("test"))
+        has_config = bool(kinds.get("config"))
+        signals = self._signals(static_results)
+        file_mix = ", ".join(f"{n} {kind}" for kind, n in sorted(kinds.items())) or "no files"
+
+        # SecurityAgent
+        if signals["security"]:
+            security = self._decision("SecurityAgent", "run", f"{signals['security']} static security findings")
+        elif has_config:
+            security = self._decision("SecurityAgent", "run", "config files changed (secrets / exposure risk)")
+        elif has_code:
+            security = self._decision("SecurityAgent", "lite", "code changed, no static security findings")
+        else:
+            security = self._decision("SecurityAgent", "skip", f"no code or config changed ({file_mix})")
+
+        # PerformanceAgent
+        if signals["performance"]:
+            performance = self._decision("PerformanceAgent", "run", f"{signals['performance']} static performance issues")
+        elif signals["max_complexity"] >= HIGH_COMPLEXITY:
+            performance = self._decision("PerformanceAgent", "run", f"complexity {signals['max_complexity']}")
+        elif kinds.get("code"):
+            performance = self._decision("PerformanceAgent", "lite", "code changed, no static performance issues")
+        else:
+            performance = self._decision("PerformanceAgent", "skip", f"no production code changed ({file_mix})")
+
+        # ArchitectureAgent — always invoked, it produces the summary
+        if not has_code:
+            architecture = self._decision("ArchitectureAgent", "lite", f"no code changed ({file_mix})")
+        elif code_lines < TINY_CHANGE_LINES and not signals["security"]:
+            architecture = self._decision("ArchitectureAgent", "lite", f"tiny change ({code_lines} lines of code)")
+        else:
+            architecture = self._decision("ArchitectureAgent", "run", f"{code_lines} lines of code changed")
+
+        return [security, performance, architecture]
+
+    def _signals(self, static_results: dict[str, Any]) -> dict[str, int]:
+        security_findings = sum(
+            len(found)
+            for scan in static_results.get("security_analysis", {}).get("file_scans", [])
+            for found in scan.get("security_issues", {}).values()
+        )
+        ast_analyses = static_results.get("ast_analyses", [])
+        security_findings += sum(len(a.get("security_patterns", [])) for a in ast_analyses)
+
+        return {
+            "security": security_findings,
+            "performance": static_results.get("performance_analysis", {}).get("issue_count", 0),
+            "max_complexity": max((a.get("complexity_score", 0) for a in ast_analyses), default=0),
+        }
+
+    def _decision(self, agent: str, action: str, reason: str) -> dict[str, Any]:
+        model = {"run": "full", "lite": "lite", "skip": None}[action]
+        if action == "lite" and not settings.AGENT_LITE_MODEL:
+            action, model = "run", "full"  # no cheaper tier configured
+        return {"agent": agent, "action": action, "model_tier": model, "reason": reason}
+
+
+# Create global instance
+agent_router = AgentRouter()
@@ -23,10 +23,7 @@
 import json
 from typing import Any
 
-import google.generativeai as genai
-from google.generativeai.types import GenerationConfig
-
-from app.core.config import settings
+from app.services.llm.client import llm_client
 
 # ---- JSON schema for fix generation (commit-based) ----
 FIX_GENERATION_SCHEMA = """{
@@ -57,18 +54,6 @@ CUSTOM_FIX_SCHEMA = """{
 class AutoFixService:
     """Generates AI-powered code fixes on demand using Google Gemini."""
 
-    def __init__(self):
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-
-        # JSON mode for structured fix output
-        self.model = genai.GenerativeModel(
-            "gemini-2.5-flash",
-            generation_config=GenerationConfig(
-                response_mime_type="application/json",
-                temperature=0.2,  # Lower temp = more precise code generation
-            ),
-        )
-
     # ====================================================================
     # COMMIT-BASED FIX GENERATION — Fix issues from an analysis report
     # ====================================================================
@@ -113,7 +98,7 @@ class AutoFixService:
 
         # Get fixes from Gemini
         try:
-            response = self.model.generate_content(prompt)
+            response = await self._generate(prompt)
             fix_result = json.loads(response.text)
         except json.JSONDecodeError:
             return {
@@ -158,7 +143,7 @@ class AutoFixService:
         )
 
         try:
-            response = self.model.generate_content(prompt)
+            response = await self._generate(prompt)
             fix_result = json.loads(response.text)
         except json.JSONDecodeError:
             return {
@@ -191,6 +176,10 @@ class AutoFixService:
             "additional_suggestions": fix_result.get("additional_suggestions", []),
         }
 
+    async def _generate(self, prompt: str):
+        """JSON fix-generation call ("autofix" profile: low temperature for precise code)."""
+        return await llm_client.generate("autofix", prompt, caller="autofix_service")
+
     # ====================================================================
     # ISSUE EXTRACTION — Pull fixable issues from analysis report
     # ====================================================================
@@ -19,41 +19,37 @@
 # Key methods:
 #   - start_session()    → Create a new chat session with analysis context
 #   - send_message()     → Send a follow-up question, get AI response
+#   - estimate_message_tokens() → What send_message() will cost (LLM quota)
 #   - get_history()      → Retrieve full conversation history
 #   - _build_system_context() → Build initial context from analysis data
+#
+# Sessions started from a saved analysis remember the repository and its
+# owner, whose LLM token budgets pay for the messages (services/llm/quota.py).
 # ============================================================================
 
 import json
 import uuid
 
-import google.generativeai as genai
-from google.generativeai.types import GenerationConfig
-
 from app.core.config import settings
 from app.core.redis import redis_client
+from app.services.context_packer import estimate_tokens
+from app.services.llm.client import llm_client
 
 # Session expiration time (2 hours)
 SESSION_TTL = 7200
 
 
 class ChatService:
-    def __init__(self):
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-        self.model = genai.GenerativeModel(
-            'gemini-2.5-flash',
-            generation_config=GenerationConfig(
-                temperature=0.4,  # Slightly more creative for conversations
-            )
-        )
-
     # ====================================================================
     # START SESSION — Create a new chat with analysis context
     # ====================================================================
-    def start_session(self, analysis_data: dict) -> str:
+    def start_session(self, analysis_data: dict, owner_id: int | None = None, repository_id: int | None = None) -> str:
         """Create a new chat session and store context in Redis.
 
         Args:
             analysis_data: The full analysis result (from DB or raw)
+            owner_id: Repository owner billed for the session's LLM tokens
+            repository_id: Repository billed for the session's LLM tokens
 
         Returns:
             session_id: Unique session identifier
@@ -67,6 +63,8 @@ class ChatService:
         session_data = {
             "context": system_context,
             "summary": analysis_data.get("summary", "Code analysis"),
+            "owner_id": owner_id,
+            "repository_id": repository_id,
             "history": []  # Will hold list of {"role": ..., "content": ...}
         }
 
@@ -94,42 +92,15 @@ class ChatService:
         Raises:
             ValueError: If session not found or expired
         """
-        # Load session from Redis
-        session_raw = redis_client.get(session_id)
-        if not session_raw:
-            raise ValueError("Chat session not found or expired. Start a new session.")
-
-        session_data = json.loads(session_raw)
-        context = session_data["context"]
+        session_data = self.get_session(session_id)
         history = session_data["history"]
-
-        # Build Gemini chat history from our stored history
-        gemini_history = []
-        for msg in history:
-            gemini_history.append({
-                "role": msg["role"],
-                "parts": [msg["content"]]
-            })
-
-        # Start a Gemini chat with the existing history
-        chat = self.model.start_chat(history=gemini_history)
-
-        # Build the prompt: include context on first message, just question on follow-ups
-        if not history:
-            # First message in the session — include full context
-            full_prompt = f"""{context}
-
-USER QUESTION:
-{user_message}
-
-Respond helpfully and specifically. Reference the actual code, scores, and findings from the analysis above. Be concise but thorough."""
-        else:
-            # Follow-up message — context is already in chat history
-            full_prompt = user_message
+        gemini_history, full_prompt = self._build_turn(session_data, user_message)
 
         # Send to Gemini and get response
         try:
-            response = chat.send_message(full_prompt)
+            # Chat is interactive: the request's LLM priority is set by
+            # LLMPriorityMiddleware, the gateway admits it ahead of batch work
+            response = await llm_client.chat("chat", gemini_history, full_prompt, caller="chat_service")
             ai_reply = response.text
         except Exception as e:
             ai_reply = f"I encountered an error processing your question: {str(e)}"
@@ -168,6 +139,23 @@ Respond helpfully and specifically. Reference the actual code, scores, and findi
             "history": clean_history
         }
 
+    def get_session(self, session_id: str) -> dict:
+        """Load a session from Redis.
+
+        Raises:
+            ValueError: If session not found or expired
+        """
+        session_raw = redis_client.get(session_id)
+        if not session_raw:
+            raise ValueError("Chat session not found or expired. Start a new session.")
+        return json.loads(session_raw)
+
+    def estimate_message_tokens(self, session_data: dict, user_message: str) -> int:
+        """Input + output tokens of send_message(), built with the real prompt builder."""
+        gemini_history, full_prompt = self._build_turn(session_data, user_message)
+        history_tokens = sum(estimate_tokens(part) for turn in gemini_history for part in turn["parts"])
+        return history_tokens + estimate_tokens(full_prompt) + settings.LLM_OUTPUT_TOKEN_ESTIMATE
+
     # ====================================================================
     # GET HISTORY — Retrieve conversation history
     # ====================================================================
@@ -211,6 +199,33 @@ Respond helpfully and specifically. Reference the actual code, scores, and findi
     # ====================================================================
     # INTERNAL HELPERS
     # ====================================================================
+    def _build_turn(self, session_data: dict, user_message: str) -> tuple[list[dict], str]:
+        """Gemini chat history + the prompt to send for the next question."""
+        history = session_data["history"]
+
+        # Build Gemini chat history from our stored history
+        gemini_history = []
+        for msg in history:
+            gemini_history.append({
+                "role": msg["role"],
+                "parts": [msg["content"]]
+            })
+
+        # Build the prompt: include context on first message, just question on follow-ups
+        if not history:
+            # First message in the session — include full context
+            full_prompt = f"""{session_data["context"]}
+
+USER QUESTION:
+{user_message}
+
+Respond helpfully and specifically. Reference the actual code, scores, and findings from the analysis above. Be concise but thorough."""
+        else:
+            # Follow-up message — context is already in chat history
+            full_prompt = user_message
+
+        return gemini_history, full_prompt
+
     def _build_system_context(self, analysis_data: dict) -> str:
         """Build the initial context prompt from analysis data."""
         summary = analysis_data.get("summary", "No summary available")
@@ -0,0 +1,120 @@
+# ============================================================================
+# SERVICES/COMMIT_PREFETCHER.PY — Speculative Commit Diff + Static Analysis
+# ============================================================================
+# Someone who opens a repository's commit list almost always clicks one of
+# the newest commits next. That click used to fetch the diff from GitHub
+# and run the whole static pipeline while the user waited.
+#
+# After GET /repos/{id}/commits is served, the prefetcher warms both caches
+# for the top COMMIT_PREFETCH_TOP_N commits in the background:
+#   - commit_diff:{repo_id}:{sha}   (same key as the /diff endpoint)
+#   - static_analysis:{sha}         (read by GeminiService + the agents)
+#
+# It stays low priority:
+#   - at most COMMIT_PREFETCH_CONCURRENCY commits are fetched at once
+#     across the process; commits that are already cached are skipped
+#   - it only spends GitHub calls above COMMIT_PREFETCH_MIN_RATE_REMAINING,
+#     so prefetching can never eat the budget of real user requests
+#   - blocking PyGithub calls + analyzers run in threads, never on the loop
+#   - cancellable: a newer list request for the same repo replaces the
+#     running prefetch, and stop() cancels everything on shutdown
+# ============================================================================
+
+import asyncio
+import logging
+
+from opentelemetry import trace
+
+from app.core.config import settings
+from app.core.redis import TTL_COMMIT_DIFF, CacheManager
+from app.core.tracing import traced
+from app.services.gemini_service import gemini_service
+from app.services.github_service import github_service
+
+logger = logging.getLogger(__name__)
+
+# Approximate GitHub API calls per prefetched commit (repo + commit + files page)
+CALLS_PER_COMMIT = 3
+
+
+class CommitPrefetcher:
+    def __init__(self):
+        self._tasks: dict[int, asyncio.Task] = {}  # repo_id → running prefetch
+        self._semaphore: asyncio.Semaphore | None = None
+        self.stats = {"scheduled": 0, "prefetched": 0, "already_cached": 0, "budget_skipped": 0, "failed": 0}
+
+    def schedule(self, repo_id: int, repo_full_name: str, access_token: str, shas: list[str]) -> None:
+        """Warm the caches for the newest `shas` after the response is sent.
+
+        Takes the token (not the User row) so nothing depends on the
+        request's DB session once the response is out.
+        """
+        if not settings.COMMIT_PREFETCH_ENABLED or settings.COMMIT_PREFETCH_TOP_N <= 0 or not shas:
+            return
+
+        self.cancel(repo_id)
+        task = asyncio.create_task(
+            self._prefetch(repo_id, repo_full_name, access_token, shas[:settings.COMMIT_PREFETCH_TOP_N])
+        )
+        self._tasks[repo_id] = task
+        task.add_done_callback(lambda done: self._forget(repo_id, done))
+        self.stats["scheduled"] += 1
+
+    def cancel(self, repo_id: int) -> None:
+        task = self._tasks.pop(repo_id, None)
+        if task is not None:
+            task.cancel()
+
+    async def stop(self) -> None:
+        """Cancel every running prefetch (app shutdown)."""
+        tasks = list(self._tasks.values())
+        self._tasks.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    @traced("commit_prefetch")
+    async def _prefetch(self, repo_id: int, repo_full_name: str, access_token: str, shas: list[str]) -> None:
+        # The task copied the request's context: this span joins its trace
+        trace.get_current_span().set_attributes({"repository": repo_full_name, "commits": len(shas)})
+        missing = [sha for sha in shas if not CacheManager.exists(f"commit_diff:{repo_id}:{sha}")]
+        self.stats["already_cached"] += len(shas) - len(missing)
+        if not missing:
+            return
+
+        try:
+            remaining = await asyncio.to_thread(github_service.rate_limit_remaining, access_token)
+        except Exception as e:
+            logger.warning(f"Commit prefetch skipped, GitHub rate limit unknown: {e}")
+            return
+
+        budget = (remaining - settings.COMMIT_PREFETCH_MIN_RATE_REMAINING) // CALLS_PER_COMMIT
+        if budget < len(missing):
+            self.stats["budget_skipped"] += len(missing) - max(budget, 0)
+            missing = missing[:max(budget, 0)]
+
+        await asyncio.gather(*(self._prefetch_commit(repo_id, repo_full_name, access_token, sha) for sha in missing))
+
+    async def _prefetch_commit(self, repo_id: int, repo_full_name: str, access_token: str, sha: str) -> None:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(settings.COMMIT_PREFETCH_CONCURRENCY)
+
+        async with self._semaphore:
+            try:
+                commit_diff = await asyncio.to_thread(github_service.fetch_commit_diff, access_token, repo_full_name, sha)
+                CacheManager.set_json(f"commit_diff:{repo_id}:{sha}", commit_diff, TTL_COMMIT_DIFF)
+                # Caches itself under static_analysis:{sha}
+                await asyncio.to_thread(gemini_service._run_static_analysis, commit_diff)
+                self.stats["prefetched"] += 1
+            except Exception as e:
+                # Speculative work — a failure only means the click is not faster
+                self.stats["failed"] += 1
+                logger.warning(f"Commit prefetch failed for {repo_full_name}@{sha[:8]}: {e}")
+
+    def _forget(self, repo_id: int, task: asyncio.Task) -> None:
+        if self._tasks.get(repo_id) is task:
+            del self._tasks[repo_id]
+
+
+# Create global instance
+commit_prefetcher = CommitPrefetcher()
@@ -0,0 +1,249 @@
+# ============================================================================
+# SERVICES/CONTEXT_PACKER.PY — Token-Budgeted Diff Context for LLM Prompts
+# ============================================================================
+# Decides WHICH parts of a diff go into a Gemini prompt.
+#
+# WHY: Fixed slices (first 800 chars per patch, first 20 files, skip big
+# patches) waste nothing on small diffs but silently drop the important
+# files of a large one — a 5-line eval() in file #25 never reaches the AI.
+#
+# HOW IT WORKS:
+#   1. Every patch is split into hunks ("@@ ... @@" blocks)
+#   2. Each hunk is scored with the static analyzers' rules (security
+#      scanner severities, performance anti-patterns); each file adds its
+#      AST signals (security patterns, quality issues, complexity) and a
+#      small churn term. Lockfiles / generated / docs files rank last.
+#   3. Greedy fill: every file gets its one-line header first (cheap, so
+#      the AI always knows what changed), then hunks are added riskiest
+#      first until LLM_CONTEXT_TOKEN_BUDGET is spent
+#   4. Whatever didn't fit is listed in an "OMITTED" section and returned
+#      as a report (stored with the analysis as "context_packing")
+#
+# Tokens are estimated at ~4 characters per token — close enough for
+# budgeting without a tokenizer round-trip.
+#
+# Usage:
+#   packed = context_packer.pack(files, static_results)
+#   packed["text"]    → FILES CHANGED section for the prompt
+#   packed["report"]  → budget / used tokens + omitted files and hunks
+#   context_packer.diff_tokens(files)         → estimated size of the full diff
+#   context_packer.group_files(files, tokens) → directory-aware file groups for
+#                                               PR map-reduce (gemini_service.py)
+# ============================================================================
+
+import math
+import re
+from pathlib import PurePosixPath
+from typing import Any
+
+from app.analyzers.performance_analyzer import performance_analyzer
+from app.analyzers.security_scanner import security_scanner
+from app.core.config import settings
+
+CHARS_PER_TOKEN = 4
+
+# Security scanner severity → hunk risk points
+SEVERITY_WEIGHTS = {"critical": 10, "high": 5, "medium": 2, "low": 1}
+PERFORMANCE_ISSUE_WEIGHT = 2
+
+# Files that are large but rarely worth the AI's attention
+LOW_VALUE_SUFFIXES = (".lock", ".min.js", ".min.css", ".map", ".svg", ".snap", ".md", ".txt")
+LOW_VALUE_NAMES = {"package-lock.json", "yarn.lock", "pnpm-lock.yaml", "poetry.lock", "Pipfile.lock"}
+
+# Omitted entries listed by name before collapsing into "... and N more"
+MAX_OMITTED_LISTED = 15
+
+_HUNK_HEADER_RE = re.compile(r"^@@.*@@", re.MULTILINE)
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+class ContextPacker:
+    """Packs diff hunks into a token budget, riskiest first."""
+
+    def pack(
+        self,
+        files: list[dict[str, Any]],
+        static_results: dict[str, Any] | None = None,
+        budget_tokens: int | None = None,
+    ) -> dict[str, Any]:
+        """Build the FILES CHANGED section for a prompt within budget_tokens."""
+        budget = budget_tokens or settings.LLM_CONTEXT_TOKEN_BUDGET
+        ast_by_file = {
+            a.get("filename"): a
+            for a in (static_results or {}).get("ast_analyses", [])
+            if not a.get("error")
+        }
+
+        entries = [self._score_file(file, ast_by_file.get(file["filename"])) for file in files]
+        ranked = sorted(entries, key=lambda e: e["risk"], reverse=True)
+
+        # Pass 1 — headers for every file, riskiest first
+        used = 0
+        for entry in ranked:
+            cost = estimate_tokens(entry["header"])
+            if used + cost > budget:
+                break
+            entry["included"] = True
+            used += cost
+
+        # Pass 2 — hunks, globally riskiest first (ties → smaller hunk first)
+        candidates = [
+            (hunk, entry)
+            for entry in ranked if entry["included"]
+            for hunk in entry["hunks"]
+        ]
+        candidates.sort(key=lambda c: (c[0]["risk"] + c[1]["risk"], -c[0]["tokens"]), reverse=True)
+        for hunk, _entry in candidates:
+            if used + hunk["tokens"] <= budget:
+                hunk["included"] = True
+                used += hunk["tokens"]
+
+        text, report = self._render(ranked, budget, used)
+        return {"text": text, "report": report}
+
+    def diff_tokens(self, files: list[dict[str, Any]]) -> int:
+        """Estimated tokens to send every file's full patch."""
+        return sum(estimate_tokens(file.get("patch") or "") for file in files)
+
+    def group_files(self, files: list[dict[str, Any]], group_tokens: int) -> list[list[dict[str, Any]]]:
+        """Split files into groups of roughly group_tokens each.
+
+        Files from the same directory stay together where possible, so each
+        group reviews a coherent slice of the change.
+        """
+        by_directory: dict[str, list[dict[str, Any]]] = {}
+        for file in files:
+            directory = str(PurePosixPath(file["filename"]).parent)
+            by_directory.setdefault(directory, []).append(file)
+
+        groups: list[list[dict[str, Any]]] = []
+        current: list[dict[str, Any]] = []
+        current_tokens = 0
+        for directory in sorted(by_directory):
+            for file in by_directory[directory]:
+                cost = min(estimate_tokens(file.get("patch") or ""), group_tokens)
+                if current and current_tokens + cost > group_tokens:
+                    groups.append(current)
+                    current, current_tokens = [], 0
+                current.append(file)
+                current_tokens += cost
+        if current:
+            groups.append(current)
+        return groups
+
+    # ====================================================================
+    # SCORING — Static-analysis risk signals per file and hunk
+    # ====================================================================
+    def _score_file(self, file: dict[str, Any], ast: dict[str, Any] | None) -> dict[str, Any]:
+        filename = file["filename"]
+        header = f"File: {filename} | Status: {file['status']} | +{file['additions']} -{file['deletions']}"
+
+        if ast:
+            header += (
+                f"\n  Structure: {ast.get('functions', 0)} functions, "
+                f"{ast.get('classes', 0)} classes, complexity={ast.get('complexity_score', 0)}"
+            )
+            if ast.get("security_patterns"):
+                header += f"\n  Security flags: {', '.join(ast['security_patterns'])}"
+            if ast.get("code_quality_issues"):
+                header += f"\n  Quality issues: {', '.join(ast['code_quality_issues'])}"
+
+        hunks = [self._score_hunk(text, filename) for text in self._split_hunks(file.get("patch") or "")]
+
+        risk = sum(h["risk"] for h in hunks)
+        if ast:
+            risk += 5 * len(ast.get("security_patterns", []))
+            risk += 2 * len(ast.get("code_quality_issues", []))
+            risk += min(ast.get("complexity_score", 0), 20) / 4
+        risk += math.log1p(file.get("additions", 0) + file.get("deletions", 0))
+        if self._is_low_value(filename):
+            risk -= 100
+
+        return {
+            "filename": filename,
+            "header": header,
+            "hunks": hunks,
+            "risk": risk,
+            "included": False,
+            "changes": f"+{file['additions']} -{file['deletions']}",
+        }
+
+    def _score_hunk(self, text: str, filename: str) -> dict[str, Any]:
+        max_tokens = settings.LLM_CONTEXT_MAX_HUNK_TOKENS
+        if estimate_tokens(text) > max_tokens:
+            text = text[: max_tokens * CHARS_PER_TOKEN] + "\n... [hunk truncated]"
+
+        scan = security_scanner.scan_content(text, filename)
+        risk = sum(
+            SEVERITY_WEIGHTS[severity] * len(found)
+            for severity, found in scan["security_issues"].items()
+        )
+        perf = performance_analyzer.analyze_performance([{"filename": filename, "content": text}])
+        risk += PERFORMANCE_ISSUE_WEIGHT * perf["issue_count"]
+
+        return {"text": text, "tokens": estimate_tokens(text) + 1, "risk": risk, "included": False}
+
+    def _split_hunks(self, patch: str) -> list[str]:
+        if not patch:
+            return []
+        starts = [m.start() for m in _HUNK_HEADER_RE.finditer(patch)]
+        if not starts or starts[0] != 0:
+            starts.insert(0, 0)
+        bounds = [*starts, len(patch)]
+        return [patch[a:b].rstrip("\n") for a, b in zip(bounds, bounds[1:], strict=False) if patch[a:b].strip()]
+
+    def _is_low_value(self, filename: str) -> bool:
+        name = PurePosixPath(filename).name
+        return name in LOW_VALUE_NAMES or filename.lower().endswith(LOW_VALUE_SUFFIXES)
+
+    # ====================================================================
+    # RENDER — Prompt text + omission report
+    # ====================================================================
+    def _render(self, ranked: list[dict[str, Any]], budget: int, used: int) -> tuple[str, dict[str, Any]]:
+        sections = []
+        omitted_files = []
+        partial_files = []
+        hunks_omitted = 0
+
+        for entry in ranked:
+            if not entry["included"]:
+                omitted_files.append(entry)
+                continue
+
+            kept = [h for h in entry["hunks"] if h["included"]]
+            dropped = len(entry["hunks"]) - len(kept)
+            hunks_omitted += dropped
+
+            section = entry["header"]
+            if kept:
+                # Original hunk order reads better than risk order
+                section += "\n  Diff:\n" + "\n".join(h["text"] for h in kept)
+            if dropped:
+                section += f"\n  [{dropped} of {len(entry['hunks'])} hunks omitted — token budget]"
+                partial_files.append(entry["filename"])
+            sections.append(section)
+
+        if omitted_files:
+            listed = ", ".join(f"{e['filename']} ({e['changes']})" for e in omitted_files[:MAX_OMITTED_LISTED])
+            extra = len(omitted_files) - MAX_OMITTED_LISTED
+            if extra > 0:
+                listed += f", ... and {extra} more"
+            sections.append(f"OMITTED (token budget, lowest risk): {len(omitted_files)} files — {listed}")
+
+        report = {
+            "budget_tokens": budget,
+            "used_tokens": used,
+            "files_total": len(ranked),
+            "files_included": len(ranked) - len(omitted_files),
+            "files_omitted": [e["filename"] for e in omitted_files],
+            "files_partial": partial_files,
+            "hunks_omitted": hunks_omitted + sum(len(e["hunks"]) for e in omitted_files),
+        }
+        return "\n".join(sections), report
+
+
+# Create global instance
+context_packer = ContextPacker()
@@ -6,36 +6,59 @@
 #   2. Runs static analysis tools (AST, security, dependency, performance)
 #   3. Retrieves relevant past analyses via RAG (AI memory)
 #   4. Builds a detailed prompt combining code + static analysis + RAG context
+#      (diff hunks packed riskiest-first into a token budget — context_packer.py)
 #   5. Sends the prompt to Google Gemini 2.5 Flash AI
 #   6. Receives STRUCTURED JSON response (no fragile text parsing!)
 #   7. Auto-stores the result in RAG knowledge base for future reference
 #
 # GenAI Features:
 #   - Structured Output: Gemini returns strict JSON via response_mime_type
-#   - Streaming: Real-time SSE streaming of analysis progress
+#   - Streaming: Real-time SSE streaming of analysis progress, and of the
+#     model's output itself while it is generated (json_stream.py)
 #   - RAG: Past analysis retrieval for trend detection and pattern matching
 #   - Multi-tool Pipeline: AST + Security + Dependency + Performance + AI
+#   - Every Gemini call goes through the shared LLM client (services/llm/):
+#     gateway admission, retry with backoff, per-call metrics
+#   - Each stage (every analyzer, RAG retrieve, LLM call, RAG store) is timed
+#     into stage_duration_seconds{component="gemini_service"} (core/metrics.py)
 #
 # Key methods:
 #   - analyze_code_changes()     → Full AI commit analysis (JSON output)
-#   - analyze_pull_request()     → Full AI PR analysis (JSON output)
-#   - stream_analysis()          → Streaming commit analysis with SSE events
+#   - analyze_pull_request()     → Full AI PR analysis (JSON output); very
+#                                  large PRs run in map-reduce mode (file
+#                                  groups analyzed in parallel, then merged)
+#   - stream_analysis()          → Streaming commit analysis with SSE events:
+#                                  summary text, recommendations and other
+#                                  fields arrive as the model writes them
 #   - stream_pr_analysis()       → Streaming PR analysis with SSE events
+#   - estimate_*_tokens()        → What an analysis will cost, from the same
+#                                  prompt builders (LLM quota admission)
 # ============================================================================
 
+import asyncio
 import json
+import logging
+import time
+from collections import Counter
 from collections.abc import AsyncGenerator
 from typing import Any
 
-import google.generativeai as genai
 from fastapi import HTTPException
-from google.generativeai.types import GenerationConfig
+from opentelemetry.trace import Status, StatusCode
 
 from app.analyzers.ast_parser import ast_parser
 from app.analyzers.dependency_analyzer import dependency_analyzer
 from app.analyzers.performance_analyzer import performance_analyzer
 from app.analyzers.security_scanner import security_scanner
 from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.redis import TTL_STATIC_ANALYSIS, CacheManager
+from app.core.tracing import tracer
+from app.services.context_packer import context_packer, estimate_tokens
+from app.services.llm.client import llm_client
+from app.services.llm.json_stream import IncrementalJSONParser
+
+logger = logging.getLogger(__name__)
 
 # ---- JSON Schema that Gemini MUST return for commit analysis ----
 COMMIT_ANALYSIS_SCHEMA = """{
@@ -75,58 +98,73 @@ PR_ANALYSIS_SCHEMA = """{
   "overall_score": 8
 }"""
 
+RISK_PRIORITY = {"low": 1, "medium": 2, "high": 3, "critical": 4}
 
-class GeminiService:
-    def __init__(self):
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-
-        # Standard model — returns structured JSON
-        self.model = genai.GenerativeModel(
-            'gemini-2.5-flash',
-            generation_config=GenerationConfig(
-                response_mime_type="application/json",
-                temperature=0.3,  # Lower = more consistent/deterministic
-            )
-        )
+# Stand-in for static results not computed yet, when estimating a prompt
+NO_STATIC_RESULTS = {"ast_analyses": [], "security_analysis": {}, "performance_analysis": {}, "dependency_analysis": {}}
 
-        # Streaming model — returns plain text for real-time streaming
-        self.stream_model = genai.GenerativeModel(
-            'gemini-2.5-flash',
-            generation_config=GenerationConfig(
-                temperature=0.3,
-            )
-        )
+
+def get_cached_static_analysis(commit_data: dict[str, Any]) -> dict[str, Any] | None:
+    """Static results of a commit computed earlier (e.g. by the prefetcher).
+
+    Keyed by commit SHA — diffs are immutable. PRs (no SHA) are never cached.
+    """
+    sha = commit_data.get("sha")
+    return CacheManager.get_json(f"static_analysis:{sha}") if sha else None
+
+
+def cache_static_analysis(commit_data: dict[str, Any], static_results: dict[str, Any]) -> None:
+    sha = commit_data.get("sha")
+    if sha:
+        CacheManager.set_json(f"static_analysis:{sha}", static_results, TTL_STATIC_ANALYSIS)
+
+
+class GeminiService:
+    async def _generate(self, prompt: str):
+        """Structured-JSON review call ("analysis" profile of the shared LLM client)."""
+        with metrics.stage("gemini_service", "llm_call"):
+            return await llm_client.generate("analysis", prompt, caller="gemini_service")
 
     # ====================================================================
     # STATIC ANALYSIS PIPELINE — Runs all local analyzers on code
     # ====================================================================
     def _run_static_analysis(self, commit_data: dict[str, Any]) -> dict[str, Any]:
         """Run all static analysis tools on the code files"""
+        cached = get_cached_static_analysis(commit_data)
+        if cached is not None:
+            return cached
+
         ast_analyses = []
         files_for_analysis = []
 
-        for file in commit_data.get('files', []):
-            if file.get('patch'):
-                filename = file['filename']
-                patch_content = file['patch']
+        with metrics.stage("gemini_service", "ast"):
+            for file in commit_data.get('files', []):
+                if file.get('patch'):
+                    filename = file['filename']
+                    patch_content = file['patch']
 
-                # AST analysis with advanced metrics
-                ast_analysis = ast_parser.calculate_advanced_metrics(patch_content, filename)
-                ast_analyses.append(ast_analysis)
+                    # AST analysis with advanced metrics
+                    ast_analysis = ast_parser.calculate_advanced_metrics(patch_content, filename)
+                    ast_analyses.append(ast_analysis)
 
-                files_for_analysis.append({'filename': filename, 'content': patch_content})
+                    files_for_analysis.append({'filename': filename, 'content': patch_content})
 
         # Run all analyzers
-        dependency_analysis = dependency_analyzer.analyze_dependencies(files_for_analysis)
-        security_analysis = security_scanner.scan_multiple_files(files_for_analysis)
-        performance_analysis = performance_analyzer.analyze_performance(files_for_analysis)
+        with metrics.stage("gemini_service", "dependency"):
+            dependency_analysis = dependency_analyzer.analyze_dependencies(files_for_analysis)
+        with metrics.stage("gemini_service", "security"):
+            security_analysis = security_scanner.scan_multiple_files(files_for_analysis)
+        with metrics.stage("gemini_service", "performance"):
+            performance_analysis = performance_analyzer.analyze_performance(files_for_analysis)
 
-        return {
+        static_results = {
             "ast_analyses": ast_analyses,
             "dependency_analysis": dependency_analysis,
             "security_analysis": security_analysis,
             "performance_analysis": performance_analysis,
         }
+        cache_static_analysis(commit_data, static_results)
+        return static_results
 
     # ====================================================================
     # COMMIT ANALYSIS — Full AI analysis with structured JSON output + RAG
@@ -141,20 +179,21 @@ class GeminiService:
             static_results = self._run_static_analysis(commit_data)
 
             # Step 2: Retrieve relevant past analyses from RAG (AI memory)
-            rag_context = self._get_rag_context(commit_data)
+            rag_context = await self._get_rag_context(commit_data)
 
             # Step 3: Build prompt with static analysis + RAG context
-            prompt = self._build_commit_prompt(commit_data, static_results, rag_context)
+            prompt, packing_report = self._build_commit_prompt(commit_data, static_results, rag_context)
 
             # Step 4: Get structured JSON response from Gemini
-            response = self.model.generate_content(prompt)
+            response = await self._generate(prompt)
             ai_result = json.loads(response.text)
 
             # Step 5: Merge AI results with static analysis data + commit metadata
             final_result = self._build_commit_result(ai_result, commit_data, static_results)
+            final_result["context_packing"] = packing_report
 
             # Step 6: Auto-store this analysis in RAG for future reference
-            self._store_in_rag(final_result)
+            await self._store_in_rag(final_result)
 
             return final_result
 
@@ -173,20 +212,22 @@ class GeminiService:
         """
         try:
             # Step 1: Retrieve relevant past analyses from RAG
-            rag_context = self._get_rag_context_for_pr(pr_data)
+            rag_context = await self._get_rag_context_for_pr(pr_data)
 
-            # Step 2: Build PR prompt with RAG context
-            prompt = self._build_pr_prompt(pr_data, rag_context)
-
-            # Step 3: Get structured JSON response from Gemini
-            response = self.model.generate_content(prompt)
-            ai_result = json.loads(response.text)
+            # Step 2 + 3: Prompt Gemini — one prompt, or map-reduce for huge PRs
+            if self._needs_map_reduce(pr_data):
+                ai_result, packing_report = await self._analyze_pr_map_reduce(pr_data, rag_context)
+            else:
+                prompt, packing_report = self._build_pr_prompt(pr_data, rag_context)
+                response = await self._generate(prompt)
+                ai_result = json.loads(response.text)
 
             # Step 4: Build final result with PR metadata
             final_result = self._build_pr_result(ai_result, pr_data)
+            final_result["context_packing"] = packing_report
 
             # Step 5: Auto-store this analysis in RAG for future reference
-            self._store_in_rag(final_result)
+            await self._store_in_rag(final_result)
 
             return final_result
 
@@ -199,61 +240,96 @@ class GeminiService:
     # STREAMING COMMIT ANALYSIS — Real-time SSE events + RAG
     # ====================================================================
     async def stream_analysis(self, commit_data: dict[str, Any]) -> AsyncGenerator[dict[str, Any]]:
-        """Stream analysis progress as SSE events — yields dict events"""
+        """Stream analysis progress as SSE events — yields dict events
+
+        While Gemini generates, its JSON output is parsed incrementally:
+          - "delta": new text of a string field being written (summary first)
+          - "item":  one complete element of a list field (e.g. a recommendation)
+          - "field": a field whose value is complete
+        "complete" still carries the full, validated result.
+        """
 
         # Event 1: Starting
         yield {"event": "progress", "data": {"step": "fetch", "message": "Fetching code changes...", "progress": 10}}
 
-        # Event 2: AST analysis
-        yield {"event": "progress", "data": {"step": "ast", "message": "Parsing code structure (AST analysis)...", "progress": 20}}
-        ast_analyses = []
-        files_for_analysis = []
-        for file in commit_data.get('files', []):
-            if file.get('patch'):
-                filename = file['filename']
-                patch_content = file['patch']
-                ast_analysis = ast_parser.calculate_advanced_metrics(patch_content, filename)
-                ast_analyses.append(ast_analysis)
-                files_for_analysis.append({'filename': filename, 'content': patch_content})
-
-        # Event 3: Security scan
-        yield {"event": "progress", "data": {"step": "security", "message": "Running security vulnerability scan...", "progress": 35}}
-        security_analysis = security_scanner.scan_multiple_files(files_for_analysis)
-
-        # Event 4: Dependency analysis
-        yield {"event": "progress", "data": {"step": "dependency", "message": "Analyzing cross-file dependencies...", "progress": 45}}
-        dependency_analysis = dependency_analyzer.analyze_dependencies(files_for_analysis)
-
-        # Event 5: Performance analysis
-        yield {"event": "progress", "data": {"step": "performance", "message": "Detecting performance anti-patterns...", "progress": 55}}
-        performance_analysis = performance_analyzer.analyze_performance(files_for_analysis)
-
-        static_results = {
-            "ast_analyses": ast_analyses,
-            "dependency_analysis": dependency_analysis,
-            "security_analysis": security_analysis,
-            "performance_analysis": performance_analysis,
-        }
+        static_results = get_cached_static_analysis(commit_data)
+        if static_results is not None:
+            # Prefetched when the commit list was opened (commit_prefetcher.py)
+            yield {"event": "progress", "data": {"step": "static", "message": "Static analysis ready (cached)...", "progress": 55}}
+        else:
+            # Event 2: AST analysis
+            yield {"event": "progress", "data": {"step": "ast", "message": "Parsing code structure (AST analysis)...", "progress": 20}}
+            ast_analyses = []
+            files_for_analysis = []
+            with metrics.stage("gemini_service", "ast"):
+                for file in commit_data.get('files', []):
+                    if file.get('patch'):
+                        filename = file['filename']
+                        patch_content = file['patch']
+                        ast_analysis = ast_parser.calculate_advanced_metrics(patch_content, filename)
+                        ast_analyses.append(ast_analysis)
+                        files_for_analysis.append({'filename': filename, 'content': patch_content})
+
+            # Event 3: Security scan
+            yield {"event": "progress", "data": {"step": "security", "message": "Running security vulnerability scan...", "progress": 35}}
+            with metrics.stage("gemini_service", "security"):
+                security_analysis = security_scanner.scan_multiple_files(files_for_analysis)
+
+            # Event 4: Dependency analysis
+            yield {"event": "progress", "data": {"step": "dependency", "message": "Analyzing cross-file dependencies...", "progress": 45}}
+            with metrics.stage("gemini_service", "dependency"):
+                dependency_analysis = dependency_analyzer.analyze_dependencies(files_for_analysis)
+
+            # Event 5: Performance analysis
+            yield {"event": "progress", "data": {"step": "performance", "message": "Detecting performance anti-patterns...", "progress": 55}}
+            with metrics.stage("gemini_service", "performance"):
+                performance_analysis = performance_analyzer.analyze_performance(files_for_analysis)
+
+            static_results = {
+                "ast_analyses": ast_analyses,
+                "dependency_analysis": dependency_analysis,
+                "security_analysis": security_analysis,
+                "performance_analysis": performance_analysis,
+            }
+            cache_static_analysis(commit_data, static_results)
 
         # Event 6: RAG retrieval (searching AI memory)
         yield {"event": "progress", "data": {"step": "rag", "message": "Searching past analyses for patterns...", "progress": 65}}
-        rag_context = self._get_rag_context(commit_data)
+        rag_context = await self._get_rag_context(commit_data)
 
-        # Event 7: AI analysis (the big one)
+        # Event 7: AI analysis (the big one) — output streamed as it is generated
         yield {"event": "progress", "data": {"step": "ai", "message": "Gemini AI is analyzing your code (with historical context)...", "progress": 75}}
 
         try:
-            prompt = self._build_commit_prompt(commit_data, static_results, rag_context)
-            response = self.model.generate_content(prompt)
-            ai_result = json.loads(response.text)
+            prompt, packing_report = self._build_commit_prompt(commit_data, static_results, rag_context)
+            parser = IncrementalJSONParser()
+            chunks = []
+            # Not metrics.stage(): a span made current around a `yield` leaks
+            # into the consumer's code — this one is never current, ended by hand
+            span = tracer.start_span("gemini_service.llm_stream")
+            started = time.monotonic()
+            try:
+                async for text in llm_client.stream("analysis", prompt, caller="gemini_service"):
+                    chunks.append(text)
+                    for update in parser.feed(text):
+                        yield {"event": update.pop("type"), "data": update}
+            except Exception as e:
+                span.record_exception(e)
+                span.set_status(Status(StatusCode.ERROR))
+                raise
+            finally:
+                span.end()
+            metrics.stage_duration.labels(component="gemini_service", stage="llm_stream").observe(time.monotonic() - started)
+            ai_result = json.loads("".join(chunks))
 
             # Event 8: Building result
             yield {"event": "progress", "data": {"step": "building", "message": "Building analysis report...", "progress": 90}}
 
             final_result = self._build_commit_result(ai_result, commit_data, static_results)
+            final_result["context_packing"] = packing_report
 
             # Auto-store in RAG for future reference
-            self._store_in_rag(final_result)
+            await self._store_in_rag(final_result)
 
             # Event 9: Complete — send final result
             yield {"event": "complete", "data": {"result": final_result, "progress": 100, "message": "Analysis complete!"}}
@@ -271,21 +347,25 @@ class GeminiService:
 
         # RAG retrieval for PR
         yield {"event": "progress", "data": {"step": "rag", "message": "Searching past analyses for patterns...", "progress": 35}}
-        rag_context = self._get_rag_context_for_pr(pr_data)
+        rag_context = await self._get_rag_context_for_pr(pr_data)
 
         yield {"event": "progress", "data": {"step": "ai", "message": "Gemini AI is reviewing your pull request (with historical context)...", "progress": 55}}
 
         try:
-            prompt = self._build_pr_prompt(pr_data, rag_context)
-            response = self.model.generate_content(prompt)
-            ai_result = json.loads(response.text)
+            if self._needs_map_reduce(pr_data):
+                ai_result, packing_report = await self._analyze_pr_map_reduce(pr_data, rag_context)
+            else:
+                prompt, packing_report = self._build_pr_prompt(pr_data, rag_context)
+                response = await self._generate(prompt)
+                ai_result = json.loads(response.text)
 
             yield {"event": "progress", "data": {"step": "building", "message": "Building PR review report...", "progress": 85}}
 
             final_result = self._build_pr_result(ai_result, pr_data)
+            final_result["context_packing"] = packing_report
 
             # Auto-store in RAG
-            self._store_in_rag(final_result)
+            await self._store_in_rag(final_result)
 
             yield {"event": "complete", "data": {"result": final_result, "progress": 100, "message": "PR analysis complete!"}}
 
@@ -293,29 +373,179 @@ class GeminiService:
             yield {"event": "error", "data": {"message": f"PR analysis failed: {str(e)}", "progress": 0}}
 
     # ====================================================================
-    # PROMPT BUILDERS
+    # PR MAP-REDUCE — Large PRs as parallel file-group reviews + a merge
     # ====================================================================
-    def _build_commit_prompt(self, commit_data: dict[str, Any], static_results: dict[str, Any], rag_context: str = "") -> str:
-        """Build prompt for commit analysis with static analysis + RAG context"""
-        ast_analyses = static_results["ast_analyses"]
+    def _needs_map_reduce(self, pr_data: dict[str, Any]) -> bool:
+        if not settings.PR_MAP_REDUCE_ENABLED:
+            return False
+        files = pr_data.get('files', [])
+        return (
+            len(files) > settings.PR_MAP_REDUCE_MIN_FILES
+            or context_packer.diff_tokens(files) > settings.LLM_CONTEXT_TOKEN_BUDGET
+        )
 
-        # Build file summaries with AST insights
-        files_info = []
-        for i, file in enumerate(commit_data.get('files', [])):
-            file_summary = f"File: {file['filename']} | Status: {file['status']} | +{file['additions']} -{file['deletions']}"
+    async def _analyze_pr_map_reduce(self, pr_data: dict[str, Any], rag_context: str = "") -> tuple[dict[str, Any], dict[str, Any]]:
+        """Map: review file groups concurrently. Reduce: merge into PR_ANALYSIS_SCHEMA.
 
-            if i < len(ast_analyses) and not ast_analyses[i].get('error'):
-                ast = ast_analyses[i]
-                file_summary += f"\n  Structure: {ast.get('functions', 0)} functions, {ast.get('classes', 0)} classes, complexity={ast.get('complexity_score', 0)}"
-                if ast.get('security_patterns'):
-                    file_summary += f"\n  Security flags: {', '.join(ast['security_patterns'])}"
-                if ast.get('code_quality_issues'):
-                    file_summary += f"\n  Quality issues: {', '.join(ast['code_quality_issues'])}"
+        Latency ≈ ceil(groups / PR_MAP_REDUCE_CONCURRENCY) map calls + one
+        short reduce call, instead of one prompt that grows with the PR.
+        """
+        groups = context_packer.group_files(pr_data.get('files', []), settings.PR_MAP_REDUCE_GROUP_TOKENS)
+        semaphore = asyncio.Semaphore(settings.PR_MAP_REDUCE_CONCURRENCY)
+
+        async def map_group(index: int, group: list[dict[str, Any]]) -> tuple[dict[str, Any], dict[str, Any]] | None:
+            async with semaphore:
+                prompt, report = self._build_pr_group_prompt(pr_data, group, index, len(groups))
+                try:
+                    response = await self._generate(prompt)
+                    partial = json.loads(response.text)
+                except Exception as e:
+                    logger.warning(f"PR #{pr_data['pr_number']} group {index}/{len(groups)} failed: {e}")
+                    return None
+                partial["_files"] = [f['filename'] for f in group]
+                return partial, report
+
+        mapped = await asyncio.gather(*(map_group(i, g) for i, g in enumerate(groups, 1)))
+        partials = [m[0] for m in mapped if m]
+        if not partials:
+            raise RuntimeError(f"All {len(groups)} file-group analyses failed")
+
+        # Reduce — short prompt over the partial results only (no code)
+        reduce_mode = "llm"
+        try:
+            response = await self._generate(self._build_pr_reduce_prompt(pr_data, partials, rag_context))
+            ai_result = json.loads(response.text)
+        except Exception as e:
+            logger.warning(f"PR #{pr_data['pr_number']} reduce step failed, merging deterministically: {e}")
+            ai_result = self._merge_pr_partials(partials)
+            reduce_mode = "deterministic"
+
+        group_reports = [m[1] for m in mapped if m]
+        failed_files = [f['filename'] for m, group in zip(mapped, groups, strict=True) if not m for f in group]
+        packing_report = {
+            "mode": "map_reduce",
+            "groups": len(groups),
+            "groups_failed": len(groups) - len(partials),
+            "reduce": reduce_mode,
+            "budget_tokens": settings.PR_MAP_REDUCE_GROUP_TOKENS,
+            "used_tokens": sum(r["used_tokens"] for r in group_reports),
+            "files_total": len(pr_data.get('files', [])),
+            "files_included": sum(r["files_included"] for r in group_reports),
+            "files_omitted": [f for r in group_reports for f in r["files_omitted"]] + failed_files,
+            "files_partial": [f for r in group_reports for f in r["files_partial"]],
+            "hunks_omitted": sum(r["hunks_omitted"] for r in group_reports),
+        }
+        return ai_result, packing_report
+
+    def _merge_pr_partials(self, partials: list[dict[str, Any]]) -> dict[str, Any]:
+        """Deterministic reduce used when the reduce prompt fails.
+
+        Scores are averaged weighted by group size, risk takes the maximum,
+        lists are de-duplicated in group order.
+        """
+        weights = [max(len(p.get("_files", [])), 1) for p in partials]
+        total_weight = sum(weights)
+
+        def weighted(field: str, default: int) -> int:
+            return round(sum(p.get(field, default) * w for p, w in zip(partials, weights, strict=True)) / total_weight)
+
+        def union(field: str, limit: int) -> list:
+            seen, merged = set(), []
+            for partial in partials:
+                for item in partial.get(field, []):
+                    key = json.dumps(item, sort_keys=True) if isinstance(item, dict) else str(item)
+                    if key not in seen:
+                        seen.add(key)
+                        merged.append(item)
+            return merged[:limit]
+
+        change_types = Counter(p.get("change_type", "other") for p in partials)
+        return {
+            "summary": " ".join(p.get("summary", "") for p in partials[:3]).strip(),
+            "risk_level": max((p.get("risk_level", "medium") for p in partials), key=lambda r: RISK_PRIORITY.get(r, 0)),
+            "change_type": change_types.most_common(1)[0][0],
+            "impact_areas": union("impact_areas", 10),
+            "code_quality_assessment": " ".join(p.get("code_quality_assessment", "") for p in partials[:3]).strip(),
+            "security_concerns": union("security_concerns", 10),
+            "performance_impact": " ".join(p.get("performance_impact", "") for p in partials[:3]).strip(),
+            "recommendations": union("recommendations", 5),
+            "maintainability_score": weighted("maintainability_score", 70),
+            "security_score": min(p.get("security_score", 100) for p in partials),
+            "performance_score": weighted("performance_score", 100),
+            "overall_score": weighted("overall_score", 7),
+        }
 
-            if file.get('patch'):
-                file_summary += f"\n  Diff:\n{file['patch'][:800]}"
+    def _build_pr_group_prompt(self, pr_data: dict[str, Any], group: list[dict[str, Any]], index: int, total: int) -> tuple[str, dict[str, Any]]:
+        """Map prompt: review one file group of a large PR."""
+        packed = context_packer.pack(group, budget_tokens=settings.PR_MAP_REDUCE_GROUP_TOKENS)
 
-            files_info.append(file_summary)
+        return f"""You are a senior software architect reviewing PART {index} of {total} of a large pull request. Return a JSON response.
+
+PR #{pr_data['pr_number']}: {pr_data['title']}
+Branches: {pr_data['head_branch']} → {pr_data['base_branch']}
+Stats (whole PR): {pr_data['stats']['total_files']} files, +{pr_data['stats']['additions']} -{pr_data['stats']['deletions']}
+
+Description:
+{pr_data.get('description', 'No description')[:500]}
+
+FILES IN THIS PART:
+{packed["text"]}
+
+Review ONLY the files above. Return JSON matching this EXACT schema:
+{PR_ANALYSIS_SCHEMA}
+
+Scores use the same scales as a full review (0-100, overall 1-10). Keep the summary to 1-2 sentences.
+Return ONLY valid JSON.""", packed["report"]
+
+    def _build_pr_reduce_prompt(self, pr_data: dict[str, Any], partials: list[dict[str, Any]], rag_context: str = "") -> str:
+        """Reduce prompt: merge partial reviews — no code, so it stays short."""
+        parts = []
+        for i, partial in enumerate(partials, 1):
+            files = partial.get("_files", [])
+            parts.append(json.dumps({
+                "part": i,
+                "files": files[:10] + ([f"... {len(files) - 10} more"] if len(files) > 10 else []),
+                **{k: v for k, v in partial.items() if k != "_files"},
+            }))
+
+        rag_section = ""
+        if rag_context:
+            rag_section = f"""
+{rag_context}
+IMPORTANT: Use the past analysis history above to identify recurring patterns and trends.
+"""
+
+        return f"""You are a senior software architect. A large pull request was reviewed in {len(partials)} parts.
+Merge the partial reviews below into ONE review of the whole PR and return a JSON response.
+
+PR #{pr_data['pr_number']}: {pr_data['title']}
+Author: {pr_data['author']}
+Stats: {pr_data['stats']['total_files']} files, +{pr_data['stats']['additions']} -{pr_data['stats']['deletions']}
+
+PARTIAL REVIEWS:
+{chr(10).join(parts)}
+{rag_section}
+Return JSON matching this EXACT schema:
+{PR_ANALYSIS_SCHEMA}
+
+MERGE RULES:
+- risk_level: the highest risk that is justified across parts
+- scores: weigh each part by how much of the PR it covers; a serious issue in one part lowers the whole PR
+- security_concerns: keep every real concern, de-duplicated
+- recommendations: the 3-5 most important across all parts
+
+Return ONLY valid JSON."""
+
+    # ====================================================================
+    # PROMPT BUILDERS
+    # ====================================================================
+    def _build_commit_prompt(self, commit_data: dict[str, Any], static_results: dict[str, Any], rag_context: str = "") -> tuple[str, dict[str, Any]]:
+        """Build prompt for commit analysis with static analysis + RAG context.
+
+        Returns (prompt, packing report) — see context_packer.py
+        """
+        # File summaries with AST insights, riskiest hunks first within budget
+        packed = context_packer.pack(commit_data.get('files', []), static_results)
 
         # Security summary
         sec = static_results["security_analysis"]
@@ -352,7 +582,7 @@ STATIC ANALYSIS RESULTS:
 {dep_summary}
 
 FILES CHANGED:
-{chr(10).join(files_info)}
+{packed["text"]}
 {rag_section}
 Return your analysis as JSON matching this EXACT schema:
 {COMMIT_ANALYSIS_SCHEMA}
@@ -369,17 +599,14 @@ SCORING RULES:
   - issue_type: "security" | "performance" | "architecture" | "quality"
   - severity: "low" | "medium" | "high"
 
-Be thorough, technical, and precise. Return ONLY valid JSON."""
+Be thorough, technical, and precise. Return ONLY valid JSON.""", packed["report"]
 
-    def _build_pr_prompt(self, pr_data: dict[str, Any], rag_context: str = "") -> str:
-        """Build prompt for PR analysis with optional RAG context"""
+    def _build_pr_prompt(self, pr_data: dict[str, Any], rag_context: str = "") -> tuple[str, dict[str, Any]]:
+        """Build prompt for PR analysis with optional RAG context.
 
-        files_info = []
-        for file in pr_data.get('files', [])[:20]:
-            file_summary = f"File: {file['filename']} | Status: {file['status']} | +{file['additions']} -{file['deletions']}"
-            if file.get('patch') and len(file['patch']) < 1000:
-                file_summary += f"\n  Diff:\n{file['patch'][:600]}"
-            files_info.append(file_summary)
+        Returns (prompt, packing report) — see context_packer.py
+        """
+        packed = context_packer.pack(pr_data.get('files', []))
 
         # RAG section (only included if past analyses exist)
         rag_section = ""
@@ -400,7 +627,7 @@ Description:
 {pr_data.get('description', 'No description')[:500]}
 
 FILES CHANGED:
-{chr(10).join(files_info)}
+{packed["text"]}
 {rag_section}
 Return your analysis as JSON matching this EXACT schema:
 {PR_ANALYSIS_SCHEMA}
@@ -415,7 +642,35 @@ SCORING RULES:
 - security_concerns: list actual security issues found (empty list if none)
 - impact_areas: list the main system components affected
 
-Be thorough, technical, and precise. Return ONLY valid JSON."""
+Be thorough, technical, and precise. Return ONLY valid JSON.""", packed["report"]
+
+    # ====================================================================
+    # COST ESTIMATES — Tokens an analysis will spend (services/llm/quota.py)
+    # ====================================================================
+    def estimate_commit_tokens(self, commit_data: dict[str, Any]) -> int:
+        """Input + output tokens of analyze_code_changes() / stream_analysis().
+
+        Built with the real prompt builder; RAG context is not known yet and
+        is billed when the request settles.
+        """
+        static_results = get_cached_static_analysis(commit_data) or NO_STATIC_RESULTS
+        prompt, _ = self._build_commit_prompt(commit_data, static_results)
+        return estimate_tokens(prompt) + settings.LLM_OUTPUT_TOKEN_ESTIMATE
+
+    def estimate_pr_tokens(self, pr_data: dict[str, Any]) -> int:
+        """Input + output tokens of analyze_pull_request() / stream_pr_analysis()."""
+        if not self._needs_map_reduce(pr_data):
+            prompt, _ = self._build_pr_prompt(pr_data)
+            return estimate_tokens(prompt) + settings.LLM_OUTPUT_TOKEN_ESTIMATE
+
+        groups = context_packer.group_files(pr_data.get('files', []), settings.PR_MAP_REDUCE_GROUP_TOKENS)
+        tokens = sum(
+            estimate_tokens(self._build_pr_group_prompt(pr_data, group, i, len(groups))[0])
+            for i, group in enumerate(groups, 1)
+        )
+        tokens += estimate_tokens(self._build_pr_reduce_prompt(pr_data, []))
+        # Each partial review is written once by a map call and read once by the reduce call
+        return tokens + (2 * len(groups) + 1) * settings.LLM_OUTPUT_TOKEN_ESTIMATE
 
     # ====================================================================
     # RESULT BUILDERS — Merge AI output with metadata
@@ -444,6 +699,7 @@ Be thorough, technical, and precise. Return ONLY valid JSON."""
             "lines_added": commit_data['stats']['additions'],
             "lines_removed": commit_data['stats']['deletions'],
             "commit_hash": commit_data['sha'],
+            "repository_name": commit_data.get("repository"),
             "commit_message": commit_data['message'],
             "author": commit_data['author'],
             "analysis_date": commit_data['date'],
@@ -484,6 +740,7 @@ Be thorough, technical, and precise. Return ONLY valid JSON."""
             "lines_added": pr_data['stats']['additions'],
             "lines_removed": pr_data['stats']['deletions'],
             "pr_number": pr_data['pr_number'],
+            "repository_name": pr_data.get("repository"),
             "pr_title": pr_data['title'],
             "author": pr_data['author'],
         }
@@ -491,7 +748,7 @@ Be thorough, technical, and precise. Return ONLY valid JSON."""
     # ====================================================================
     # RAG INTEGRATION — Retrieve past analyses to augment prompts
     # ====================================================================
-    def _get_rag_context(self, commit_data: dict[str, Any]) -> str:
+    async def _get_rag_context(self, commit_data: dict[str, Any]) -> str:
         """Retrieve relevant past analyses for a commit from the RAG knowledge base."""
         try:
             from app.services.rag_service import rag_service
@@ -501,16 +758,18 @@ Be thorough, technical, and precise. Return ONLY valid JSON."""
             for file in commit_data.get('files', [])[:5]:
                 search_text += f"{file.get('filename', '')} "
 
-            rag_result = rag_service.get_rag_context(
-                current_analysis_text=search_text.strip(),
-                top_k=3
-            )
+            with metrics.stage("gemini_service", "rag_retrieve"):
+                rag_result = await rag_service.get_rag_context(
+                    current_analysis_text=search_text.strip(),
+                    repository_name=commit_data.get("repository"),
+                    top_k=3
+                )
             return rag_result.get("context", "")
         except Exception:
             # RAG is optional — if it fails, continue without it
             return ""
 
-    def _get_rag_context_for_pr(self, pr_data: dict[str, Any]) -> str:
+    async def _get_rag_context_for_pr(self, pr_data: dict[str, Any]) -> str:
         """Retrieve relevant past analyses for a PR from the RAG knowledge base."""
         try:
             from app.services.rag_service import rag_service
@@ -520,23 +779,28 @@ Be thorough, technical, and precise. Return ONLY valid JSON."""
             for file in pr_data.get('files', [])[:5]:
                 search_text += f"{file.get('filename', '')} "
 
-            rag_result = rag_service.get_rag_context(
-                current_analysis_text=search_text.strip(),
-                top_k=3
-            )
+            with metrics.stage("gemini_service", "rag_retrieve"):
+                rag_result = await rag_service.get_rag_context(
+                    current_analysis_text=search_text.strip(),
+                    repository_name=pr_data.get("repository"),
+                    top_k=3
+                )
             return rag_result.get("context", "")
         except Exception:
             return ""
 
-    def _store_in_rag(self, analysis_result: dict[str, Any]) -> None:
+    async def _store_in_rag(self, analysis_result: dict[str, Any]) -> None:
         """Auto-store a completed analysis in the RAG knowledge base."""
         try:
             from app.services.rag_service import rag_service
 
-            rag_service.store_analysis(
-                analysis_data=analysis_result,
-                repository_name=analysis_result.get("repository_name"),
-            )
+            with metrics.stage("gemini_service", "rag_store"):
+                stored = await rag_service.store_analysis(
+                    analysis_data=analysis_result,
+                    repository_name=analysis_result.get("repository_name"),
+                )
+            # Saved on the Analysis row, so deleting the row removes exactly this document
+            analysis_result["rag_document_id"] = stored["document_id"]
         except Exception as e:
             # RAG storage is best-effort — don't break analysis if it fails
             import logging
@@ -6,10 +6,15 @@
 #   - get_user_repos()       → Fetch all repos the user has access to
 #   - get_repo_commits()     → Get recent commits for a specific repo
 #   - get_commit_diff()      → Get the full code diff for a specific commit
+#   - get_commit_diff_cached() → Same, through the commit_diff:{repo}:{sha} cache
+#   - rate_limit_remaining() → GitHub API calls left for a token (prefetch budget)
 #   - get_pull_requests()    → Fetch all PRs for a repo
 #   - get_pr_details()       → Get detailed info + diff for a specific PR
 #   - get_pr_diff()          → Get just the code diff of a PR
 # All methods require the user's GitHub access token from OAuth.
+# Diff fetches (commit / PR files) are timed as stage_duration_seconds
+# {component="github_service"} (core/metrics.py); every GitHub call is a
+# trace span (core/tracing.py).
 # ============================================================================
 
 from typing import Any
@@ -17,6 +22,9 @@ from typing import Any
 from fastapi import HTTPException
 from github import Github
 
+from app.core.metrics import metrics
+from app.core.redis import TTL_COMMIT_DIFF, CacheManager
+from app.core.tracing import traced
 from app.models.user import User
 
 
@@ -24,6 +32,7 @@ class GitHubService:
     def __init__(self):
         self.api_base_url = "https://api.github.com"
 
+    @traced("github.get_user_repositories")
     async def get_user_repositories(self, user: User, per_page: int = 30) -> list[dict[str, Any]]:
         """Fetch user's GitHub repositories"""
         try:
@@ -59,6 +68,7 @@ class GitHubService:
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"Failed to fetch repositories: {str(e)}")
 
+    @traced("github.get_repository_details")
     async def get_repository_details(self, user: User, repo_full_name: str) -> dict[str, Any]:
         """Get detailed information about a specific repository"""
         try:
@@ -91,6 +101,7 @@ class GitHubService:
         except Exception as e:
             raise HTTPException(status_code=404, detail=f"Repository not found: {str(e)}")
 
+    @traced("github.get_recent_commits")
     async def get_recent_commits(self, user: User, repo_full_name: str, limit: int = 10) -> list[dict[str, Any]]:
         """Get recent commits from a repository"""
         try:
@@ -129,38 +140,62 @@ class GitHubService:
     async def get_commit_diff(self, user: User, repo_full_name: str, commit_sha: str) -> dict[str, Any]:
         """Get detailed diff information for a specific commit"""
         try:
-            g = Github(user.access_token)
-            repo = g.get_repo(repo_full_name)
-            commit = repo.get_commit(commit_sha)
-
-            files_changed = []
-            for file in commit.files:
-                file_data = {
-                    "filename": file.filename,
-                    "status": file.status,
-                    "additions": file.additions,
-                    "deletions": file.deletions,
-                    "changes": file.changes,
-                    "patch": file.patch if hasattr(file, 'patch') else None
-                }
-                files_changed.append(file_data)
+            with metrics.stage("github_service", "commit_diff"):
+                return self.fetch_commit_diff(user.access_token, repo_full_name, commit_sha)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Failed to fetch commit diff: {str(e)}")
 
-            return {
-                "sha": commit.sha,
-                "message": commit.commit.message,
-                "author": commit.commit.author.name,
-                "date": commit.commit.author.date.isoformat(),
-                "stats": {
-                    "total": commit.stats.total,
-                    "additions": commit.stats.additions,
-                    "deletions": commit.stats.deletions
-                },
-                "files": files_changed
+    @traced("github.get_commit_diff_cached")
+    async def get_commit_diff_cached(self, user: User, repo_id: int, repo_full_name: str, commit_sha: str) -> dict[str, Any]:
+        """get_commit_diff() through the commit_diff:{repo_id}:{sha} cache (diffs are immutable)."""
+        cache_key = f"commit_diff:{repo_id}:{commit_sha}"
+        cached = CacheManager.get_json(cache_key)
+        if cached is not None:
+            return cached
+
+        commit_diff = await self.get_commit_diff(user, repo_full_name, commit_sha)
+        CacheManager.set_json(cache_key, commit_diff, TTL_COMMIT_DIFF)
+        return commit_diff
+
+    @traced("github.fetch_commit_diff")
+    def fetch_commit_diff(self, access_token: str, repo_full_name: str, commit_sha: str) -> dict[str, Any]:
+        """Blocking commit diff fetch (PyGithub) — run it in a thread from async code."""
+        g = Github(access_token)
+        repo = g.get_repo(repo_full_name)
+        commit = repo.get_commit(commit_sha)
+
+        files_changed = []
+        for file in commit.files:
+            file_data = {
+                "filename": file.filename,
+                "status": file.status,
+                "additions": file.additions,
+                "deletions": file.deletions,
+                "changes": file.changes,
+                "patch": file.patch if hasattr(file, 'patch') else None
             }
+            files_changed.append(file_data)
 
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=f"Failed to fetch commit diff: {str(e)}")
+        return {
+            "sha": commit.sha,
+            "repository": repo_full_name,
+            "message": commit.commit.message,
+            "author": commit.commit.author.name,
+            "date": commit.commit.author.date.isoformat(),
+            "stats": {
+                "total": commit.stats.total,
+                "additions": commit.stats.additions,
+                "deletions": commit.stats.deletions
+            },
+            "files": files_changed
+        }
+
+    @traced("github.rate_limit_remaining")
+    def rate_limit_remaining(self, access_token: str) -> int:
+        """Core API calls left for this token (the /rate_limit call itself is free)."""
+        return Github(access_token).get_rate_limit().core.remaining
 
+    @traced("github.get_repository_pull_requests")
     async def get_repository_pull_requests(self, user: User, repo_full_name: str, state: str = "open", limit: int = 30) -> list[dict[str, Any]]:
         """Get pull requests from a repository"""
         try:
@@ -195,23 +230,25 @@ class GitHubService:
     async def get_pull_request_files(self, user: User, repo_full_name: str, pr_number: int) -> dict[str, Any]:
         """Get detailed file changes for a specific pull request"""
         try:
-            g = Github(user.access_token)
-            repo = g.get_repo(repo_full_name)
-            pr = repo.get_pull(pr_number)
-
-            files_changed = []
-            for file in pr.get_files():
-                file_data = {
-                    "filename": file.filename,
-                    "status": file.status,
-                    "additions": file.additions,
-                    "deletions": file.deletions,
-                    "changes": file.changes,
-                    "patch": file.patch if hasattr(file, 'patch') else None
-                }
-                files_changed.append(file_data)
+            with metrics.stage("github_service", "pull_request_files"):
+                g = Github(user.access_token)
+                repo = g.get_repo(repo_full_name)
+                pr = repo.get_pull(pr_number)
+
+                files_changed = []
+                for file in pr.get_files():
+                    file_data = {
+                        "filename": file.filename,
+                        "status": file.status,
+                        "additions": file.additions,
+                        "deletions": file.deletions,
+                        "changes": file.changes,
+                        "patch": file.patch if hasattr(file, 'patch') else None
+                    }
+                    files_changed.append(file_data)
 
             return {
+                "repository": repo_full_name,
                 "pr_number": pr.number,
                 "title": pr.title,
                 "description": pr.body,
@@ -0,0 +1,143 @@
+# ============================================================================
+# SERVICES/HEALTH_SERVICE.PY — Liveness / Readiness Probes
+# ============================================================================
+# Backs the probe endpoints in main.py:
+#   - GET /health/live   → the process is up and its event loop answers.
+#                          Never touches a dependency (a DB outage must not
+#                          make the orchestrator restart every worker)
+#   - GET /health/ready  → this worker can serve traffic; 503 otherwise so
+#                          the load balancer routes elsewhere
+#   - GET /health        → same report as /health/ready (kept for existing
+#                          monitors)
+#
+# Readiness checks:
+#   - Postgres  → SELECT 1 through the async pool
+#   - Redis     → PING on a dedicated connection with socket timeouts
+#   - ChromaDB  → heartbeat() of the persistent client (in a thread)
+#   Each probe is bounded by HEALTH_PROBE_TIMEOUT_SECONDS and reports its
+#   latency. Results are cached per worker for HEALTH_CACHE_SECONDS and
+#   concurrent callers share one probe run, so a probe storm never turns
+#   into a storm of queries against the dependencies.
+#
+# Not ready when:
+#   - a check in HEALTH_REQUIRED_CHECKS is down (other checks down →
+#     "degraded", still ready: RAG memory is optional for a review)
+#   - the DB pool is saturated (HEALTH_MAX_DB_POOL_SATURATION)
+#   - too many LLM calls are queued in the gateway (HEALTH_MAX_LLM_QUEUE_DEPTH)
+# Pool usage and queue depth are read fresh on every call (no I/O).
+# ============================================================================
+
+import asyncio
+import logging
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+import redis
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.core.database import async_engine
+from app.services.llm.gateway import llm_gateway
+
+logger = logging.getLogger(__name__)
+
+
+class HealthService:
+    def __init__(self):
+        # Separate from the shared client: a PING must fail fast, not hang
+        self._redis = redis.from_url(
+            settings.REDIS_URL,
+            socket_timeout=settings.HEALTH_PROBE_TIMEOUT_SECONDS,
+            socket_connect_timeout=settings.HEALTH_PROBE_TIMEOUT_SECONDS,
+        )
+        self._lock: asyncio.Lock | None = None
+        self._checks: dict[str, dict[str, Any]] | None = None
+        self._checked_at = 0.0
+
+    async def readiness(self) -> dict[str, Any]:
+        """Dependency checks (cached) plus current load, with the ready verdict."""
+        checks = await self._cached_checks()
+        load = self._load()
+
+        reasons = [f"{name} unavailable" for name in sorted(settings.HEALTH_REQUIRED_CHECKS)
+                   if checks.get(name, {}).get("status") != "ok"]
+        if load["db_pool"]["saturation"] >= settings.HEALTH_MAX_DB_POOL_SATURATION:
+            reasons.append("database pool saturated")
+        if load["llm"]["queued"] > settings.HEALTH_MAX_LLM_QUEUE_DEPTH:
+            reasons.append("LLM queue too deep")
+
+        if reasons:
+            status = "unavailable"
+        elif any(check["status"] != "ok" for check in checks.values()):
+            status = "degraded"
+        else:
+            status = "ok"
+
+        return {
+            "status": status,
+            "ready": not reasons,
+            "reasons": reasons,
+            "checks": checks,
+            "load": load,
+            "checked_seconds_ago": round(time.monotonic() - self._checked_at, 1),
+        }
+
+    async def _cached_checks(self) -> dict[str, dict[str, Any]]:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            # Callers that queued behind a running probe reuse its result
+            if self._checks is None or time.monotonic() - self._checked_at >= settings.HEALTH_CACHE_SECONDS:
+                results = await asyncio.gather(
+                    self._probe("database", self._check_database),
+                    self._probe("redis", self._check_redis),
+                    self._probe("chromadb", self._check_chromadb),
+                )
+                self._checks = dict(zip(("database", "redis", "chromadb"), results, strict=True))
+                self._checked_at = time.monotonic()
+            return self._checks
+
+    async def _probe(self, name: str, check: Callable[[], Awaitable[None]]) -> dict[str, Any]:
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(check(), timeout=settings.HEALTH_PROBE_TIMEOUT_SECONDS)
+        except TimeoutError:
+            error = f"timed out after {settings.HEALTH_PROBE_TIMEOUT_SECONDS:g}s"
+        except Exception as e:
+            error = str(e) or type(e).__name__
+        else:
+            return {"status": "ok", "latency_ms": round(1000 * (time.perf_counter() - started), 1)}
+
+        logger.warning(f"Health check {name} failed: {error}")
+        return {"status": "down", "latency_ms": round(1000 * (time.perf_counter() - started), 1), "error": error}
+
+    async def _check_database(self) -> None:
+        async with async_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    async def _check_redis(self) -> None:
+        await asyncio.to_thread(self._redis.ping)
+
+    async def _check_chromadb(self) -> None:
+        from app.services.rag_service import rag_service
+
+        await asyncio.to_thread(rag_service.chroma_client.heartbeat)
+
+    def _load(self) -> dict[str, Any]:
+        pool = async_engine.pool
+        capacity = settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW
+        return {
+            "db_pool": {
+                "checked_out": pool.checkedout(),
+                "idle": pool.checkedin(),
+                "max": capacity,
+                "saturation": round(pool.checkedout() / capacity, 2) if capacity else 1.0,
+            },
+            "llm": llm_gateway.load(),
+        }
+
+
+# Create global instance
+health_service = HealthService()
@@ -0,0 +1,153 @@
+# ============================================================================
+# SERVICES/LEXICAL_INDEX.PY — Local BM25 Inverted Index for RAG Retrieval
+# ============================================================================
+# An in-process keyword index over the analyses stored in ChromaDB.
+#
+# WHY: RAG queries are mostly file paths and commit messages, where exact
+# token matches ("app/routes/auth.py", "A03:Injection", "pickle.loads")
+# matter more than semantic similarity. BM25 handles those well, and it
+# answers without an embedding API call.
+#
+# HOW IT WORKS:
+#   - Tokens are lower-cased words plus whole file paths, base names and
+#     path components, so "auth.py" matches "app/routes/auth.py"
+#   - Postings map term → {doc_id: term frequency}; scoring is Okapi BM25
+#   - search() also returns a per-hit confidence: the IDF-weighted fraction
+#     of query terms the document contains. High confidence lets RAGService
+#     answer without the embedding call + vector search
+#
+# The index is NOT persisted. ChromaDB is the source of truth; RAGService
+# rebuilds / re-syncs this index from the collections when they diverge.
+# ============================================================================
+
+import math
+import re
+import threading
+from collections import Counter
+
+# Okapi BM25 tuning constants
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_WORD_RE = re.compile(r"[a-z0-9_]+")
+_PATH_RE = re.compile(r"[\w.-]*(?:/[\w.-]+)+|[\w-]+\.[a-z0-9]{1,5}\b")
+
+
+def tokenize(text: str) -> list[str]:
+    """Split text into BM25 terms: words + whole paths + path components."""
+    text = text.lower()
+    tokens = _WORD_RE.findall(text)
+
+    for path in _PATH_RE.findall(text):
+        path = path.strip("./-")
+        if not path:
+            continue
+        tokens.append(path)
+        for component in path.split("/"):
+            if component and component != path:
+                tokens.append(component)
+
+    return tokens
+
+
+class LexicalIndex:
+    """Thread-safe BM25 inverted index keyed by analysis document id."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings: dict[str, dict[str, int]] = {}
+        self._doc_lengths: dict[str, int] = {}
+        self._doc_terms: dict[str, list[str]] = {}
+        self._doc_repository: dict[str, str] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._doc_lengths)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._doc_lengths
+
+    def doc_ids(self) -> set[str]:
+        with self._lock:
+            return set(self._doc_lengths)
+
+    # ====================================================================
+    # WRITE — Add / remove documents
+    # ====================================================================
+    def add(self, doc_id: str, text: str, repository: str | None = None) -> None:
+        """Index (or re-index) a document."""
+        term_counts = Counter(tokenize(text))
+        with self._lock:
+            if doc_id in self._doc_lengths:
+                self._remove_locked(doc_id)
+
+            for term, count in term_counts.items():
+                self._postings.setdefault(term, {})[doc_id] = count
+
+            length = sum(term_counts.values())
+            self._doc_lengths[doc_id] = length
+            self._doc_terms[doc_id] = list(term_counts)
+            self._doc_repository[doc_id] = repository or "unknown"
+            self._total_length += length
+
+    def remove(self, doc_id: str) -> None:
+        with self._lock:
+            if doc_id in self._doc_lengths:
+                self._remove_locked(doc_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._postings.clear()
+            self._doc_lengths.clear()
+            self._doc_terms.clear()
+            self._doc_repository.clear()
+            self._total_length = 0
+
+    def _remove_locked(self, doc_id: str) -> None:
+        for term in self._doc_terms.pop(doc_id, []):
+            postings = self._postings.get(term, {})
+            postings.pop(doc_id, None)
+            if not postings:
+                self._postings.pop(term, None)
+        self._total_length -= self._doc_lengths.pop(doc_id)
+        self._doc_repository.pop(doc_id, None)
+
+    # ====================================================================
+    # READ — BM25 search + match confidence
+    # ====================================================================
+    def search(
+        self,
+        query: str,
+        top_k: int = 5,
+        repository_name: str | None = None,
+    ) -> list[tuple[str, float, float]]:
+        """Return up to top_k (doc_id, bm25_score, confidence) tuples, best first."""
+        query_terms = set(tokenize(query))
+        with self._lock:
+            total_docs = len(self._doc_lengths)
+            if total_docs == 0 or not query_terms:
+                return []
+
+            avg_length = self._total_length / total_docs
+            idf = {term: self._idf(term, total_docs) for term in query_terms}
+            total_idf = sum(idf.values()) or 1.0
+
+            scores: dict[str, float] = {}
+            matched_idf: dict[str, float] = {}
+            for term in query_terms:
+                for doc_id, tf in self._postings.get(term, {}).items():
+                    if repository_name and self._doc_repository.get(doc_id) != repository_name:
+                        continue
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self._doc_lengths[doc_id] / avg_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf[term] * tf * (BM25_K1 + 1) / (tf + norm)
+                    matched_idf[doc_id] = matched_idf.get(doc_id, 0.0) + idf[term]
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        return [
+            (doc_id, round(score, 4), round(matched_idf[doc_id] / total_idf, 3))
+            for doc_id, score in ranked
+        ]
+
+    def _idf(self, term: str, total_docs: int) -> float:
+        doc_freq = len(self._postings.get(term, {}))
+        return math.log(1 + (total_docs - doc_freq + 0.5) / (doc_freq + 0.5))
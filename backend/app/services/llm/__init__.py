@@ -0,0 +1,16 @@
+# ============================================================================
+# SERVICES/LLM/ — Shared Infrastructure for All Gemini Calls
+# ============================================================================
+#   - client.py      → Model registry (named profiles, built lazily), one-time
+#                      SDK configure, retry with backoff + jitter, streaming,
+#                      per-call latency / token / error metrics. Every
+#                      service calls Gemini through `llm_client`
+#   - gateway.py     → Per-model concurrency cap, tokens-per-minute budget and
+#                      priority scheduling (interactive before background),
+#                      with queue-wait metrics
+#   - quota.py       → Token budgets per repository owner and per repository
+#                      in Redis: requests reserve their estimated tokens,
+#                      settled with actual usage; over budget → wait or 429
+#   - json_stream.py → Incremental parser: streamed JSON output → field
+#                      deltas / list items / completed fields for SSE
+# ============================================================================
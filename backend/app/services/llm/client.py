@@ -0,0 +1,362 @@
+# ============================================================================
+# SERVICES/LLM/CLIENT.PY — One Gemini Client for the Whole Backend
+# ============================================================================
+# GeminiService, the three specialist agents, ChatService, AutoFixService
+# and the RAG embeddings all call Gemini through `llm_client` instead of
+# configuring the SDK and building their own GenerativeModel.
+#
+# What it provides:
+#   - Model registry: named profiles (model + generation config). Models are
+#     built lazily on first use and shared by every caller of a profile,
+#     so importing a service no longer talks to the SDK
+#   - Shared transport: genai.configure() runs ONCE per process; all
+#     models reuse the SDK's client / connection pool
+#   - Admission: every generate / embed call takes a slot from the LLM gateway
+#     (gateway.py — concurrency cap, token budget, priority)
+#   - Retry: transient errors (429, 5xx, deadline) are retried up to
+#     LLM_MAX_RETRIES times with exponential backoff + full jitter.
+#     The gateway slot is released while backing off
+#   - Streaming: stream() yields text chunks as Gemini generates them;
+#     retried only until the first chunk has been handed to the caller
+#   - Instrumentation: per caller + model — calls, errors, retries,
+#     latency (avg / p95), time to first chunk for streams, and
+#     prompt / output / cached tokens (GET /analysis/llm/calls, and
+#     llm_tokens_total / llm_calls_total at GET /metrics)
+#   - Quota: each call's token usage is billed to the current request's
+#     LLM quota charge (quota.py)
+#
+# Usage:
+#   response = await llm_client.generate("analysis", prompt, caller="gemini_service")
+#   vectors = await llm_client.embed(["text", ...], caller="rag_service")
+# ============================================================================
+
+import asyncio
+import logging
+import math
+import random
+import threading
+import time
+from collections import deque
+from collections.abc import AsyncGenerator, Awaitable, Callable
+from dataclasses import dataclass
+from typing import Any
+
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+from google.generativeai.types import GenerationConfig
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.context_packer import estimate_tokens
+from app.services.llm.gateway import llm_gateway
+from app.services.llm.quota import llm_quota
+
+logger = logging.getLogger(__name__)
+
+# Latency samples kept per (caller, model) for the p95
+LATENCY_WINDOW = 500
+
+# Errors worth another attempt — quota, overload, transient server failures
+RETRYABLE_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.TooManyRequests,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.GatewayTimeout,
+)
+
+
+@dataclass(frozen=True)
+class ModelProfile:
+    """A named model configuration callers ask for instead of a model object."""
+
+    model: str
+    temperature: float
+    json: bool = True  # response_mime_type="application/json"
+
+    def generation_config(self) -> GenerationConfig:
+        if self.json:
+            return GenerationConfig(response_mime_type="application/json", temperature=self.temperature)
+        return GenerationConfig(temperature=self.temperature)
+
+
+MODEL_PROFILES: dict[str, ModelProfile] = {
+    "analysis": ModelProfile("gemini-2.5-flash", temperature=0.3),  # commit / PR review
+    "agent": ModelProfile("gemini-2.5-flash", temperature=0.2),  # specialist agents
+    "agent_lite": ModelProfile(settings.AGENT_LITE_MODEL or "gemini-2.5-flash", temperature=0.2),
+    "chat": ModelProfile("gemini-2.5-flash", temperature=0.4, json=False),  # conversational
+    "autofix": ModelProfile("gemini-2.5-flash", temperature=0.2),  # code generation
+}
+
+EMBEDDING_MODEL = "models/gemini-embedding-001"
+
+
+class _CallStats:
+    """Counters for one (caller, model) pair."""
+
+    def __init__(self, caller: str, model_name: str):
+        self.labels = {"caller": caller, "model": model_name}  # Prometheus labels
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.cached_tokens = 0
+        self.latencies: deque = deque(maxlen=LATENCY_WINDOW)
+        self.first_chunk_latencies: deque = deque(maxlen=LATENCY_WINDOW)  # streams only
+
+    def snapshot(self) -> dict[str, Any]:
+        samples = sorted(self.latencies)
+        first_chunk = sorted(self.first_chunk_latencies)
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "avg_latency_ms": round(1000 * sum(samples) / len(samples), 1) if samples else None,
+            "p95_latency_ms": round(1000 * samples[math.ceil(0.95 * len(samples)) - 1], 1) if samples else None,
+            "p95_first_chunk_ms": (
+                round(1000 * first_chunk[math.ceil(0.95 * len(first_chunk)) - 1], 1) if first_chunk else None
+            ),
+            "prompt_tokens": self.prompt_tokens,
+            "output_tokens": self.output_tokens,
+            "cached_tokens": self.cached_tokens,
+        }
+
+
+class LLMClient:
+    """Process-wide Gemini client: registry, retry and instrumentation."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._configured = False
+        self._models: dict[str, genai.GenerativeModel] = {}
+        self._stats: dict[tuple[str, str], _CallStats] = {}
+
+    # ====================================================================
+    # REGISTRY
+    # ====================================================================
+    def configure(self) -> None:
+        """Configure the SDK once (API key + shared transport)."""
+        if self._configured:
+            return
+        with self._lock:
+            if not self._configured:
+                genai.configure(api_key=settings.GEMINI_API_KEY)
+                self._configured = True
+
+    def model(self, profile: str) -> genai.GenerativeModel:
+        """Shared GenerativeModel for a registered profile (built on first use)."""
+        model = self._models.get(profile)
+        if model is None:
+            spec = MODEL_PROFILES[profile]
+            self.configure()
+            model = genai.GenerativeModel(spec.model, generation_config=spec.generation_config())
+            with self._lock:
+                model = self._models.setdefault(profile, model)
+        return model
+
+    def model_name(self, profile: str) -> str:
+        return MODEL_PROFILES[profile].model
+
+    def cached_model(self, profile: str, cached_content: Any) -> genai.GenerativeModel:
+        """Model bound to a provider-side CachedContent, with the profile's config."""
+        self.configure()
+        return genai.GenerativeModel.from_cached_content(
+            cached_content, generation_config=MODEL_PROFILES[profile].generation_config()
+        )
+
+    # ====================================================================
+    # CALLS
+    # ====================================================================
+    async def generate(
+        self,
+        profile: str,
+        prompt: str,
+        *,
+        caller: str,
+        model: genai.GenerativeModel | None = None,
+        extra_tokens: int = 0,
+    ) -> Any:
+        """generate_content_async through the gateway, with retry + metrics.
+
+        model: override the profile's shared model (e.g. a cached-content model).
+        extra_tokens: input tokens not in `prompt` (cached prefix, history).
+        """
+        model = model or self.model(profile)
+        return await self._call(
+            caller,
+            model.model_name,
+            estimate_tokens(prompt) + extra_tokens,
+            lambda: model.generate_content_async(prompt),
+        )
+
+    async def chat(self, profile: str, history: list[dict[str, Any]], message: str, *, caller: str) -> Any:
+        """Send one message in a multi-turn chat rebuilt from `history`."""
+        session = self.model(profile).start_chat(history=history)
+        history_tokens = sum(estimate_tokens(part) for turn in history for part in turn.get("parts", []))
+        return await self._call(
+            caller,
+            session.model.model_name,
+            history_tokens + estimate_tokens(message),
+            lambda: session.send_message_async(message),
+        )
+
+    async def stream(self, profile: str, prompt: str, *, caller: str) -> AsyncGenerator[str]:
+        """Yield the response text chunk by chunk while Gemini generates it.
+
+        Holds one gateway slot for the whole stream. Transient errors are
+        retried only before the first chunk was yielded.
+        """
+        model = self.model(profile)
+        model_name = model.model_name.removeprefix("models/")
+        stats = self._stats_for(caller, model_name)
+        for attempt in range(settings.LLM_MAX_RETRIES + 1):
+            first_chunk_at = None
+            try:
+                async with llm_gateway.slot(model_name, estimate_tokens(prompt)) as slot:
+                    started = time.monotonic()
+                    response = await model.generate_content_async(prompt, stream=True)
+                    async for chunk in response:
+                        text = _chunk_text(chunk)
+                        if not text:
+                            continue
+                        if first_chunk_at is None:
+                            first_chunk_at = time.monotonic()
+                            with self._lock:
+                                stats.first_chunk_latencies.append(first_chunk_at - started)
+                        yield text
+                    slot.record_usage(response)
+            except RETRYABLE_ERRORS as e:
+                if first_chunk_at is not None or attempt == settings.LLM_MAX_RETRIES:
+                    self._record_error(stats)
+                    raise
+                delay = self._backoff(attempt)
+                self._record_retry(stats, caller, model_name, e, delay)
+                await asyncio.sleep(delay)
+            except Exception:
+                self._record_error(stats)
+                raise
+            else:
+                self._record_success(stats, time.monotonic() - started, usage=response)
+                return
+
+    async def embed(self, content: str | list[str], *, caller: str) -> Any:
+        """Embedding(s) for one text or a batch, through the gateway like any other call."""
+        self.configure()
+        texts = content if isinstance(content, list) else [content]
+        input_tokens = sum(map(estimate_tokens, texts))
+        result = await self._call(
+            caller,
+            EMBEDDING_MODEL,
+            input_tokens,
+            lambda: genai.embed_content_async(model=EMBEDDING_MODEL, content=content),
+            usage_tokens=input_tokens,
+        )
+        return result["embedding"]
+
+    async def _call(
+        self,
+        caller: str,
+        model_name: str,
+        estimated_tokens: int,
+        send: Callable[[], Awaitable[Any]],
+        usage_tokens: int | None = None,
+    ) -> Any:
+        """One admitted call with retry + metrics.
+
+        usage_tokens: billed size for responses without usage metadata
+        (embeddings produce no output tokens and report no usage).
+        """
+        model_name = model_name.removeprefix("models/")
+        stats = self._stats_for(caller, model_name)
+        for attempt in range(settings.LLM_MAX_RETRIES + 1):
+            try:
+                async with llm_gateway.slot(model_name, estimated_tokens) as slot:
+                    started = time.monotonic()
+                    response = await send()
+                    slot.record_usage(response)
+                    if usage_tokens is not None:
+                        slot.actual_tokens = usage_tokens
+            except RETRYABLE_ERRORS as e:
+                if attempt == settings.LLM_MAX_RETRIES:
+                    self._record_error(stats)
+                    raise
+                delay = self._backoff(attempt)
+                self._record_retry(stats, caller, model_name, e, delay)
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self._record_error(stats)
+                raise
+            else:
+                self._record_success(stats, time.monotonic() - started, usage_tokens or 0, usage=response)
+                return response
+
+    # ====================================================================
+    # RETRY + INSTRUMENTATION
+    # ====================================================================
+    def _backoff(self, attempt: int) -> float:
+        """Exponential backoff with full jitter."""
+        ceiling = min(settings.LLM_RETRY_MAX_DELAY_SECONDS, settings.LLM_RETRY_BASE_DELAY_SECONDS * 2 ** attempt)
+        return random.uniform(0, ceiling)
+
+    def _stats_for(self, caller: str, model_name: str) -> _CallStats:
+        with self._lock:
+            stats = self._stats.get((caller, model_name))
+            if stats is None:
+                stats = self._stats[(caller, model_name)] = _CallStats(caller, model_name)
+            return stats
+
+    def _record_retry(self, stats: _CallStats, caller: str, model_name: str, error: Exception, delay: float) -> None:
+        with self._lock:
+            stats.retries += 1
+        logger.warning(f"{caller} → {model_name}: {type(error).__name__}, retrying in {delay:.2f}s")
+
+    def _record_error(self, stats: _CallStats) -> None:
+        with self._lock:
+            stats.calls += 1
+            stats.errors += 1
+        metrics.llm_calls.labels(**stats.labels, result="error").inc()
+
+    def _record_success(self, stats: _CallStats, seconds: float, prompt_tokens: int = 0, usage: Any = None) -> None:
+        metadata = getattr(usage, "usage_metadata", None)
+        if metadata is not None:
+            prompt_tokens = getattr(metadata, "prompt_token_count", 0) or 0
+        output_tokens = getattr(metadata, "candidates_token_count", 0) or 0
+        cached_tokens = getattr(metadata, "cached_content_token_count", 0) or 0
+        with self._lock:
+            stats.calls += 1
+            stats.latencies.append(seconds)
+            stats.prompt_tokens += prompt_tokens
+            stats.output_tokens += output_tokens
+            stats.cached_tokens += cached_tokens
+
+        metrics.llm_calls.labels(**stats.labels, result="success").inc()
+        for kind, tokens in (("prompt", prompt_tokens), ("output", output_tokens), ("cached", cached_tokens)):
+            if tokens:
+                metrics.llm_tokens.labels(**stats.labels, kind=kind).inc(tokens)
+        llm_quota.record_usage(getattr(metadata, "total_token_count", 0) or prompt_tokens)
+
+    def stats(self) -> dict[str, Any]:
+        """Per caller → per model call metrics."""
+        with self._lock:
+            items = list(self._stats.items())
+        callers: dict[str, dict[str, Any]] = {}
+        for (caller, model_name), stats in sorted(items):
+            callers.setdefault(caller, {})[model_name] = stats.snapshot()
+        return {"callers": callers}
+
+
+def _chunk_text(chunk: Any) -> str:
+    """Text of one streamed chunk ("" for chunks without parts, e.g. the final one)."""
+    try:
+        return chunk.text
+    except ValueError:
+        return ""
+
+
+# Create global instance
+llm_client = LLMClient()
+
@@ -0,0 +1,304 @@
+# ============================================================================
+# SERVICES/LLM/GATEWAY.PY — Shared LLM Admission Control
+# ============================================================================
+# Every Gemini call in the process (GeminiService, agents, ChatService,
+# AutoFixService, RAG embeddings) goes through ONE gateway before hitting
+# the API.
+#
+# WHY: Without a bound, a webhook burst plus a few users streaming
+# multi-agent reviews fires dozens of concurrent calls, trips the provider
+# quota, and every service starts failing at once.
+#
+# HOW IT WORKS (per model "lane"):
+#   - Concurrency cap: at most N calls in flight (LLM_MODEL_CONCURRENCY,
+#     default LLM_DEFAULT_CONCURRENCY)
+#   - Token budget: a token bucket refilled at LLM_TOKENS_PER_MINUTE. A call
+#     reserves its estimated tokens up front; the estimate is corrected
+#     with the API's reported usage when the call finishes
+#   - Priority queue: waiting calls are admitted by priority, then FIFO:
+#       INTERACTIVE (chat, streaming) → STANDARD → BACKGROUND (webhooks, batch)
+#     The priority comes from a contextvar, so callers mark a whole request
+#     with `with llm_priority(Priority.INTERACTIVE): ...`
+#   - A call that waits longer than LLM_QUEUE_TIMEOUT_SECONDS raises
+#     LLMQueueTimeout instead of piling up
+#
+# Metrics (GET /analysis/llm/gateway): in-flight, queue depth and
+# available tokens per model, plus queue-wait count / avg / p95 / max per
+# model and priority. In-flight / queued are also exported at GET /metrics.
+#
+# Usage:
+#   async with llm_gateway.slot(model_name, estimated_tokens) as slot:
+#       response = await model.generate_content_async(prompt)
+#       slot.record_usage(response)
+# ============================================================================
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from enum import IntEnum
+from typing import Any
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+# Queue-wait samples kept per (model, priority) for percentiles
+WAIT_WINDOW = 500
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    STANDARD = 1
+    BACKGROUND = 2
+
+
+class LLMQueueTimeout(Exception):
+    """Raised when a call waited longer than LLM_QUEUE_TIMEOUT_SECONDS for a slot."""
+
+
+_priority: contextvars.ContextVar[Priority] = contextvars.ContextVar("llm_priority", default=Priority.STANDARD)
+
+
+@contextmanager
+def llm_priority(priority: Priority):
+    """Run every LLM call inside the block at `priority`."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> Priority:
+    return _priority.get()
+
+
+class _Slot:
+    """Handle for one admitted call; corrects the token reservation on exit."""
+
+    def __init__(self, reserved_tokens: int):
+        self.reserved_tokens = reserved_tokens
+        self.actual_tokens: int | None = None
+
+    def record_usage(self, response: Any) -> None:
+        usage = getattr(response, "usage_metadata", None)
+        total = getattr(usage, "total_token_count", 0) or 0
+        if total:
+            self.actual_tokens = total
+
+
+class _ModelLane:
+    """Concurrency cap + token bucket + priority queue for one model."""
+
+    def __init__(self, model: str, concurrency: int, tokens_per_minute: int):
+        self.model = model
+        self.concurrency = concurrency
+        self.tokens_per_minute = tokens_per_minute
+        self.in_flight = 0
+        self._tokens = float(tokens_per_minute)
+        self._refilled_at = time.monotonic()
+        self._queue: list[tuple[int, int, asyncio.Future, int]] = []
+        self._seq = itertools.count()
+        self._wakeup: asyncio.TimerHandle | None = None
+        self.waits: dict[Priority, deque] = {p: deque(maxlen=WAIT_WINDOW) for p in Priority}
+        self.admitted: dict[Priority, int] = dict.fromkeys(Priority, 0)
+        self.timeouts = 0
+
+    # ---- token bucket ----
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(
+            self.tokens_per_minute,
+            self._tokens + (now - self._refilled_at) * self.tokens_per_minute / 60,
+        )
+        self._refilled_at = now
+
+    def _affordable(self, tokens: int) -> bool:
+        self._refill()
+        # A single call larger than the whole budget waits for a full bucket
+        return self._tokens >= min(tokens, self.tokens_per_minute)
+
+    def adjust_tokens(self, delta: int) -> None:
+        self._refill()
+        self._tokens -= delta  # may go negative: later calls wait off the debt
+
+    # ---- admission ----
+    def try_admit(self, tokens: int) -> bool:
+        self._drop_done()
+        if self._queue or self.in_flight >= self.concurrency or not self._affordable(tokens):
+            return False
+        self._admit(tokens)
+        return True
+
+    def enqueue(self, priority: Priority, tokens: int) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._seq), future, tokens))
+        return future
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self.dispatch()
+
+    def dispatch(self) -> None:
+        """Admit queued calls in priority order while capacity and budget allow."""
+        while self.in_flight < self.concurrency:
+            self._drop_done()
+            if not self._queue:
+                return
+            _, _, future, tokens = self._queue[0]
+            if not self._affordable(tokens):
+                self._schedule_wakeup(tokens)
+                return
+            heapq.heappop(self._queue)
+            self._admit(tokens)
+            future.set_result(None)
+
+    def _drop_done(self) -> None:
+        """Pop waiters that timed out / were cancelled from the head of the queue."""
+        while self._queue and self._queue[0][2].done():
+            heapq.heappop(self._queue)
+
+    def _admit(self, tokens: int) -> None:
+        self.in_flight += 1
+        self._tokens -= tokens
+
+    def _schedule_wakeup(self, tokens: int) -> None:
+        if self._wakeup is not None and not self._wakeup.cancelled():
+            return
+        missing = min(tokens, self.tokens_per_minute) - self._tokens
+        delay = max(missing * 60 / self.tokens_per_minute, 0.05)
+
+        def wake():
+            self._wakeup = None
+            self.dispatch()
+
+        self._wakeup = asyncio.get_running_loop().call_later(delay, wake)
+
+    def queue_depth(self) -> int:
+        return sum(1 for _, _, future, _ in self._queue if not future.done())
+
+    def available_tokens(self) -> int:
+        self._refill()
+        return math.floor(self._tokens)
+
+
+class LLMGateway:
+    """Process-wide admission control for LLM calls, one lane per model."""
+
+    def __init__(self):
+        self._lanes: dict[str, _ModelLane] = {}
+
+    def _lane(self, model: str) -> _ModelLane:
+        model = model.removeprefix("models/")
+        lane = self._lanes.get(model)
+        if lane is None:
+            lane = _ModelLane(
+                model,
+                settings.LLM_MODEL_CONCURRENCY.get(model, settings.LLM_DEFAULT_CONCURRENCY),
+                settings.LLM_MODEL_TOKENS_PER_MINUTE.get(model, settings.LLM_DEFAULT_TOKENS_PER_MINUTE),
+            )
+            self._lanes[model] = lane
+        return lane
+
+    @asynccontextmanager
+    async def slot(self, model: str, estimated_tokens: int, priority: Priority | None = None):
+        """Wait for capacity on `model`, then hold one in-flight slot."""
+        lane = self._lane(model)
+        priority = current_priority() if priority is None else priority
+        estimated_tokens += settings.LLM_OUTPUT_TOKEN_ESTIMATE
+        enqueued_at = time.monotonic()
+
+        if not lane.try_admit(estimated_tokens):
+            future = lane.enqueue(priority, estimated_tokens)
+            # Nothing may be in flight to wake us (e.g. only the token budget
+            # is short): dispatch now, which schedules the refill wakeup
+            lane.dispatch()
+            try:
+                await asyncio.wait_for(future, timeout=settings.LLM_QUEUE_TIMEOUT_SECONDS)
+            except TimeoutError:
+                lane.timeouts += 1
+                self._abandon(lane, future)
+                raise LLMQueueTimeout(
+                    f"{lane.model}: no capacity after {settings.LLM_QUEUE_TIMEOUT_SECONDS:g}s "
+                    f"({lane.in_flight} in flight, {lane.queue_depth()} queued)"
+                ) from None
+            except asyncio.CancelledError:
+                self._abandon(lane, future)
+                raise
+
+        lane.waits[priority].append(time.monotonic() - enqueued_at)
+        lane.admitted[priority] += 1
+        handle = _Slot(estimated_tokens)
+        try:
+            yield handle
+        finally:
+            if handle.actual_tokens is not None:
+                lane.adjust_tokens(handle.actual_tokens - handle.reserved_tokens)
+            lane.release()
+
+    @staticmethod
+    def _abandon(lane: _ModelLane, future: asyncio.Future) -> None:
+        """A waiter gave up (timeout / cancel).
+
+        Gives back a slot admitted in the same tick; otherwise lets the
+        waiters behind it move up.
+        """
+        if future.done() and not future.cancelled():
+            lane.release()
+        else:
+            lane.dispatch()
+
+    def stats(self) -> dict[str, Any]:
+        """Queue-wait metrics and current load per model."""
+        models = {}
+        for model, lane in self._lanes.items():
+            waits = {}
+            for priority in Priority:
+                samples = sorted(lane.waits[priority])
+                if not samples:
+                    continue
+                waits[priority.name.lower()] = {
+                    "admitted": lane.admitted[priority],
+                    "avg_wait_ms": round(1000 * sum(samples) / len(samples), 1),
+                    "p95_wait_ms": round(1000 * samples[math.ceil(0.95 * len(samples)) - 1], 1),
+                    "max_wait_ms": round(1000 * samples[-1], 1),
+                }
+            models[model] = {
+                "concurrency_limit": lane.concurrency,
+                "in_flight": lane.in_flight,
+                "queue_depth": lane.queue_depth(),
+                "tokens_per_minute": lane.tokens_per_minute,
+                "tokens_available": lane.available_tokens(),
+                "queue_timeouts": lane.timeouts,
+                "queue_wait": waits,
+            }
+        return {"models": models}
+
+    def load(self) -> dict[str, int]:
+        """Calls in flight and queued, summed over every model (readiness probe)."""
+        lanes = list(self._lanes.values())
+        return {
+            "in_flight": sum(lane.in_flight for lane in lanes),
+            "queued": sum(lane.queue_depth() for lane in lanes),
+        }
+
+
+# Create global instance
+llm_gateway = LLMGateway()
+
+
+@metrics.collector(
+    "llm_gateway_calls",
+    "LLM calls per model holding a gateway slot (in_flight) or waiting (queued).",
+    ("model", "state"),
+)
+def _gateway_metrics():
+    samples = []
+    for model, lane in list(llm_gateway._lanes.items()):
+        samples.append(({"model": model, "state": "in_flight"}, lane.in_flight))
+        samples.append(({"model": model, "state": "queued"}, lane.queue_depth()))
+    return samples
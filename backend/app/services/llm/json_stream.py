@@ -0,0 +1,196 @@
+# ============================================================================
+# SERVICES/LLM/JSON_STREAM.PY — Incremental Parser for Streamed JSON Output
+# ============================================================================
+# Gemini streams a JSON object in arbitrary text chunks. json.loads() only
+# works once the whole object has arrived, so a streaming endpoint would
+# still show nothing until generation ends.
+#
+# IncrementalJSONParser is fed the chunks as they arrive and reports the
+# TOP-LEVEL fields of the object as soon as each piece is usable:
+#
+#   {"type": "delta", "field": "summary", "text": "Adds OAuth"}
+#       → new characters of a string field that is still being written
+#   {"type": "item",  "field": "recommendations", "index": 0, "value": {...}}
+#       → one complete element of an array field
+#   {"type": "field", "field": "risk_level", "value": "medium"}
+#       → a field whose value is complete (any type)
+#
+# It scans each character once (no re-parsing of the buffer) and only
+# json.loads() slices it knows are complete; a string being written is
+# decoded from where the previous delta stopped, cut before an escape
+# sequence the next chunk completes. Text before the opening "{" (e.g. a
+# ```json fence) is ignored.
+# ============================================================================
+
+import json
+import re
+from typing import Any
+
+# A trailing unicode escape that is not complete yet ("\u12"), or the first
+# half of an escaped surrogate pair ("\ud83d") — unless its backslash is
+# itself escaped ("\\u12" is a backslash followed by the text "u12")
+_PARTIAL_UNICODE_ESCAPE = re.compile(r"(?:^|[^\\])(?:\\\\)*(\\u[0-9a-fA-F]{0,3})$")
+_HIGH_SURROGATE_ESCAPE = re.compile(r"(?:^|[^\\])(?:\\\\)*(\\u[dD][89abAB][0-9a-fA-F]{2})$")
+
+
+class IncrementalJSONParser:
+    """Feed streamed text of one JSON object, get top-level field updates."""
+
+    def __init__(self):
+        self._buf = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self.done = False
+
+        # Top-level member being parsed
+        self._key: str | None = None
+        self._reading_key = False
+        self._awaiting_value = False
+        self._value_start: int | None = None
+        self._value_kind: str | None = None  # string | array | object | scalar
+        self._delta_end = 0  # buffer offset up to which the string value was emitted
+
+        # Element of a top-level array being parsed
+        self._item_start: int | None = None
+        self._item_index = 0
+
+    def feed(self, chunk: str) -> list[dict[str, Any]]:
+        """Consume the next chunk; return the updates it completed."""
+        self._buf += chunk
+        updates: list[dict[str, Any]] = []
+        buf = self._buf
+
+        for i in range(self._pos, len(buf)):
+            if self.done:
+                break
+            c = buf[i]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    self._close_string(i, updates)
+                continue
+
+            if self._depth == 0:
+                if c == "{":
+                    self._depth = 1
+                continue
+
+            if c == '"':
+                self._in_string = True
+                self._string_start = i
+                if self._depth == 1:
+                    if self._awaiting_value:
+                        self._start_value(i, "string")
+                    else:
+                        self._reading_key = True
+                elif self._in_array_items():
+                    self._start_item(i)
+            elif c in "{[":
+                if self._depth == 1 and self._awaiting_value:
+                    self._start_value(i, "array" if c == "[" else "object")
+                elif self._in_array_items():
+                    self._start_item(i)
+                self._depth += 1
+            elif c in "}]":
+                if self._in_array_items() and c == "]":
+                    self._close_item(i, updates)
+                elif self._depth == 1:  # end of the top-level object
+                    if self._value_kind == "scalar":
+                        self._close_value(i, updates)
+                    self.done = True
+                self._depth -= 1
+                if self._depth == 1 and self._value_kind in ("array", "object"):
+                    self._close_value(i + 1, updates)
+            elif c == ":" and self._depth == 1:
+                self._awaiting_value = True
+            elif c == ",":
+                if self._depth == 1 and self._value_kind == "scalar":
+                    self._close_value(i, updates)
+                elif self._in_array_items():
+                    self._close_item(i, updates)
+            elif not c.isspace():
+                if self._depth == 1 and self._awaiting_value:
+                    self._start_value(i, "scalar")
+                elif self._in_array_items():
+                    self._start_item(i)
+
+        self._pos = len(buf)
+        if self._in_string and self._depth == 1 and self._value_kind == "string":
+            self._emit_delta(len(buf), updates)
+        return updates
+
+    # ---- top-level members ----
+    def _start_value(self, i: int, kind: str) -> None:
+        self._awaiting_value = False
+        self._value_start = i
+        self._value_kind = kind
+        self._delta_end = i + 1
+        self._item_start = None
+        self._item_index = 0
+
+    def _close_string(self, i: int, updates: list[dict[str, Any]]) -> None:
+        if self._depth != 1:
+            return
+        if self._reading_key:
+            self._reading_key = False
+            self._key = json.loads(self._buf[self._string_start:i + 1])
+        elif self._value_kind == "string":
+            self._emit_delta(i, updates)
+            self._close_value(i + 1, updates)
+
+    def _close_value(self, end: int, updates: list[dict[str, Any]]) -> None:
+        raw = self._buf[self._value_start:end].strip()
+        self._value_start = None
+        self._value_kind = None
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            return  # malformed member — the final json.loads() will report it
+        updates.append({"type": "field", "field": self._key, "value": value})
+
+    def _emit_delta(self, end: int, updates: list[dict[str, Any]]) -> None:
+        """Emit the string value written since the last delta (decodes only the new tail)."""
+        raw = self._buf[self._delta_end:end]
+        if self._in_string:  # cut an escape sequence the next chunk completes
+            if self._escape:
+                raw = raw[:-1]
+            for pattern in (_PARTIAL_UNICODE_ESCAPE, _HIGH_SURROGATE_ESCAPE):
+                match = pattern.search(raw)
+                if match:
+                    raw = raw[:match.start(1)]
+        if not raw:
+            return
+        try:
+            text = json.loads(f'"{raw}"')
+        except ValueError:
+            return
+        self._delta_end += len(raw)
+        updates.append({"type": "delta", "field": self._key, "text": text})
+
+    # ---- elements of a top-level array ----
+    def _in_array_items(self) -> bool:
+        return self._depth == 2 and self._value_kind == "array"
+
+    def _start_item(self, i: int) -> None:
+        if self._item_start is None:
+            self._item_start = i
+
+    def _close_item(self, end: int, updates: list[dict[str, Any]]) -> None:
+        if self._item_start is None:
+            return  # empty array or trailing comma
+        raw = self._buf[self._item_start:end].strip()
+        self._item_start = None
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            return
+        updates.append({"type": "item", "field": self._key, "index": self._item_index, "value": value})
+        self._item_index += 1
@@ -0,0 +1,225 @@
+# ============================================================================
+# SERVICES/LLM/QUOTA.PY — Per-User / Per-Repository LLM Token Budgets
+# ============================================================================
+# The API rate limiter (middleware/rate_limiter.py) bounds how OFTEN a
+# client calls us; this bounds how much LLM work it can buy. A multi-agent
+# review of a large diff costs ~100x the tokens of a small commit review,
+# and both draw on the same provider quota (gateway.py) — without a budget
+# one busy repository degrades everyone else's reviews.
+#
+# Budgets, in tokens per hour, shared by every replica through Redis:
+#   - per repository owner   → LLM_QUOTA_USER_TOKENS_PER_HOUR
+#   - per repository         → LLM_QUOTA_REPOSITORY_TOKENS_PER_HOUR
+# Each is a GCRA bucket (same algorithm as the rate limiter): one value per
+# scope, updated by an atomic Lua script that charges all scopes or none.
+#
+# Lifecycle of one request (LLMQuotaMiddleware opens the charge):
+#   1. The route fetches the diff, asks the service what the prompts will
+#      cost (estimate_*_tokens(), built with the real prompt builders) and
+#      calls `await llm_quota.admit(user_id, repository_id, tokens)`
+#   2. Over budget → wait for the bucket to refill if that takes at most
+#      LLM_QUOTA_MAX_WAIT_SECONDS, else 429 with Retry-After — before any
+#      LLM call is made
+#   3. Every LLM call reports its actual usage (llm_client → record_usage)
+#   4. When the request ends, the difference between the reservation and
+#      the actual usage is refunded or charged (settle)
+# Redis unavailable → requests are admitted (a warning is logged).
+# ============================================================================
+
+import asyncio
+import contextvars
+import logging
+import math
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any
+
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.core.redis import redis_client
+
+logger = logging.getLogger(__name__)
+
+WINDOW_US = 3_600_000_000
+
+# KEYS = buckets   ARGV = cost, then (interval µs per token, burst µs) per key
+# Charges every bucket, or none; returns 0, or µs until all could be charged
+RESERVE_SCRIPT = """
+local cost = tonumber(ARGV[1])
+local t = redis.call('TIME')
+local now = t[1] * 1000000 + t[2]
+
+local new_tats = {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+  local interval = tonumber(ARGV[2 * i])
+  local burst = tonumber(ARGV[2 * i + 1])
+  local tat = tonumber(redis.call('GET', key) or now)
+  if tat < now then tat = now end
+  new_tats[i] = tat + cost * interval
+  if new_tats[i] - burst > now then
+    wait = math.max(wait, new_tats[i] - burst - now)
+  end
+end
+if wait > 0 then return wait end
+
+for i, key in ipairs(KEYS) do
+  redis.call('SET', key, string.format('%d', new_tats[i]), 'PX', math.ceil((new_tats[i] - now) / 1000))
+end
+return 0
+"""
+
+# KEYS = buckets   ARGV = token delta (negative = refund), then interval µs per key
+ADJUST_SCRIPT = """
+local delta = tonumber(ARGV[1])
+local t = redis.call('TIME')
+local now = t[1] * 1000000 + t[2]
+
+for i, key in ipairs(KEYS) do
+  local tat = tonumber(redis.call('GET', key) or now)
+  if tat < now then tat = now end
+  local new_tat = tat + delta * tonumber(ARGV[i + 1])
+  if new_tat <= now then
+    redis.call('DEL', key)
+  else
+    redis.call('SET', key, string.format('%d', new_tat), 'PX', math.ceil((new_tat - now) / 1000))
+  end
+end
+return 0
+"""
+
+
+@dataclass
+class _Charge:
+    """Quota state of one request: who pays, what was reserved, what was used."""
+
+    buckets: dict[str, int] = field(default_factory=dict)  # key → tokens per hour
+    reserved: int = 0
+    used: int = 0
+
+
+_charge: contextvars.ContextVar[_Charge | None] = contextvars.ContextVar("llm_quota_charge", default=None)
+
+
+def _interval(tokens_per_hour: int) -> int:
+    return max(WINDOW_US // tokens_per_hour, 1)
+
+
+class LLMQuota:
+    """Token budgets per repository owner and per repository, kept in Redis."""
+
+    def __init__(self):
+        self._reserve = redis_client.register_script(RESERVE_SCRIPT)
+        self._adjust = redis_client.register_script(ADJUST_SCRIPT)
+        self._lock = threading.Lock()
+        self.stats = {"admitted": 0, "queued": 0, "rejected": 0, "tokens_reserved": 0, "tokens_used": 0}
+
+    def _buckets(self, user_id: int | None, repository_id: int | None) -> dict[str, int]:
+        buckets = {}
+        if user_id is not None:
+            buckets[f"llmquota:user:{user_id}"] = settings.LLM_QUOTA_USER_TOKENS_PER_HOUR
+        if repository_id is not None:
+            buckets[f"llmquota:repo:{repository_id}"] = settings.LLM_QUOTA_REPOSITORY_TOKENS_PER_HOUR
+        return buckets
+
+    @contextmanager
+    def request_scope(self):
+        """Open the charge of one request; settle it when the request ends."""
+        charge = _Charge()
+        token = _charge.set(charge)
+        try:
+            yield charge
+        finally:
+            _charge.reset(token)
+            self._settle(charge)
+
+    async def admit(self, user_id: int | None, repository_id: int | None, estimated_tokens: int) -> None:
+        """Reserve `estimated_tokens` from the user's and the repository's budgets.
+
+        Waits up to LLM_QUOTA_MAX_WAIT_SECONDS for the budgets to refill,
+        then raises HTTPException(429).
+        """
+        buckets = self._buckets(user_id, repository_id)
+        charge = _charge.get()
+        if not settings.LLM_QUOTA_ENABLED or not buckets or charge is None:
+            return
+
+        # A request larger than a whole budget waits for a full bucket
+        cost = min(estimated_tokens, *buckets.values())
+        args = [cost]
+        for tokens_per_hour in buckets.values():
+            args += [_interval(tokens_per_hour), _interval(tokens_per_hour) * tokens_per_hour]
+
+        waited = 0.0
+        while True:
+            try:
+                wait_us = int(self._reserve(keys=list(buckets), args=args))
+            except Exception as e:
+                logger.warning(f"LLM quota unavailable, admitting request: {e}")
+                return
+            if wait_us == 0:
+                break
+            wait = wait_us / 1_000_000
+            if waited + wait > settings.LLM_QUOTA_MAX_WAIT_SECONDS:
+                self.stats["rejected"] += 1
+                raise HTTPException(
+                    status_code=429,
+                    detail=f"LLM token budget exhausted (this request needs ~{estimated_tokens} tokens). "
+                           f"Retry in {math.ceil(wait)}s.",
+                    headers={"Retry-After": str(math.ceil(wait))},
+                )
+            self.stats["queued"] += 1
+            await asyncio.sleep(wait)
+            waited += wait
+
+        self.stats["admitted"] += 1
+        self.stats["tokens_reserved"] += cost
+        charge.buckets.update(buckets)
+        charge.reserved += cost
+
+    def record_usage(self, tokens: int) -> None:
+        """Actual tokens of one finished LLM call, billed to the current request."""
+        charge = _charge.get()
+        if charge is None or not tokens:
+            return
+        with self._lock:
+            charge.used += tokens
+            self.stats["tokens_used"] += tokens
+
+    def _settle(self, charge: _Charge) -> None:
+        """Refund the unused reservation, or charge usage beyond it."""
+        delta = charge.used - charge.reserved
+        if not charge.buckets or delta == 0:
+            return
+        args = [delta] + [_interval(tokens_per_hour) for tokens_per_hour in charge.buckets.values()]
+        try:
+            self._adjust(keys=list(charge.buckets), args=args)
+        except Exception as e:
+            logger.warning(f"LLM quota settlement failed ({delta:+d} tokens): {e}")
+
+    def remaining(self, user_id: int | None, repository_id: int | None) -> dict[str, Any]:
+        """Tokens left right now in each budget of a user / repository.
+
+        Redis unavailable → tokens_remaining is None (budgets are not enforced then either).
+        """
+        buckets = self._buckets(user_id, repository_id)
+        budgets = {
+            key.removeprefix("llmquota:"): {"tokens_per_hour": tokens_per_hour, "tokens_remaining": None}
+            for key, tokens_per_hour in buckets.items()
+        }
+        try:
+            seconds, micros = redis_client.time()
+            now = seconds * 1_000_000 + micros
+            for key, tokens_per_hour in buckets.items():
+                tat = max(int(redis_client.get(key) or now), now)
+                used = math.ceil((tat - now) / _interval(tokens_per_hour))
+                budgets[key.removeprefix("llmquota:")]["tokens_remaining"] = max(tokens_per_hour - used, 0)
+        except Exception as e:
+            logger.warning(f"LLM quota lookup failed: {e}")
+        return {"budgets": budgets, **self.stats}
+
+
+# Create global instance
+llm_quota = LLMQuota()
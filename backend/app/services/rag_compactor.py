@@ -0,0 +1,83 @@
+# ============================================================================
+# SERVICES/RAG_COMPACTOR.PY — Background RAG Retention Enforcement
+# ============================================================================
+# Periodically runs rag_service.compact() so the knowledge base stays
+# bounded (max age, max docs per repository, latest-per-commit) and query
+# latency doesn't drift upward as analyses accumulate over months. By
+# default only latest-per-commit applies; the age and per-repo caps delete
+# history and must be enabled explicitly (see core/config.py).
+#
+# HOW IT WORKS:
+#   - start() launches an asyncio task when the app starts (see main.py)
+#   - Every RAG_COMPACTION_INTERVAL_SECONDS the task takes a Redis lock so
+#     only ONE worker compacts per interval, then runs compact() in a
+#     thread (ChromaDB calls are blocking)
+#   - stop() cancels the task on shutdown
+# ============================================================================
+
+import asyncio
+import logging
+
+from app.core.config import settings
+from app.core.redis import redis_client
+from app.core.tracing import traced
+
+logger = logging.getLogger(__name__)
+
+COMPACTION_LOCK_KEY = "rag:compaction:lock"
+
+
+class RAGCompactor:
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+        self.last_result: dict | None = None
+
+    def start(self) -> None:
+        """Start the periodic compaction loop (no-op if disabled or running)."""
+        if settings.RAG_COMPACTION_INTERVAL_SECONDS <= 0 or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run_forever())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    @traced("rag.compact")
+    async def run_once(self) -> dict | None:
+        """Compact now if no other worker holds the lock. Returns the stats or None."""
+        interval = settings.RAG_COMPACTION_INTERVAL_SECONDS
+        try:
+            # Lock expires just before the next interval so a crashed worker can't wedge it
+            acquired = redis_client.set(COMPACTION_LOCK_KEY, "1", nx=True, ex=max(1, interval - 1))
+        except Exception as e:
+            logger.warning(f"Compaction lock unavailable, compacting locally: {e}")
+            acquired = True
+
+        if not acquired:
+            return None
+
+        from app.services.rag_service import rag_service
+
+        self.last_result = await asyncio.to_thread(rag_service.compact)
+        if self.last_result["deleted"]:
+            logger.info(f"RAG compaction removed {self.last_result['deleted']} analyses: {self.last_result}")
+        return self.last_result
+
+    async def _run_forever(self) -> None:
+        while True:
+            await asyncio.sleep(settings.RAG_COMPACTION_INTERVAL_SECONDS)
+            try:
+                await self.run_once()
+            except Exception as e:
+                # Compaction is maintenance — never let it take the app down
+                logger.warning(f"RAG compaction failed (non-fatal): {e}")
+
+
+# Create global instance
+rag_compactor = RAGCompactor()
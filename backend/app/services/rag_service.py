@@ -8,9 +8,17 @@
 #   1. STORE: After each analysis, the result (summary, recommendations,
 #      scores, etc.) is converted into a text document, embedded into a
 #      vector using Google's embedding model, and stored in ChromaDB.
+#      In chunked mode every finding, recommendation and file-level
+#      summary is ALSO stored as its own vector with a back-reference
+#      (parent_id) to the analysis document.
 #
 #   2. RETRIEVE: Before a new analysis, we search ChromaDB for similar
 #      past analyses (same repo, similar code patterns, similar issues).
+#      Chunk hits are de-duplicated to their parent analyses, so a single
+#      matching finding surfaces the whole past review.
+#      Hybrid mode also runs a local BM25 index (file paths, rule IDs,
+#      commit messages) and fuses both rankings with Reciprocal Rank
+#      Fusion. Confident lexical matches skip the embedding call entirely.
 #
 #   3. AUGMENT: The retrieved past reviews are injected into the Gemini
 #      prompt as extra context, so the AI can reference trends, recurring
@@ -18,54 +26,121 @@
 #
 # Components:
 #   - ChromaDB: Lightweight vector database (persistent, file-based)
+#     ├── code_analyses        → one document per analysis
+#     └── code_analysis_chunks → one document per finding / rec / file
 #   - Google Embeddings: gemini-embedding-001 model for vector generation
+#   - LexicalIndex: in-process BM25 index, re-synced from ChromaDB when
+#     the shared rag:index_version has moved
 #   - Retrieval: Semantic search with optional repo-based filtering
+#   - Compact mode (RAG_VECTOR_DIMENSIONS): truncated vectors in the HNSW
+#     index + int8/float16 full vectors in metadata for an exact rerank
+#     (see vector_codec.py; benchmark in backend/benchmarks/). Each width +
+#     codec has its own collections (code_analyses_d{N}_{codec}) and each
+#     payload records its codec (full_vector_codec); on the first start
+#     with a new layout the stored vectors are copied over from the
+#     previous one (re-truncated / re-encoded, not re-embedded). Going back
+#     to full width from compact mode restores the decoded vectors.
 #
 # Key methods:
 #   - store_analysis()       → Store a completed analysis in vector DB
-#   - search_similar()       → Find similar past analyses
+#   - search_similar()       → Find similar past analyses (chunk-level,
+#                              de-duplicated to parent analyses)
 #   - get_rag_context()      → Build RAG context string for prompts
+#                              (cached in Redis per repository index
+#                              version — bumped by writes to that
+#                              repository; cross-repo contexts use the
+#                              global version, bumped by every write)
 #   - get_knowledge_base_info() → Get overview of stored knowledge
+#   - delete_analyses()      → Remove the vectors of deleted DB analyses
+#                              (by the document id stored on the row)
+#   - compact()              → Enforce retention policies (age, per-repo
+#                              cap, latest-per-commit); run periodically by
+#                              the background RAGCompactor
 #   - clear_knowledge_base() → Clear all stored analyses
 # ============================================================================
 
+import hashlib
+import logging
+import re
+import time
 import uuid
 from pathlib import Path
 from typing import Any
 
 import chromadb
-import google.generativeai as genai
+import numpy as np
 
 from app.core.config import settings
+from app.core.redis import TTL_RAG_CONTEXT, CacheManager, redis_client
+from app.core.tracing import traced
+from app.services.lexical_index import LexicalIndex
+from app.services.llm.client import llm_client
+from app.services.vector_codec import (
+    SUPPORTED_CODECS,
+    cosine_similarity,
+    decode_vector,
+    encode_vector,
+    truncate_vector,
+)
 
 # ChromaDB persistent storage path (inside backend directory)
 CHROMA_PERSIST_DIR = str(Path(__file__).parent.parent.parent / "chroma_data")
 
+ANALYSIS_COLLECTION = "code_analyses"
+CHUNK_COLLECTION = "code_analysis_chunks"
+
+# Documents fetched / deleted per ChromaDB round-trip (keyword re-sync, compaction)
+LEXICAL_SYNC_BATCH = 500
+
+# Bumped on every write to the knowledge base; part of every RAG context cache key
+INDEX_VERSION_KEY = "rag:index_version"
+
+logger = logging.getLogger(__name__)
+
+
+def _section(data: dict[str, Any], key: str) -> dict[str, Any]:
+    """data[key] when it is a dict, else {} (partial / malformed analysis payloads)."""
+    value = data.get(key)
+    return value if isinstance(value, dict) else {}
+
+
+def _items(data: dict[str, Any], key: str) -> list[Any]:
+    """data[key] when it is a list, else []."""
+    value = data.get(key)
+    return value if isinstance(value, list) else []
+
 
 class RAGService:
     def __init__(self):
-        # Configure Google AI for embeddings
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-
         # Initialize ChromaDB with persistent storage
         self.chroma_client = chromadb.PersistentClient(path=CHROMA_PERSIST_DIR)
 
-        # Create/get the collection for storing analysis embeddings
-        self.collection = self.chroma_client.get_or_create_collection(
-            name="code_analyses",
-            metadata={"description": "Past code analysis results for RAG retrieval"}
-        )
+        # Create/get the collections for storing analysis + chunk embeddings
+        self.collection = self._get_analysis_collection()
+        self.chunk_collection = self._get_chunk_collection()
+
+        # A changed RAG_VECTOR_DIMENSIONS means new collections — carry the
+        # stored analyses over instead of starting from an empty memory
+        copied = self._copy_previous_layout(self.collection, ANALYSIS_COLLECTION)
+        copied += self._copy_previous_layout(self.chunk_collection, CHUNK_COLLECTION)
+        if copied:
+            self._bump_index_version()
+
+        # Keyword index — built lazily from ChromaDB on first search
+        self.lexical_index = LexicalIndex()
+        self._lexical_synced_version: int | None = None
 
     # ====================================================================
     # STORE — Save an analysis result into the vector database
     # ====================================================================
-    def store_analysis(self, analysis_data: dict[str, Any], repository_name: str | None = None) -> dict:
+    @traced("rag.store_analysis")
+    async def store_analysis(self, analysis_data: dict[str, Any], repository_name: str | None = None) -> dict:
         """Store a completed analysis in ChromaDB for future retrieval."""
         # Build a rich text document from the analysis
         document_text = self._build_document_text(analysis_data)
 
         # Generate embedding using Google's embedding model
-        embedding = self._generate_embedding(document_text)
+        embedding = await self._generate_embedding(document_text)
 
         # Create a unique document ID
         commit_hash = analysis_data.get("commit_hash", "unknown")
@@ -84,86 +159,243 @@ class RAGService:
             "performance_score": analysis_data.get("performance_score", 0),
             "files_changed": analysis_data.get("files_changed", 0),
             "summary": analysis_data.get("summary", "")[:500],
+            "stored_at": int(time.time()),  # used by retention policies
         }
 
-        # Store in ChromaDB
+        # Store in ChromaDB (compact mode: small ANN vector + encoded full vector)
         self.collection.add(
             documents=[document_text],
-            embeddings=[embedding],
-            metadatas=[metadata],
+            embeddings=[self._ann_vector(embedding)],
+            metadatas=[{**metadata, **self._full_vector_metadata(embedding)}],
             ids=[doc_id]
         )
 
+        # Chunked mode — one vector per finding / recommendation / file
+        chunks = []
+        if settings.RAG_CHUNKED_INDEXING:
+            chunks = await self._store_chunks(doc_id, analysis_data, metadata)
+
+        # Keep the keyword index in step (parent text + all of its chunks)
+        if settings.RAG_HYBRID_SEARCH:
+            self.lexical_index.add(
+                doc_id,
+                "\n".join([document_text, *(chunk["text"] for chunk in chunks)]),
+                metadata["repository"],
+            )
+
+        self._bump_index_version(metadata["repository"])
+
         return {
             "document_id": doc_id,
-            "total_documents": self.collection.count()
+            "total_documents": self.collection.count(),
+            "chunks_stored": len(chunks),
         }
 
     # ====================================================================
     # SEARCH — Find similar past analyses
     # ====================================================================
-    def search_similar(
+    @traced("rag.search_similar")
+    async def search_similar(
         self,
         query: str,
         repository_name: str | None = None,
-        top_k: int = 5
+        top_k: int = 5,
+        chunk_types: list[str] | None = None,
     ) -> list[dict]:
-        """Search for similar past analyses using semantic search."""
+        """Search for similar past analyses using hybrid lexical + semantic search.
+
+        In chunked mode the query is matched against individual findings,
+        recommendations and file summaries, then de-duplicated to their
+        parent analyses. Analyses stored before chunking was enabled are
+        topped up from the whole-document collection.
+
+        In hybrid mode a BM25 keyword search runs first. If its top hits
+        match the query confidently, they are returned WITHOUT an embedding
+        call; otherwise both rankings are merged with Reciprocal Rank Fusion.
+        """
         if self.collection.count() == 0:
             return []
 
+        lexical_hits = []
+        if settings.RAG_HYBRID_SEARCH:
+            self._sync_lexical_index()
+            lexical_hits = self.lexical_index.search(
+                query, top_k * settings.RAG_CHUNK_OVERSAMPLE, repository_name
+            )
+
+            # Fast path — chunk-type filters need the vector index, so skip then
+            if not chunk_types and self._is_lexical_confident(lexical_hits, top_k):
+                return self._format_lexical_results(lexical_hits[:top_k])
+
+        vector_results = await self._vector_search(query, repository_name, top_k, chunk_types)
+        if not lexical_hits or chunk_types:
+            return vector_results
+
+        return self._fuse_results(vector_results, lexical_hits, top_k)
+
+    async def _vector_search(
+        self,
+        query: str,
+        repository_name: str | None,
+        top_k: int,
+        chunk_types: list[str] | None,
+    ) -> list[dict]:
+        """Embedding search — chunk-level first, topped up from whole documents."""
         # Generate embedding for the search query
-        query_embedding = self._generate_embedding(query)
+        query_embedding = await self._generate_embedding(query)
 
-        # Build filter if repository specified
-        where_filter = None
-        if repository_name:
-            where_filter = {"repository": repository_name}
+        results = []
+        if settings.RAG_CHUNKED_INDEXING and self.chunk_collection.count() > 0:
+            results = self._search_chunks(query_embedding, repository_name, top_k, chunk_types)
 
-        # Limit top_k to actual document count
-        actual_k = min(top_k, self.collection.count())
+        # Chunk-type filters only make sense against the chunk collection
+        if len(results) < top_k and not chunk_types:
+            seen = {r["document_id"] for r in results}
+            for result in self._search_documents(query_embedding, repository_name, top_k + len(seen)):
+                if result["document_id"] not in seen:
+                    results.append(result)
+                if len(results) >= top_k:
+                    break
 
-        # Search ChromaDB
-        results = self.collection.query(
-            query_embeddings=[query_embedding],
-            n_results=actual_k,
-            where=where_filter,
-            include=["documents", "metadatas", "distances"]
+        return results[:top_k]
+
+    def _search_documents(
+        self,
+        query_embedding: list[float],
+        repository_name: str | None,
+        top_k: int,
+    ) -> list[dict]:
+        """Whole-document search over the analysis collection."""
+        hits = self._query_collection(
+            self.collection, query_embedding, top_k, self._build_where(repository_name)
+        )
+        return [self._format_result(hit["id"], hit["metadata"], hit["similarity"]) for hit in hits]
+
+    def _search_chunks(
+        self,
+        query_embedding: list[float],
+        repository_name: str | None,
+        top_k: int,
+        chunk_types: list[str] | None,
+    ) -> list[dict]:
+        """Chunk-level search, de-duplicated to parent analyses (best chunk wins)."""
+        hits = self._query_collection(
+            self.chunk_collection,
+            query_embedding,
+            top_k * settings.RAG_CHUNK_OVERSAMPLE,
+            self._build_where(repository_name, chunk_types),
         )
 
-        # Format results
+        # Group chunk hits by parent, preserving best-first order
+        parents: dict[str, list[dict]] = {}
+        for hit in hits:
+            parent_id = hit["metadata"].get("parent_id")
+            if not parent_id or (parent_id not in parents and len(parents) >= top_k):
+                continue
+            parents.setdefault(parent_id, []).append({
+                "chunk_type": hit["metadata"].get("chunk_type", "unknown"),
+                "text": hit["document"],
+                "file": hit["metadata"].get("file") or None,
+                "similarity_score": hit["similarity"],
+            })
+
+        if not parents:
+            return []
+
+        parent_ids = list(parents)
+        parent_data = self.collection.get(ids=parent_ids, include=["metadatas"])
+        parent_meta = dict(zip(parent_data["ids"], parent_data["metadatas"] or [], strict=False))
+
         formatted_results = []
-        if results and results["ids"] and results["ids"][0]:
-            for i, doc_id in enumerate(results["ids"][0]):
-                metadata = results["metadatas"][0][i] if results["metadatas"] else {}
-                distance = results["distances"][0][i] if results["distances"] else 0
-
-                # Convert distance to similarity score (ChromaDB returns L2 distance)
-                similarity = max(0, 1 - (distance / 2))
-
-                formatted_results.append({
-                    "document_id": doc_id,
-                    "summary": metadata.get("summary", "No summary"),
-                    "risk_level": metadata.get("risk_level", "unknown"),
-                    "overall_score": metadata.get("overall_score"),
-                    "commit_hash": metadata.get("commit_hash"),
-                    "repository": metadata.get("repository"),
-                    "similarity_score": round(similarity, 3),
-                    "metadata": metadata,
-                })
+        for parent_id in parent_ids:
+            # Chunk whose parent was removed — skip rather than return an orphan
+            if parent_id not in parent_meta:
+                continue
+            matched = parents[parent_id]
+            result = self._format_result(parent_id, parent_meta[parent_id], matched[0]["similarity_score"])
+            result["matched_chunks"] = matched[:3]
+            formatted_results.append(result)
 
         return formatted_results
 
+    def _query_collection(
+        self,
+        collection,
+        query_embedding: list[float],
+        n_results: int,
+        where: dict | None,
+    ) -> list[dict]:
+        """Nearest-neighbour query; in compact mode over-fetch then rerank on full vectors.
+
+        Returns hits as {id, document, metadata, similarity}, best first.
+        """
+        rerank = settings.RAG_VECTOR_DIMENSIONS is not None
+        fetch_k = n_results * settings.RAG_RERANK_OVERSAMPLE if rerank else n_results
+
+        # Limit to actual document count
+        fetch_k = min(fetch_k, collection.count())
+        if fetch_k == 0:
+            return []
+
+        results = collection.query(
+            query_embeddings=[self._ann_vector(query_embedding)],
+            n_results=fetch_k,
+            where=where,
+            include=["documents", "metadatas", "distances"]
+        )
+        if not results or not results["ids"] or not results["ids"][0]:
+            return []
+
+        hits = []
+        for i, doc_id in enumerate(results["ids"][0]):
+            hits.append({
+                "id": doc_id,
+                "document": results["documents"][0][i] if results["documents"] else "",
+                "metadata": results["metadatas"][0][i] if results["metadatas"] else {},
+                "similarity": self._distance_to_similarity(results["distances"][0][i] if results["distances"] else 0),
+            })
+
+        if rerank:
+            full_query = np.asarray(query_embedding, dtype=np.float32)
+            for hit in hits:
+                full_vector = self._decode_full_vector(hit["metadata"])
+                if full_vector is not None:
+                    hit["similarity"] = round(max(0.0, cosine_similarity(full_query, full_vector)), 3)
+            hits.sort(key=lambda hit: hit["similarity"], reverse=True)
+
+        return hits[:n_results]
+
     # ====================================================================
     # GET RAG CONTEXT — Build context string for Gemini prompts
     # ====================================================================
-    def get_rag_context(
+    async def get_rag_context(
         self,
         current_analysis_text: str,
         repository_name: str | None = None,
         top_k: int = 3
     ) -> dict:
-        """Retrieve relevant past analyses and build RAG context for prompts."""
+        """Retrieve relevant past analyses and build RAG context for prompts.
+
+        Results are cached for TTL_RAG_CONTEXT keyed by (query hash,
+        repository, top_k, index version): the same commit reviewed through
+        several endpoints skips the embedding call and vector query. A write
+        to the repository (to any repository, for a cross-repository query)
+        makes older entries unreachable.
+        """
+        cache_key = self._context_cache_key(current_analysis_text, repository_name, top_k)
+        if cache_key:
+            cached = CacheManager.get_json(cache_key)
+            if cached is not None:
+                return cached
+
+        result = await self._build_rag_context(current_analysis_text, repository_name, top_k)
+
+        # Only cache real retrievals — an empty KB is cheap to detect again
+        if cache_key and result["sources_used"]:
+            CacheManager.set_json(cache_key, result, expire=TTL_RAG_CONTEXT)
+        return result
+
+    async def _build_rag_context(self, current_analysis_text: str, repository_name: str | None, top_k: int) -> dict:
         if self.collection.count() == 0:
             return {
                 "context": "",
@@ -172,7 +404,7 @@ class RAGService:
             }
 
         # Search for relevant past analyses
-        similar = self.search_similar(
+        similar = await self.search_similar(
             query=current_analysis_text,
             repository_name=repository_name,
             top_k=top_k
@@ -200,6 +432,8 @@ class RAGService:
                                  f"security={meta.get('security_score', 'N/A')}, "
                                  f"performance={meta.get('performance_score', 'N/A')}")
             context_parts.append(f"Summary: {meta.get('summary', 'N/A')}")
+            for chunk in result.get("matched_chunks", []):
+                context_parts.append(f"Matched {chunk['chunk_type']}: {chunk['text'][:300]}")
             context_parts.append("")
 
         context_parts.append("--- END OF PAST REVIEWS ---")
@@ -231,26 +465,555 @@ class RAGService:
 
         return {
             "total_documents": total,
+            "total_chunks": self.chunk_collection.count(),
             "repositories": sorted(repositories),
             "message": f"Knowledge base contains {total} analyses from {len(repositories)} repositories."
         }
 
     def clear_knowledge_base(self) -> dict:
-        """Clear all stored analyses from the knowledge base."""
-        self.chroma_client.delete_collection("code_analyses")
-        self.collection = self.chroma_client.get_or_create_collection(
-            name="code_analyses",
-            metadata={"description": "Past code analysis results for RAG retrieval"}
-        )
+        """Clear all stored analyses from the knowledge base (every vector layout)."""
+        for name in self._layout_names(ANALYSIS_COLLECTION) + self._layout_names(CHUNK_COLLECTION):
+            self.chroma_client.delete_collection(name)
+        self.collection = self._get_analysis_collection()
+        self.chunk_collection = self._get_chunk_collection()
+        self.lexical_index.clear()
+        self._bump_index_version()
+        # Per-repository versions can't all be bumped — drop the cached contexts
+        CacheManager.delete_pattern("rag:context:*")
 
         return {
             "message": "Knowledge base cleared successfully.",
             "total_documents": 0
         }
 
+    # ====================================================================
+    # DELETION + RETENTION — Keep the index bounded
+    # ====================================================================
+    def delete_analyses(self, document_ids: list[str]) -> int:
+        """Remove stored analyses (and their chunks) by document id.
+
+        Called when Analysis rows are deleted from the database; each row
+        records the id store_analysis() returned (Analysis.rag_document_id).
+        """
+        if not document_ids:
+            return 0
+        doc_ids = self.collection.get(ids=list(document_ids), include=[])["ids"]
+        self._delete_documents(doc_ids)
+        return len(doc_ids)
+
+    def delete_legacy_analyses(self, commit_hashes: list[str], repository_name: str | None) -> int:
+        """Remove the analyses of rows stored before rag_document_id was recorded.
+
+        Matches commit hash AND the exact repository name, so analyses of
+        the same commit stored for another repository (or none) are kept.
+        """
+        if not commit_hashes or not repository_name:
+            return 0
+        where = {"$and": [{"commit_hash": {"$in": list(commit_hashes)}}, {"repository": repository_name}]}
+        doc_ids = self.collection.get(where=where, include=[])["ids"]
+        self._delete_documents(doc_ids)
+        return len(doc_ids)
+
+    def compact(self) -> dict:
+        """Apply the retention policies and delete everything they exclude.
+
+        Policies (each can be disabled in settings):
+          - max age:              drop analyses older than N days
+          - keep latest per commit: re-analyses of a commit replace older ones
+          - max docs per repository: keep only the newest N per repository
+        """
+        now = int(time.time())
+
+        # Paged: in compact mode metadata carries the encoded full vector, so
+        # only the four fields the policies need are kept per document
+        documents = []
+        for offset in range(0, self.collection.count(), LEXICAL_SYNC_BATCH):
+            page = self.collection.get(limit=LEXICAL_SYNC_BATCH, offset=offset, include=["metadatas"])
+            if not page["ids"]:
+                break
+            # Documents stored before retention existed get an age starting now
+            undated = [doc_id for doc_id, meta in zip(page["ids"], page["metadatas"], strict=True)
+                       if "stored_at" not in meta]
+            if undated:
+                self.collection.update(ids=undated, metadatas=[{"stored_at": now}] * len(undated))
+            documents += [
+                (doc_id, meta.get("repository", "unknown"), meta.get("commit_hash", "unknown"), meta.get("stored_at", now))
+                for doc_id, meta in zip(page["ids"], page["metadatas"], strict=True)
+            ]
+        # Newest first, so "keep the first N" means "keep the newest N"
+        documents.sort(key=lambda doc: doc[3], reverse=True)
+
+        expired, superseded, over_cap = set(), set(), set()
+
+        if settings.RAG_RETENTION_MAX_AGE_DAYS:
+            cutoff = now - settings.RAG_RETENTION_MAX_AGE_DAYS * 86400
+            expired = {doc_id for doc_id, _, _, stored_at in documents if stored_at < cutoff}
+
+        if settings.RAG_RETENTION_KEEP_LATEST_PER_COMMIT:
+            seen_commits = set()
+            for doc_id, repository, commit_hash, _ in documents:
+                if commit_hash == "unknown":
+                    continue
+                if (repository, commit_hash) in seen_commits:
+                    superseded.add(doc_id)
+                seen_commits.add((repository, commit_hash))
+
+        if settings.RAG_RETENTION_MAX_DOCS_PER_REPO:
+            kept_per_repo: dict[str, int] = {}
+            for doc_id, repository, _, _ in documents:
+                if doc_id in expired or doc_id in superseded:
+                    continue
+                kept_per_repo[repository] = kept_per_repo.get(repository, 0) + 1
+                if kept_per_repo[repository] > settings.RAG_RETENTION_MAX_DOCS_PER_REPO:
+                    over_cap.add(doc_id)
+
+        self._delete_documents(list(expired | superseded | over_cap))
+
+        return {
+            "expired": len(expired),
+            "superseded": len(superseded),
+            "over_repository_cap": len(over_cap - expired - superseded),
+            "deleted": len(expired | superseded | over_cap),
+            "total_documents": self.collection.count(),
+            "total_chunks": self.chunk_collection.count(),
+        }
+
+    def _delete_documents(self, doc_ids: list[str]) -> None:
+        """Delete analysis documents together with their chunks and keyword entries."""
+        if not doc_ids:
+            return
+
+        repositories = set()
+        for start in range(0, len(doc_ids), LEXICAL_SYNC_BATCH):
+            batch = doc_ids[start:start + LEXICAL_SYNC_BATCH]
+            stored = self.collection.get(ids=batch, include=["metadatas"])
+            repositories.update(meta.get("repository", "unknown") for meta in stored["metadatas"] or [])
+            self.chunk_collection.delete(where={"parent_id": {"$in": batch}})
+            self.collection.delete(ids=batch)
+            for doc_id in batch:
+                self.lexical_index.remove(doc_id)
+
+        self._bump_index_version(*repositories)
+
+    # ====================================================================
+    # CONTEXT CACHE — Index version + cache keys
+    # ====================================================================
+    def _index_version(self, repository_name: str | None = None) -> int | None:
+        """Knowledge-base version (of one repository, or of the whole KB), None without Redis.
+
+        The global version moves on every write (keyword-index sync and
+        cross-repository contexts); a repository's version only when that
+        repository's analyses change, so its cached contexts survive writes
+        elsewhere.
+        """
+        key = INDEX_VERSION_KEY if repository_name is None else f"{INDEX_VERSION_KEY}:{repository_name}"
+        try:
+            return int(redis_client.get(key) or 0)
+        except Exception as e:
+            logger.warning(f"RAG index version unavailable, skipping context cache: {e}")
+            return None
+
+    def _bump_index_version(self, *repositories: str) -> None:
+        """Bump the global version and those of the repositories that changed."""
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.incr(INDEX_VERSION_KEY)
+            for repository in repositories:
+                pipe.incr(f"{INDEX_VERSION_KEY}:{repository}")
+            pipe.execute()
+        except Exception as e:
+            # Entries keyed on the old version still expire within TTL_RAG_CONTEXT
+            logger.warning(f"RAG index version bump failed: {e}")
+
+    def _context_cache_key(self, query: str, repository_name: str | None, top_k: int) -> str | None:
+        version = self._index_version(repository_name)
+        if version is None:
+            return None
+        query_hash = hashlib.sha256(query.encode("utf-8")).hexdigest()[:32]
+        return f"rag:context:v{version}:{repository_name or '*'}:{top_k}:{query_hash}"
+
+    # ====================================================================
+    # CHUNKED INDEXING — One vector per finding / recommendation / file
+    # ====================================================================
+    async def _store_chunks(self, parent_id: str, analysis_data: dict[str, Any], parent_metadata: dict) -> list[dict[str, Any]]:
+        """Embed and store the chunks of an analysis, linked back to parent_id."""
+        chunks = self._build_chunks(analysis_data)[:settings.RAG_MAX_CHUNKS_PER_ANALYSIS]
+        if not chunks:
+            return []
+
+        embeddings = await self._generate_embeddings([chunk["text"] for chunk in chunks])
+
+        metadatas = []
+        for chunk, embedding in zip(chunks, embeddings, strict=True):
+            metadatas.append({
+                **self._full_vector_metadata(embedding),
+                "parent_id": parent_id,
+                "chunk_type": chunk["chunk_type"],
+                "file": chunk.get("file", ""),
+                "severity": chunk.get("severity", ""),
+                "repository": parent_metadata["repository"],
+                "commit_hash": parent_metadata["commit_hash"],
+                "risk_level": parent_metadata["risk_level"],
+                "stored_at": parent_metadata["stored_at"],
+            })
+
+        self.chunk_collection.add(
+            documents=[chunk["text"] for chunk in chunks],
+            embeddings=[self._ann_vector(embedding) for embedding in embeddings],
+            metadatas=metadatas,
+            ids=[f"{parent_id}:chunk:{i}" for i in range(len(chunks))],
+        )
+        return chunks
+
+    def _build_chunks(self, analysis_data: dict[str, Any]) -> list[dict[str, Any]]:
+        """Split an analysis into retrievable chunks (findings, recommendations, files)."""
+        chunks = []
+
+        # Findings — AI security concerns + specialist agent findings
+        for concern in _items(analysis_data, "security_concerns"):
+            text = concern.get("description", str(concern)) if isinstance(concern, dict) else str(concern)
+            chunks.append({"chunk_type": "finding", "text": f"Security concern: {text}"})
+
+        agent_reports = _section(analysis_data, "agent_reports")
+        for vuln in _items(_section(agent_reports, "security"), "vulnerabilities"):
+            if not isinstance(vuln, dict):
+                continue
+            chunks.append({
+                "chunk_type": "finding",
+                "text": f"{vuln.get('type', 'Vulnerability')} in {vuln.get('file', 'unknown')}: {vuln.get('description', '')}",
+                "file": vuln.get("file", ""),
+                "severity": vuln.get("severity", ""),
+            })
+        for issue in _items(_section(agent_reports, "performance"), "issues"):
+            if isinstance(issue, dict):
+                chunks.append({
+                    "chunk_type": "finding",
+                    "text": f"Performance issue in {issue.get('file', 'unknown')}: {issue.get('description', str(issue))}",
+                    "file": issue.get("file", ""),
+                    "severity": issue.get("severity", ""),
+                })
+        for anti in _items(_section(agent_reports, "architecture"), "anti_patterns_found"):
+            if isinstance(anti, dict):
+                chunks.append({
+                    "chunk_type": "finding",
+                    "text": f"{anti.get('pattern', 'Anti-pattern')} in {anti.get('file', 'unknown')}: {anti.get('description', '')}",
+                    "file": anti.get("file", ""),
+                })
+
+        # Recommendations — all of them, not truncated like the parent document
+        for rec in _items(analysis_data, "recommendations"):
+            if isinstance(rec, dict):
+                chunks.append({
+                    "chunk_type": "recommendation",
+                    "text": f"Recommendation ({rec.get('issue_type', 'quality')}): {rec.get('description', str(rec))}",
+                    "severity": rec.get("severity", ""),
+                })
+            else:
+                chunks.append({"chunk_type": "recommendation", "text": f"Recommendation: {rec}"})
+
+        # File-level summaries — AST metrics + static scanner hits per file
+        static_hits: dict[str, list[str]] = {}
+        # Client-supplied payloads (POST /analysis/rag/store) may be partial
+        for scan in _items(_section(analysis_data, "security_analysis"), "file_scans"):
+            if not isinstance(scan, dict) or not scan.get("filename"):
+                continue
+            for severity, issues in (scan.get("security_issues") or {}).items():
+                for issue in issues or []:
+                    if isinstance(issue, dict) and issue.get("description"):
+                        static_hits.setdefault(scan["filename"], []).append(f"{severity}: {issue['description']}")
+        for issue in _items(_section(analysis_data, "performance_analysis"), "performance_issues"):
+            if isinstance(issue, dict) and issue.get("file") and issue.get("description"):
+                static_hits.setdefault(issue["file"], []).append(f"performance: {issue['description']}")
+
+        for ast in _items(_section(analysis_data, "ast_analysis"), "complexity_summary"):
+            if not isinstance(ast, dict):
+                continue
+            filename = ast.get("filename")
+            if not filename or ast.get("error"):
+                continue
+            parts = [
+                f"File: {filename} ({ast.get('language', 'unknown')})",
+                f"{ast.get('functions', 0)} functions, {ast.get('classes', 0)} classes, complexity={ast.get('complexity_score', 0)}",
+            ]
+            if ast.get("security_patterns"):
+                parts.append(f"Security flags: {', '.join(ast['security_patterns'])}")
+            if ast.get("code_quality_issues"):
+                parts.append(f"Quality issues: {', '.join(ast['code_quality_issues'])}")
+            if static_hits.get(filename):
+                parts.append(f"Static findings: {'; '.join(static_hits[filename])}")
+            chunks.append({"chunk_type": "file_summary", "text": "\n".join(parts), "file": filename})
+
+        return chunks
+
+    # ====================================================================
+    # HYBRID RETRIEVAL — BM25 keyword index fused with vector results
+    # ====================================================================
+    def _sync_lexical_index(self) -> None:
+        """Bring the in-process keyword index in line with ChromaDB.
+
+        Other workers write to the same persistent collection, so the index
+        is re-synced (incrementally) whenever the shared knowledge-base
+        version has moved since the last sync — every store, delete and
+        compaction bumps it. Without Redis, fall back to comparing counts.
+        """
+        version = self._index_version()
+        if version is None:
+            if len(self.lexical_index) == self.collection.count():
+                return
+        elif version == self._lexical_synced_version:
+            return
+
+        stored_ids = set(self.collection.get(include=[])["ids"])
+        indexed_ids = self.lexical_index.doc_ids()
+
+        for stale_id in indexed_ids - stored_ids:
+            self.lexical_index.remove(stale_id)
+
+        missing_ids = list(stored_ids - indexed_ids)
+        for start in range(0, len(missing_ids), LEXICAL_SYNC_BATCH):
+            batch = missing_ids[start:start + LEXICAL_SYNC_BATCH]
+            parents = self.collection.get(ids=batch, include=["documents", "metadatas"])
+
+            chunk_texts: dict[str, list[str]] = {}
+            if self.chunk_collection.count() > 0:
+                chunks = self.chunk_collection.get(
+                    where={"parent_id": {"$in": batch}}, include=["documents", "metadatas"]
+                )
+                for text, meta in zip(chunks["documents"] or [], chunks["metadatas"] or [], strict=False):
+                    chunk_texts.setdefault(meta.get("parent_id"), []).append(text)
+
+            for doc_id, text, meta in zip(parents["ids"], parents["documents"] or [], parents["metadatas"] or [], strict=False):
+                self.lexical_index.add(
+                    doc_id,
+                    "\n".join([text or "", *chunk_texts.get(doc_id, [])]),
+                    meta.get("repository"),
+                )
+
+        # Version read BEFORE the diff: a write racing the sync bumps it again
+        self._lexical_synced_version = version
+
+    def _is_lexical_confident(self, lexical_hits: list[tuple[str, float, float]], top_k: int) -> bool:
+        """True when the keyword hits alone answer the query well enough."""
+        wanted = min(top_k, len(self.lexical_index))
+        if wanted == 0 or len(lexical_hits) < wanted:
+            return False
+        return all(confidence >= settings.RAG_LEXICAL_FASTPATH_CONFIDENCE for _, _, confidence in lexical_hits[:wanted])
+
+    def _format_lexical_results(self, lexical_hits: list[tuple[str, float, float]]) -> list[dict]:
+        """Turn BM25 hits into search results (similarity = keyword confidence)."""
+        if not lexical_hits:
+            return []
+
+        parent_data = self.collection.get(ids=[doc_id for doc_id, _, _ in lexical_hits], include=["metadatas"])
+        parent_meta = dict(zip(parent_data["ids"], parent_data["metadatas"] or [], strict=False))
+
+        results = []
+        for doc_id, _, confidence in lexical_hits:
+            if doc_id not in parent_meta:
+                continue
+            result = self._format_result(doc_id, parent_meta[doc_id], confidence)
+            result["retrieval"] = "lexical"
+            results.append(result)
+        return results
+
+    def _fuse_results(
+        self,
+        vector_results: list[dict],
+        lexical_hits: list[tuple[str, float, float]],
+        top_k: int,
+    ) -> list[dict]:
+        """Merge vector + keyword rankings with Reciprocal Rank Fusion."""
+        rrf_k = settings.RAG_RRF_K
+        fused_scores: dict[str, float] = {}
+        by_id = {r["document_id"]: r for r in vector_results}
+
+        for rank, result in enumerate(vector_results):
+            fused_scores[result["document_id"]] = 1 / (rrf_k + rank + 1)
+
+        lexical_only = []
+        for rank, hit in enumerate(lexical_hits):
+            doc_id = hit[0]
+            fused_scores[doc_id] = fused_scores.get(doc_id, 0.0) + 1 / (rrf_k + rank + 1)
+            if doc_id in by_id:
+                by_id[doc_id]["retrieval"] = "hybrid"
+            else:
+                lexical_only.append(hit)
+
+        ranked_ids = sorted(fused_scores, key=fused_scores.get, reverse=True)[:top_k]
+
+        # Lexical-only hits that made the cut still need their metadata
+        needed = [hit for hit in lexical_only if hit[0] in ranked_ids]
+        for result in self._format_lexical_results(needed):
+            by_id[result["document_id"]] = result
+
+        return [by_id[doc_id] for doc_id in ranked_ids if doc_id in by_id]
+
     # ====================================================================
     # INTERNAL HELPERS
     # ====================================================================
+    def _get_analysis_collection(self):
+        return self.chroma_client.get_or_create_collection(
+            name=self._collection_name(ANALYSIS_COLLECTION),
+            metadata={
+                "description": "Past code analysis results for RAG retrieval",
+                **self._hnsw_metadata(),
+            }
+        )
+
+    def _get_chunk_collection(self):
+        return self.chroma_client.get_or_create_collection(
+            name=self._collection_name(CHUNK_COLLECTION),
+            metadata={
+                "description": "Findings, recommendations and file summaries of past analyses",
+                **self._hnsw_metadata(),
+            }
+        )
+
+    def _collection_name(self, base: str) -> str:
+        """Compact-mode vectors have another width and payload codec → their own collections."""
+        if settings.RAG_VECTOR_DIMENSIONS is None:
+            return base
+        return f"{base}_d{settings.RAG_VECTOR_DIMENSIONS}_{settings.RAG_VECTOR_QUANTIZATION}"
+
+    def _layout_names(self, base: str) -> list[str]:
+        """Existing collections of `base` in any vector layout (full width, _d{N}[_{codec}])."""
+        names = [str(name) for name in self.chroma_client.list_collections()]
+        return [name for name in names if name == base or re.fullmatch(rf"{base}_d\d+(_\w+)?", name)]
+
+    def _copy_previous_layout(self, target, base: str) -> int:
+        """Fill a new, empty collection from one written under another RAG_VECTOR_DIMENSIONS.
+
+        No re-embedding: the full vector is read back (the stored embedding
+        of a full-width collection, or the full_vector metadata of a compact
+        one) and re-truncated / re-encoded for the current layout. The old
+        collection is left in place so the setting can be rolled back.
+        Upserts keep concurrent copies by several workers idempotent.
+        """
+        if target.count() > 0:
+            return 0
+
+        sources = [self.chroma_client.get_collection(name) for name in self._layout_names(base) if name != target.name]
+        # Prefer the full-width collection (exact vectors), then the largest
+        sources = sorted((c for c in sources if c.count() > 0), key=lambda c: (c.name != base, -c.count()))
+        if not sources:
+            return 0
+        source = sources[0]
+
+        logger.info(f"RAG vector layout changed: copying {source.count()} documents {source.name} → {target.name}")
+        copied = 0
+        for offset in range(0, source.count(), LEXICAL_SYNC_BATCH):
+            page = source.get(
+                limit=LEXICAL_SYNC_BATCH, offset=offset, include=["embeddings", "documents", "metadatas"]
+            )
+            if not page["ids"]:
+                break
+            embeddings, metadatas = [], []
+            for embedding, metadata in zip(page["embeddings"], page["metadatas"], strict=True):
+                metadata = dict(metadata or {})
+                full_vector = self._decode_full_vector(metadata, embedding)
+                metadata.pop("full_vector", None)
+                metadata.pop("full_vector_codec", None)
+                full = (full_vector if full_vector is not None else np.asarray(embedding, dtype=np.float32)).tolist()
+                embeddings.append(self._ann_vector(full))
+                metadatas.append({**metadata, **self._full_vector_metadata(full)})
+            target.upsert(ids=page["ids"], documents=page["documents"], embeddings=embeddings, metadatas=metadatas)
+            copied += len(page["ids"])
+        return copied
+
+    def _hnsw_metadata(self) -> dict:
+        """HNSW index parameters — applied when a collection is first created."""
+        return {
+            "hnsw:space": settings.RAG_HNSW_SPACE,
+            "hnsw:M": settings.RAG_HNSW_M,
+            "hnsw:construction_ef": settings.RAG_HNSW_CONSTRUCTION_EF,
+            "hnsw:search_ef": settings.RAG_HNSW_SEARCH_EF,
+        }
+
+    def _ann_vector(self, embedding: list[float]) -> list[float]:
+        """The vector that goes into the HNSW index (truncated in compact mode)."""
+        if settings.RAG_VECTOR_DIMENSIONS is None:
+            return embedding
+        return truncate_vector(embedding, settings.RAG_VECTOR_DIMENSIONS)
+
+    def _full_vector_metadata(self, embedding: list[float]) -> dict:
+        """In compact mode, keep the full vector (int8/float16 encoded) for reranking."""
+        if settings.RAG_VECTOR_DIMENSIONS is None:
+            return {}
+        return {
+            "full_vector": encode_vector(embedding, settings.RAG_VECTOR_QUANTIZATION),
+            "full_vector_codec": settings.RAG_VECTOR_QUANTIZATION,
+        }
+
+    def _decode_full_vector(self, metadata: dict, indexed: Any = None) -> np.ndarray | None:
+        """The full vector of a compact-mode payload, decoded with the codec it was written with.
+
+        Payloads from before the codec was recorded (collections named
+        _d{N} only) are decoded with the codec whose leading dims match the
+        indexed vector `indexed`, else with the configured one.
+        """
+        encoded = metadata.get("full_vector")
+        if not encoded:
+            return None
+        codec = metadata.get("full_vector_codec")
+        if codec:
+            return decode_vector(encoded, codec)
+        if indexed is None:
+            return decode_vector(encoded, settings.RAG_VECTOR_QUANTIZATION)
+
+        indexed = np.asarray(indexed, dtype=np.float32)
+        best, best_match = None, -1.0
+        for candidate in SUPPORTED_CODECS:
+            try:
+                full_vector = decode_vector(encoded, candidate)
+            except ValueError:
+                continue
+            if len(full_vector) < len(indexed) or not np.all(np.isfinite(full_vector)):
+                continue
+            match = cosine_similarity(np.asarray(truncate_vector(full_vector, len(indexed))), indexed)
+            if match > best_match:
+                best, best_match = full_vector, match
+        return best
+
+    def _build_where(self, repository_name: str | None, chunk_types: list[str] | None = None) -> dict | None:
+        """Build a ChromaDB where-filter (multiple conditions must be wrapped in $and)."""
+        conditions = []
+        if repository_name:
+            conditions.append({"repository": repository_name})
+        if chunk_types:
+            conditions.append({"chunk_type": {"$in": chunk_types}})
+
+        if not conditions:
+            return None
+        if len(conditions) == 1:
+            return conditions[0]
+        return {"$and": conditions}
+
+    def _distance_to_similarity(self, distance: float) -> float:
+        """Convert a ChromaDB distance to a 0-1 similarity score.
+
+        Embeddings are unit-length, so squared L2 distance is 2 - 2·cos and
+        cosine / inner-product distances are 1 - cos.
+        """
+        if settings.RAG_HNSW_SPACE == "l2":
+            return round(max(0, 1 - (distance / 2)), 3)
+        return round(max(0, 1 - distance), 3)
+
+    def _format_result(self, doc_id: str, metadata: dict, similarity: float) -> dict:
+        # The encoded full vector is storage, not something to hand back to callers
+        metadata = {k: v for k, v in metadata.items() if k not in ("full_vector", "full_vector_codec")}
+        return {
+            "document_id": doc_id,
+            "summary": metadata.get("summary", "No summary"),
+            "risk_level": metadata.get("risk_level", "unknown"),
+            "overall_score": metadata.get("overall_score"),
+            "commit_hash": metadata.get("commit_hash"),
+            "repository": metadata.get("repository"),
+            "similarity_score": similarity,
+            "metadata": metadata,
+            "matched_chunks": [],
+            "retrieval": "vector",
+        }
+
     def _build_document_text(self, analysis_data: dict[str, Any]) -> str:
         """Build a rich text document from analysis data for embedding."""
         parts = []
@@ -276,7 +1039,7 @@ class RAGService:
             parts.append(f"Scores: {', '.join(scores)}")
 
         # Recommendations — items can be str or dict with a 'description' key
-        recs = analysis_data.get("recommendations", [])
+        recs = _items(analysis_data, "recommendations")
         if recs:
             rec_texts = []
             for r in recs[:5]:
@@ -287,7 +1050,7 @@ class RAGService:
             parts.append(f"Recommendations: {'; '.join(rec_texts)}")
 
         # Security concerns — same dict/str handling
-        concerns = analysis_data.get("security_concerns", [])
+        concerns = _items(analysis_data, "security_concerns")
         if concerns:
             concern_texts = []
             for c in concerns[:5]:
@@ -298,23 +1061,39 @@ class RAGService:
             parts.append(f"Security concerns: {'; '.join(concern_texts)}")
 
         # Impact areas
-        impacts = analysis_data.get("impact_areas", [])
+        impacts = _items(analysis_data, "impact_areas")
         if impacts:
-            parts.append(f"Impact areas: {', '.join(impacts)}")
+            parts.append(f"Impact areas: {', '.join(map(str, impacts))}")
 
         # Code quality
         if analysis_data.get("code_quality_assessment"):
-            parts.append(f"Code quality: {analysis_data['code_quality_assessment'][:300]}")
+            parts.append(f"Code quality: {str(analysis_data['code_quality_assessment'])[:300]}")
+
+        # Exact-match terms for the keyword index — file paths and rule IDs.
+        # LLM output and client payloads may carry None / strings anywhere here
+        ast_analysis = _section(analysis_data, "ast_analysis")
+        file_entries = _items(ast_analysis, "complexity_summary")
+        file_entries += _items(_section(analysis_data, "security_analysis"), "file_scans")
+        files = {entry.get("filename") for entry in file_entries if isinstance(entry, dict)}
+        files = {name for name in files if isinstance(name, str) and name}
+        if files:
+            parts.append(f"Files: {' '.join(sorted(files))}")
+
+        security_report = _section(_section(analysis_data, "agent_reports"), "security")
+        rules = _items(security_report, "owasp_categories") + _items(ast_analysis, "security_patterns_found")
+        rules = {rule for rule in rules if isinstance(rule, str) and rule}
+        if rules:
+            parts.append(f"Rules: {'; '.join(sorted(rules))}")
 
         return "\n".join(parts) if parts else "No analysis data available"
 
-    def _generate_embedding(self, text: str) -> list[float]:
+    async def _generate_embedding(self, text: str) -> list[float]:
         """Generate a vector embedding using Google's embedding model."""
-        result = genai.embed_content(
-            model="models/gemini-embedding-001",
-            content=text,
-        )
-        return result['embedding']
+        return await llm_client.embed(text, caller="rag_service")
+
+    async def _generate_embeddings(self, texts: list[str]) -> list[list[float]]:
+        """Generate embeddings for several texts in a single batched API call."""
+        return await llm_client.embed(texts, caller="rag_service")
 
 
 # Create global instance
@@ -0,0 +1,71 @@
+# ============================================================================
+# SERVICES/VECTOR_CODEC.PY — Reduced-Dimension + Quantized Embedding Helpers
+# ============================================================================
+# gemini-embedding-001 returns 3072-dim float vectors. Storing and searching
+# those at full width makes the ChromaDB HNSW index grow ~12 KB per vector.
+#
+# Compact storage mode (RAG_VECTOR_DIMENSIONS) works in two tiers:
+#   1. ANN tier:    the first N dims of each vector (Matryoshka-style
+#                   truncation, re-normalized) go into the HNSW index
+#   2. Rerank tier: the FULL vector is kept in document metadata, encoded
+#                   as int8 (1 byte/dim + a float32 scale) or float16
+#
+# Queries over-fetch candidates from the small index, then rerank them by
+# exact cosine similarity against the full query vector.
+#
+# Helpers:
+#   - truncate_vector()   → First N dims, L2-normalized
+#   - encode_vector()     → Full vector → compact base64 string
+#   - decode_vector()     → base64 string → numpy float32 array
+#   - cosine_similarity() → Exact cosine between two vectors
+# ============================================================================
+
+import base64
+
+import numpy as np
+
+SUPPORTED_CODECS = ("int8", "float16")
+
+
+def truncate_vector(vector: list[float], dimensions: int) -> list[float]:
+    """Keep the leading `dimensions` components and re-normalize to unit length."""
+    head = np.asarray(vector[:dimensions], dtype=np.float32)
+    norm = float(np.linalg.norm(head))
+    if norm > 0:
+        head = head / norm
+    return head.tolist()
+
+
+def encode_vector(vector: list[float], codec: str = "int8") -> str:
+    """Encode a full-width vector for metadata storage."""
+    array = np.asarray(vector, dtype=np.float32)
+
+    if codec == "int8":
+        # Symmetric per-vector scale: the largest component maps to ±127
+        scale = float(np.max(np.abs(array))) / 127 or 1.0
+        quantized = np.clip(np.round(array / scale), -127, 127).astype(np.int8)
+        payload = np.float32(scale).tobytes() + quantized.tobytes()
+    elif codec == "float16":
+        payload = array.astype(np.float16).tobytes()
+    else:
+        raise ValueError(f"Unsupported vector codec: {codec}")
+
+    return base64.b64encode(payload).decode("ascii")
+
+
+def decode_vector(encoded: str, codec: str = "int8") -> np.ndarray:
+    """Decode a vector produced by encode_vector()."""
+    payload = base64.b64decode(encoded)
+
+    if codec == "int8":
+        scale = np.frombuffer(payload[:4], dtype=np.float32)[0]
+        return np.frombuffer(payload[4:], dtype=np.int8).astype(np.float32) * scale
+    if codec == "float16":
+        return np.frombuffer(payload, dtype=np.float16).astype(np.float32)
+
+    raise ValueError(f"Unsupported vector codec: {codec}")
+
+
+def cosine_similarity(a: np.ndarray, b: np.ndarray) -> float:
+    denom = float(np.linalg.norm(a) * np.linalg.norm(b))
+    return float(np.dot(a, b) / denom) if denom else 0.0
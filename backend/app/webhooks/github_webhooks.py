@@ -12,15 +12,16 @@
 
 
 from fastapi import APIRouter, Depends, HTTPException, Request
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.database import get_db
+from app.core.database import get_async_db
 from app.models.repository import Repository
 
 router = APIRouter()
 
 @router.post("/github")
-async def github_webhook(request: Request, db: Session = Depends(get_db)):
+async def github_webhook(request: Request, db: AsyncSession = Depends(get_async_db)):
     """Handle GitHub webhook for automatic analysis"""
     try:
         payload = await request.json()
@@ -31,7 +32,7 @@ async def github_webhook(request: Request, db: Session = Depends(get_db)):
             repo_full_name = payload["repository"]["full_name"]
 
             # Find repository in our database
-            repo = db.query(Repository).filter(Repository.repo_name == repo_full_name).first()
+            repo = await db.scalar(select(Repository).where(Repository.repo_name == repo_full_name))
             if repo:
                 return {
                     "message": f"PR #{pr_data['number']} from {repo_full_name} queued for analysis",
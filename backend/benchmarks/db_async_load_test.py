@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# ============================================================================
+# BENCHMARKS/DB_ASYNC_LOAD_TEST.PY — Sync vs Async DB Sessions Under Load
+# ============================================================================
+# Route handlers are `async def`. With the old synchronous Session every
+# db.query() blocked the event loop, so concurrent requests queued behind
+# each other's round trips. This drives the same read path (repository →
+# owner → latest analyses, the shape of most routes) through both stacks:
+#
+#   - /sync/...  → async handler + sync pg8000 Session (the old pattern)
+#   - /async/... → async handler + AsyncSession on the asyncpg pool
+#
+# Requests go through a real FastAPI app in-process (httpx ASGITransport),
+# N in flight at once. --db-latency-ms adds pg_sleep() to each request to
+# emulate a remote database's round trip (a local Postgres answers in
+# microseconds, which hides the blocking). The sync stack gets a pool as
+# large as --concurrency: with the old default pool (5 + 10 overflow) a
+# handler blocked in checkout also stalls the loop that would return the
+# other connections, and the run degrades into 30s pool timeouts.
+#
+# Usage (from backend/, against a scratch database — it creates tables and
+# inserts seed rows):
+#   DATABASE_URL=postgresql://... python benchmarks/db_async_load_test.py \
+#       --requests 2000 --concurrency 50 --db-latency-ms 5
+# ============================================================================
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+import httpx  # noqa: E402
+from fastapi import Depends, FastAPI, HTTPException  # noqa: E402
+from sqlalchemy import create_engine, select, text  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession  # noqa: E402
+from sqlalchemy.orm import Session, sessionmaker  # noqa: E402
+
+from app.core.database import Base, SessionLocal, async_engine, engine, get_async_db  # noqa: E402
+from app.models import pr_analysis, pull_request  # noqa: E402,F401 — register every mapper
+from app.models.analysis import Analysis  # noqa: E402
+from app.models.repository import Repository  # noqa: E402
+from app.models.user import User  # noqa: E402
+
+SEED_GITHUB_ID = "db-load-test"
+ANALYSES_PER_REPO = 50
+
+
+def seed(repositories: int) -> list[int]:
+    """Create one user with `repositories` repos × ANALYSES_PER_REPO analyses."""
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.github_id == SEED_GITHUB_ID).first()
+        if user is None:
+            user = User(github_id=SEED_GITHUB_ID, username=SEED_GITHUB_ID, access_token="none")
+            db.add(user)
+            db.flush()
+            for r in range(repositories):
+                repo = Repository(
+                    user_id=user.id, repo_name=f"bench/repo-{r}",
+                    repo_url=f"https://github.com/bench/repo-{r}", github_repo_id=f"bench-{r}",
+                )
+                db.add(repo)
+                db.flush()
+                db.add_all(
+                    Analysis(
+                        repository_id=repo.id, commit_hash=f"{r:04d}{a:036d}", summary="seed",
+                        changes_data={"summary": "seed"}, risk_level="low",
+                    )
+                    for a in range(ANALYSES_PER_REPO)
+                )
+            db.commit()
+        return [r.id for r in db.query(Repository).filter(Repository.user_id == user.id)]
+    finally:
+        db.close()
+
+
+def build_app(latency_seconds: float, concurrency: int) -> FastAPI:
+    app = FastAPI()
+    sync_engine = create_engine(engine.url, pool_size=concurrency, max_overflow=0, pool_pre_ping=True)
+    SyncSession = sessionmaker(autocommit=False, autoflush=False, bind=sync_engine)
+
+    def get_db():
+        db = SyncSession()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    @app.get("/sync/repos/{repo_id}/analyses")
+    async def sync_read(repo_id: int, db: Session = Depends(get_db)):
+        repository = db.query(Repository).filter(Repository.id == repo_id).first()
+        if not repository:
+            raise HTTPException(status_code=404)
+        db.query(User).filter(User.id == repository.user_id).first()
+        if latency_seconds:
+            db.execute(text("SELECT pg_sleep(:s)"), {"s": latency_seconds})
+        analyses = db.query(Analysis).filter(
+            Analysis.repository_id == repo_id
+        ).order_by(Analysis.created_at.desc()).limit(ANALYSES_PER_REPO).all()
+        return {"count": len(analyses)}
+
+    @app.get("/async/repos/{repo_id}/analyses")
+    async def async_read(repo_id: int, db: AsyncSession = Depends(get_async_db)):
+        repository = await db.scalar(select(Repository).where(Repository.id == repo_id))
+        if not repository:
+            raise HTTPException(status_code=404)
+        await db.scalar(select(User).where(User.id == repository.user_id))
+        if latency_seconds:
+            await db.execute(text("SELECT pg_sleep(:s)"), {"s": latency_seconds})
+        analyses = (await db.scalars(select(Analysis).where(
+            Analysis.repository_id == repo_id
+        ).order_by(Analysis.created_at.desc()).limit(ANALYSES_PER_REPO))).all()
+        return {"count": len(analyses)}
+
+    return app
+
+
+async def drive(app: FastAPI, prefix: str, repo_ids: list[int], requests: int, concurrency: int) -> dict:
+    latencies: list[float] = []
+    errors = 0
+    next_request = 0
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def worker():
+            nonlocal next_request, errors
+            while next_request < requests:
+                i = next_request
+                next_request += 1
+                started = time.perf_counter()
+                response = await client.get(f"/{prefix}/repos/{repo_ids[i % len(repo_ids)]}/analyses")
+                latencies.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "rps": requests / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "errors": errors,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--repositories", type=int, default=20)
+    parser.add_argument("--db-latency-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    repo_ids = seed(args.repositories)
+    app = build_app(args.db_latency_ms / 1000, args.concurrency)
+
+    print(f"{args.requests} requests, {args.concurrency} in flight, +{args.db_latency_ms:g}ms DB latency")
+    print(f"{'stack':<8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'errors':>8}")
+    for prefix in ("sync", "async"):
+        await drive(app, prefix, repo_ids, min(args.requests, 100), args.concurrency)  # warm the pools
+        result = await drive(app, prefix, repo_ids, args.requests, args.concurrency)
+        print(f"{prefix:<8}{result['rps']:>10.1f}{result['p50_ms']:>10.1f}{result['p95_ms']:>10.1f}{result['errors']:>8}")
+
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
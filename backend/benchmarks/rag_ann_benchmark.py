@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# ============================================================================
+# BENCHMARKS/RAG_ANN_BENCHMARK.PY — RAG Vector Store Recall vs Latency
+# ============================================================================
+# Compares ChromaDB HNSW settings and the compact vector mode used by
+# RAGService (RAG_VECTOR_DIMENSIONS + RAG_VECTOR_QUANTIZATION) on a
+# synthetic corpus, without calling the embedding API:
+#
+#   - Corpus: clustered unit vectors whose variance decays across dims,
+#     mimicking Matryoshka-style embeddings where the leading dims carry
+#     most of the signal (as gemini-embedding-001 does)
+#   - Ground truth: exact cosine top-k by brute force (numpy)
+#   - Each config reports recall@k, p50/p95 query latency, and the bytes
+#     per document spent on the HNSW vectors + encoded rerank vectors
+#
+# Usage (from backend/):
+#   python benchmarks/rag_ann_benchmark.py --docs 5000 --queries 200
+# ============================================================================
+
+import argparse
+import os
+import sys
+import time
+import uuid
+
+import chromadb
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services.vector_codec import (  # noqa: E402
+    cosine_similarity,
+    decode_vector,
+    encode_vector,
+    truncate_vector,
+)
+
+FULL_DIMENSIONS = 3072
+INSERT_BATCH = 1000
+
+# (label, hnsw params, compact dims or None, codec, rerank oversample)
+CONFIGS = [
+    ("full / ef=16", {"hnsw:M": 16, "hnsw:search_ef": 16}, None, None, 1),
+    ("full / ef=64", {"hnsw:M": 16, "hnsw:search_ef": 64}, None, None, 1),
+    ("full / ef=128", {"hnsw:M": 16, "hnsw:search_ef": 128}, None, None, 1),
+    ("d256 + int8 rerank x3", {"hnsw:M": 16, "hnsw:search_ef": 64}, 256, "int8", 3),
+    ("d768 + int8 rerank x3", {"hnsw:M": 16, "hnsw:search_ef": 64}, 768, "int8", 3),
+    ("d768 + f16 rerank x3", {"hnsw:M": 16, "hnsw:search_ef": 64}, 768, "float16", 3),
+]
+
+
+def build_corpus(docs: int, queries: int, clusters: int, seed: int) -> tuple[np.ndarray, np.ndarray]:
+    """Clustered unit vectors with per-dim variance decaying like 1/sqrt(i)."""
+    rng = np.random.default_rng(seed)
+    decay = 1 / np.sqrt(np.arange(1, FULL_DIMENSIONS + 1))
+
+    centers = rng.normal(size=(clusters, FULL_DIMENSIONS)) * decay
+    assignment = rng.integers(0, clusters, size=docs + queries)
+    vectors = centers[assignment] + 0.6 * rng.normal(size=(docs + queries, FULL_DIMENSIONS)) * decay
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    vectors = vectors.astype(np.float32)
+    return vectors[:docs], vectors[docs:]
+
+
+def exact_top_k(corpus: np.ndarray, queries: np.ndarray, k: int) -> list[set[int]]:
+    scores = queries @ corpus.T
+    return [set(np.argsort(-row)[:k].tolist()) for row in scores]
+
+
+def run_config(client, corpus, queries, truth, k, label, hnsw, dims, codec, oversample) -> dict:
+    collection = client.create_collection(
+        name=f"bench_{uuid.uuid4().hex[:8]}",
+        metadata={"hnsw:space": "l2", "hnsw:construction_ef": 100, **hnsw},
+    )
+
+    payload_bytes = 0
+    for start in range(0, len(corpus), INSERT_BATCH):
+        batch = corpus[start:start + INSERT_BATCH]
+        ids = [str(start + i) for i in range(len(batch))]
+        if dims is None:
+            collection.add(ids=ids, embeddings=batch.tolist())
+        else:
+            encoded = [encode_vector(v, codec) for v in batch]
+            payload_bytes += sum(len(e) for e in encoded)
+            collection.add(
+                ids=ids,
+                embeddings=[truncate_vector(v, dims) for v in batch],
+                metadatas=[{"full_vector": e} for e in encoded],
+            )
+
+    latencies = []
+    hits = 0
+    for query, expected in zip(queries, truth, strict=True):
+        started = time.perf_counter()
+        result = collection.query(
+            query_embeddings=[query.tolist() if dims is None else truncate_vector(query, dims)],
+            n_results=k * oversample,
+            include=["metadatas"] if dims else [],
+        )
+        found = result["ids"][0]
+        if dims is not None:
+            # Rerank candidates on the decoded full vectors, as RAGService does
+            scored = [
+                (cosine_similarity(query, decode_vector(meta["full_vector"], codec)), doc_id)
+                for doc_id, meta in zip(found, result["metadatas"][0], strict=True)
+            ]
+            found = [doc_id for _, doc_id in sorted(scored, reverse=True)]
+        latencies.append((time.perf_counter() - started) * 1000)
+        hits += len(expected & {int(doc_id) for doc_id in found[:k]})
+
+    client.delete_collection(collection.name)
+
+    index_dims = dims or FULL_DIMENSIONS
+    return {
+        "config": label,
+        "recall": hits / (len(queries) * k),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "vector_bytes_per_doc": index_dims * 4 + payload_bytes / len(corpus),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--clusters", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    print(f"🚀 Building synthetic corpus: {args.docs} docs × {FULL_DIMENSIONS} dims, {args.queries} queries...")
+    corpus, queries = build_corpus(args.docs, args.queries, args.clusters, args.seed)
+    truth = exact_top_k(corpus, queries, args.top_k)
+
+    client = chromadb.EphemeralClient()
+    print(f"\n{'config':<24}{'recall@' + str(args.top_k):>10}{'p50 ms':>10}{'p95 ms':>10}{'bytes/doc':>12}")
+    for label, hnsw, dims, codec, oversample in CONFIGS:
+        row = run_config(client, corpus, queries, truth, args.top_k, label, hnsw, dims, codec, oversample)
+        print(f"{row['config']:<24}{row['recall']:>10.3f}{row['p50_ms']:>10.2f}"
+              f"{row['p95_ms']:>10.2f}{row['vector_bytes_per_doc']:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
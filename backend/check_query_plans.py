@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# ============================================================================
+# CHECK_QUERY_PLANS.PY — EXPLAIN Regression Check for Hot History Queries
+# ============================================================================
+# Runs EXPLAIN on the queries the analysis routes issue on every request
+# and fails (exit 1) if one of them falls back to a sequential scan:
+#   1. create_analysis dedupe  → analysis_results (repository_id, commit_hash)
+#   2. get_analyses pages      → analysis_results (repository_id, created_at
+#                                DESC, id DESC), seeking to the cursor with
+#                                no Sort — also without a repository filter
+#   3. per-PR lookups          → pr_analysis_results (repository_id, pr_number)
+#   4. get_pr_analyses pages   → same keyset shape as 2.
+#   5. get_github_user         → users (access_token_hash), on a token-cache miss
+#
+# The planner's choice depends on table statistics, so the check first
+# seeds a realistic spread (SEED_REPOSITORIES repos × SEED_ROWS_PER_REPO
+# analyses and PR analyses) and ANALYZEs — all inside one transaction that
+# is rolled back, leaving the database untouched. enable_seqscan and
+# enable_sort are also switched off: if no index can serve a query,
+# Postgres still has to pick the disabled plan and the check fails.
+#
+# Usage (from backend/, after migrations): python check_query_plans.py
+# ============================================================================
+
+import json
+import os
+import sys
+from datetime import UTC, datetime, timedelta
+
+from sqlalchemy import select, text
+
+sys.path.append(os.path.dirname(__file__))
+
+from app.core.database import engine  # noqa: E402
+from app.core.pagination import encode_cursor, keyset_page  # noqa: E402
+from app.models import pull_request, repository  # noqa: E402,F401
+from app.models.analysis import Analysis  # noqa: E402
+from app.models.pr_analysis import PRAnalysis  # noqa: E402
+from app.models.user import User  # noqa: E402
+
+SEED_REPOSITORIES = 50
+SEED_ROWS_PER_REPO = 200
+
+SEED_SQL = [
+    """
+    INSERT INTO users (github_id, username, access_token)
+    VALUES ('plan-check', 'plan-check', 'none')
+    """,
+    """
+    INSERT INTO repositories (user_id, repo_name, repo_url, github_repo_id)
+    SELECT u.id, 'plan-check/' || g, 'https://github.com/plan-check/' || g, 'plan-check-' || g
+    FROM users u, generate_series(1, :repos) g
+    WHERE u.github_id = 'plan-check'
+    """,
+    """
+    INSERT INTO analysis_results (repository_id, commit_hash, summary, changes_data, risk_level, created_at)
+    SELECT r.id, md5(r.id || '-' || g), 'seed', '{}', 'low', now() - g * interval '1 hour'
+    FROM repositories r, generate_series(1, :rows) g
+    WHERE r.user_id = (SELECT id FROM users WHERE github_id = 'plan-check')
+    """,
+    """
+    INSERT INTO pr_analysis_results (repository_id, pr_number, summary, full_analysis, risk_level,
+                                     change_type, analysis_data, created_at)
+    SELECT r.id, mod(g, 40), 'seed', 'seed', 'low', 'other', '{}', now() - g * interval '1 hour'
+    FROM repositories r, generate_series(1, :rows) g
+    WHERE r.user_id = (SELECT id FROM users WHERE github_id = 'plan-check')
+    """,
+    "ANALYZE analysis_results",
+    "ANALYZE pr_analysis_results",
+]
+
+# A cursor in the middle of the history, as a page-2+ request carries
+CURSOR = encode_cursor(datetime.now(UTC) - timedelta(hours=SEED_ROWS_PER_REPO // 2), 1_000_000)
+
+
+def build_checks(repo_id: int) -> list[tuple]:
+    """(name, table, statement, forbid_sort, column the index must seek on)"""
+    return [
+        (
+            "create_analysis dedupe",
+            "analysis_results",
+            select(Analysis).where(Analysis.repository_id == repo_id, Analysis.commit_hash == "0" * 40),
+            False,
+            "repository_id",
+        ),
+        (
+            "get_analyses history page",
+            "analysis_results",
+            keyset_page(
+                select(Analysis.id, Analysis.created_at).where(Analysis.repository_id == repo_id),
+                Analysis.created_at, Analysis.id, CURSOR, 50,
+            ),
+            True,
+            "repository_id",
+        ),
+        (
+            "get_analyses history page (all repositories)",
+            "analysis_results",
+            keyset_page(select(Analysis.id, Analysis.created_at), Analysis.created_at, Analysis.id, CURSOR, 50),
+            True,
+            "created_at",
+        ),
+        (
+            "PR analysis lookup",
+            "pr_analysis_results",
+            select(PRAnalysis).where(PRAnalysis.repository_id == repo_id, PRAnalysis.pr_number == 1),
+            False,
+            "repository_id",
+        ),
+        (
+            "get_pr_analyses history page",
+            "pr_analysis_results",
+            keyset_page(
+                select(PRAnalysis.id, PRAnalysis.created_at).where(PRAnalysis.repository_id == repo_id),
+                PRAnalysis.created_at, PRAnalysis.id, CURSOR, 50,
+            ),
+            True,
+            "repository_id",
+        ),
+        (
+            "get_github_user token lookup",
+            "users",
+            select(User).where(User.access_token_hash == User.hash_token("plan-check")),
+            False,
+            "access_token_hash",
+        ),
+    ]
+
+
+def plan_nodes(node: dict):
+    yield node
+    for child in node.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+def check_plan(plan: dict, table: str, forbid_sort: bool, seek_column: str) -> list[str]:
+    problems = []
+    for node in plan_nodes(plan):
+        if node["Node Type"] == "Seq Scan" and node.get("Relation Name") == table:
+            problems.append(f"sequential scan on {table}")
+        if forbid_sort and node["Node Type"] in ("Sort", "Incremental Sort"):
+            problems.append(f"{node['Node Type']} on {node.get('Sort Key')}")
+        if (
+            node["Node Type"] in ("Index Scan", "Index Only Scan")
+            and node.get("Relation Name") == table
+            and seek_column not in node.get("Index Cond", "")
+        ):
+            problems.append(f"{node['Node Type']} on {node['Index Name']} does not seek on {seek_column}")
+    return problems
+
+
+def main() -> int:
+    failures = 0
+    with engine.connect() as connection:
+        for sql in SEED_SQL:
+            connection.execute(text(sql), {"repos": SEED_REPOSITORIES, "rows": SEED_ROWS_PER_REPO})
+        repo_id = connection.execute(
+            text("SELECT min(r.id) FROM repositories r JOIN users u ON u.id = r.user_id WHERE u.github_id = 'plan-check'")
+        ).scalar()
+        connection.execute(text("SET LOCAL enable_seqscan = off"))
+        connection.execute(text("SET LOCAL enable_sort = off"))
+
+        for name, table, statement, forbid_sort, seek_column in build_checks(repo_id):
+            sql = statement.compile(engine, compile_kwargs={"literal_binds": True})
+            plan = connection.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            root = plan[0]["Plan"]
+            problems = check_plan(root, table, forbid_sort, seek_column)
+            indexes = sorted({n["Index Name"] for n in plan_nodes(root) if "Index Name" in n})
+            if problems:
+                failures += 1
+                print(f"❌ {name}: {'; '.join(problems)}")
+            else:
+                print(f"✅ {name}: {', '.join(indexes)}")
+
+        connection.rollback()  # drop the seed rows and their statistics
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
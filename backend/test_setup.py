@@ -7,7 +7,7 @@
 #   2. Validates .env settings are loaded (DB URL, Redis, Gemini key)
 #   3. Tests PostgreSQL database connection
 #   4. Tests Redis connection
-#   5. Creates all database tables if they don't exist
+#   5. Applies database migrations (creates tables if they don't exist)
 #
 # Usage: python test_setup.py
 # ============================================================================
@@ -50,11 +50,10 @@ def test_settings():
 def create_database():
     """Create database tables"""
     try:
-        from app.core.database import Base, engine
-        from app.models import analysis, repository, user
+        from app.core.migrations import upgrade_database
 
-        # Create all tables
-        Base.metadata.create_all(bind=engine)
+        # Apply all migrations (creates the tables on a fresh database)
+        upgrade_database()
         print("✅ Database tables created!")
         return True
     except Exception as e:
@@ -0,0 +1,11 @@
+# ============================================================================
+# TESTS/CONFTEST.PY — Settings for Unit Tests
+# ============================================================================
+# Settings() requires the secrets below; unit tests never call Gemini or
+# sign a JWT, so placeholders are enough (a real .env still wins).
+# ============================================================================
+
+import os
+
+os.environ.setdefault("GEMINI_API_KEY", "test-key-not-real")
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
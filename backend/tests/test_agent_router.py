@@ -0,0 +1,30 @@
+# ============================================================================
+# TESTS/TEST_AGENT_ROUTER.PY — File Classification Fails Closed
+# ============================================================================
+# A file type the router does not know must be reviewed like code; only
+# documentation extensions may let the security agent skip a change.
+#
+# Run: cd backend && python -m pytest tests
+# ============================================================================
+
+import pytest
+
+from app.services.agents.router import agent_router, classify_file
+
+
+@pytest.mark.parametrize("filename", ["server/api.mjs", "lib/x.cjs", "main.tf", "app.dart", "templates/index.html",
+                                      "docs/build.py", "docs/conf.mjs"])
+def test_unknown_or_docs_directory_sources_are_code(filename):
+    assert classify_file(filename) == "code"
+
+
+@pytest.mark.parametrize("filename", ["README.md", "docs/guide.rst", "CHANGELOG.txt"])
+def test_doc_extensions_are_docs(filename):
+    assert classify_file(filename) == "docs"
+
+
+def test_unknown_extension_is_not_skipped_by_security():
+    decisions = agent_router.route([{"filename": "server/api.mjs", "additions": 60, "deletions": 0}], {})
+    actions = {d["agent"]: d["action"] for d in decisions}
+    assert actions["SecurityAgent"] != "skip"
+    assert actions["PerformanceAgent"] != "skip"
@@ -0,0 +1,42 @@
+# ============================================================================
+# TESTS/TEST_CONTEXT_CACHE.PY — Reported Savings of the Shared Agent Prefix
+# ============================================================================
+# Only provider mode sends agents the instructions without the prefix, so
+# only provider mode (or provider-reported cached tokens) may count savings.
+#
+# Run: cd backend && python -m pytest tests
+# ============================================================================
+
+from app.services.agents.context_cache import AgentContextCache, SharedPrefix
+
+AGENTS = [{"_agent": "security"}, {"_agent": "performance"}, {"_agent": "architecture"}]
+
+
+def make_prefix(mode: str, reused: bool = False) -> SharedPrefix:
+    return SharedPrefix("diff --git a/x.py b/x.py", "key", 1000, mode, reused=reused)
+
+
+def test_provider_mode_saves_prefix_for_all_but_the_upload():
+    report = AgentContextCache().report(make_prefix("provider"), AGENTS)
+    assert report["input_tokens_saved"] == 2000
+
+
+def test_reused_provider_handle_saves_prefix_for_every_agent():
+    report = AgentContextCache().report(make_prefix("provider", reused=True), AGENTS)
+    assert report["input_tokens_saved"] == 3000
+    assert report["reused_cache"] is True
+
+
+def test_local_and_implicit_modes_report_no_savings():
+    # Agents only strip the prefix in provider mode
+    for mode in ("local", "implicit"):
+        report = AgentContextCache().report(make_prefix(mode, reused=True), AGENTS)
+        assert report["mode"] == mode
+        assert report["input_tokens_saved"] == 0
+
+
+def test_provider_reported_cached_tokens_take_precedence():
+    results = [{**agent, "_usage": {"cached_tokens": 700}} for agent in AGENTS]
+    report = AgentContextCache().report(make_prefix("local"), results)
+    assert report["provider_cached_tokens"] == 2100
+    assert report["input_tokens_saved"] == 2100
@@ -0,0 +1,108 @@
+# ============================================================================
+# TESTS/TEST_JSON_STREAM.PY — IncrementalJSONParser Chunk-Boundary Fuzzing
+# ============================================================================
+# Gemini may split its JSON output anywhere — inside an escape sequence, a
+# surrogate pair or a key. Every random split of a document must yield the
+# same values json.loads() reads from the whole text.
+#
+# Run: cd backend && python -m pytest tests
+# ============================================================================
+
+import json
+import random
+
+import pytest
+
+from app.services.llm.json_stream import IncrementalJSONParser
+
+# Characters that exercise every escape path: quotes, backslashes, control
+# characters, \u escapes, astral characters (surrogate pairs when ASCII-escaped)
+ALPHABET = ['a', 'Z', ' ', '"', '\\', '/', '\n', '\t', '\b', '\x01', 'é', '中', '😀', '\U0001f680', 'u', '0', 'd', '8']
+
+
+def random_text(rng: random.Random, max_length: int = 40) -> str:
+    return "".join(rng.choice(ALPHABET) for _ in range(rng.randint(0, max_length)))
+
+
+def random_value(rng: random.Random, depth: int = 0):
+    kinds = ["text", "int", "float", "bool", "null"] + (["list", "dict"] if depth < 2 else [])
+    kind = rng.choice(kinds)
+    if kind == "text":
+        return random_text(rng)
+    if kind == "int":
+        return rng.randint(-10**6, 10**6)
+    if kind == "float":
+        return round(rng.uniform(-100, 100), 3)
+    if kind == "bool":
+        return rng.random() < 0.5
+    if kind == "null":
+        return None
+    if kind == "list":
+        return [random_value(rng, depth + 1) for _ in range(rng.randint(0, 4))]
+    return {random_text(rng, 8): random_value(rng, depth + 1) for _ in range(rng.randint(0, 3))}
+
+
+def random_document(rng: random.Random) -> dict:
+    document = {random_text(rng, 10): random_value(rng) for _ in range(rng.randint(1, 6))}
+    # Always some long string fields: deltas are the path under test
+    for name in ("summary", "detailed_analysis"):
+        document[name] = random_text(rng, 400)
+    return document
+
+
+def random_chunks(rng: random.Random, text: str) -> list[str]:
+    cuts = sorted(rng.sample(range(1, len(text)), min(len(text) - 1, rng.randint(1, 60))))
+    return [text[start:end] for start, end in zip([0, *cuts], [*cuts, len(text)], strict=True)]
+
+
+def parse(chunks: list[str]) -> tuple[dict, dict, dict, bool]:
+    parser = IncrementalJSONParser()
+    fields, deltas, items = {}, {}, {}
+    for chunk in chunks:
+        for update in parser.feed(chunk):
+            if update["type"] == "field":
+                fields[update["field"]] = update["value"]
+            elif update["type"] == "delta":
+                deltas[update["field"]] = deltas.get(update["field"], "") + update["text"]
+            else:
+                items.setdefault(update["field"], []).append((update["index"], update["value"]))
+    return fields, deltas, items, parser.done
+
+
+@pytest.mark.parametrize("seed", range(300))
+def test_random_splits_match_json_loads(seed):
+    rng = random.Random(seed)
+    document = random_document(rng)
+    text = json.dumps(document, ensure_ascii=rng.random() < 0.5, indent=rng.choice([None, 2]))
+    text = rng.choice(["", "```json\n"]) + text + rng.choice(["", "\n```"])
+
+    fields, deltas, items, done = parse(random_chunks(rng, text))
+
+    assert done
+    assert fields == document
+    for name, value in document.items():
+        if isinstance(value, str):
+            assert deltas.get(name, "") == value
+        if isinstance(value, list):
+            assert items.get(name, []) == list(enumerate(value))
+
+
+def test_split_inside_every_escape_sequence():
+    document = {"summary": 'q"b\\s\\u12 \U0001f600 é\n\\\\ud83d end'}
+    text = json.dumps(document)  # ASCII: 😀 → "😀"
+
+    for split in range(1, len(text)):
+        fields, deltas, _, done = parse([text[:split], text[split:]])
+        assert done
+        assert fields == document
+        assert deltas["summary"] == document["summary"]
+
+
+def test_deltas_never_contain_half_a_surrogate_pair():
+    text = json.dumps({"summary": "\U0001f600" * 20})
+
+    parser = IncrementalJSONParser()
+    for char in text:
+        for update in parser.feed(char):
+            if update["type"] == "delta":
+                assert not any("\ud800" <= c <= "\udfff" for c in update["text"])
@@ -0,0 +1,103 @@
+# ============================================================================
+# TESTS/TEST_LLM_GATEWAY.PY — Queued Admission Paths of the LLM Gateway
+# ============================================================================
+# A waiter that times out or is cancelled must not block the lane, and a
+# call queued on the token budget alone (nothing in flight to release a
+# slot) must be woken by the refill.
+#
+# Run: cd backend && python -m pytest tests
+# ============================================================================
+
+import asyncio
+
+import pytest
+
+from app.core.config import settings
+from app.services.llm.gateway import LLMGateway, LLMQueueTimeout, _ModelLane
+
+
+@pytest.fixture(autouse=True)
+def gateway_settings(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_OUTPUT_TOKEN_ESTIMATE", 0)
+    monkeypatch.setattr(settings, "LLM_QUEUE_TIMEOUT_SECONDS", 0.2)
+
+
+def make_gateway(concurrency: int = 1, tokens_per_minute: int = 60_000) -> tuple[LLMGateway, _ModelLane]:
+    gateway = LLMGateway()
+    lane = gateway._lanes["test-model"] = _ModelLane("test-model", concurrency, tokens_per_minute)
+    return gateway, lane
+
+
+async def hold_slot(gateway: LLMGateway, release: asyncio.Event) -> None:
+    async with gateway.slot("test-model", 100):
+        await release.wait()
+
+
+@pytest.mark.asyncio
+async def test_timed_out_waiter_does_not_block_the_lane():
+    gateway, lane = make_gateway()
+    release = asyncio.Event()
+    holder = asyncio.create_task(hold_slot(gateway, release))
+    await asyncio.sleep(0)
+
+    with pytest.raises(LLMQueueTimeout):
+        async with gateway.slot("test-model", 100):
+            pass
+
+    release.set()
+    await holder
+    async with asyncio.timeout(0.05):  # admitted at once, not queued behind the dead waiter
+        async with gateway.slot("test-model", 100):
+            pass
+    assert lane.in_flight == 0
+    assert lane.timeouts == 1
+    assert not lane._queue
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_block_the_lane():
+    gateway, lane = make_gateway(concurrency=2)
+    release = asyncio.Event()
+    holders = [asyncio.create_task(hold_slot(gateway, release)) for _ in range(2)]
+    await asyncio.sleep(0)
+
+    waiter = asyncio.create_task(hold_slot(gateway, release))
+    await asyncio.sleep(0.01)
+    assert lane.queue_depth() == 1
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+
+    release.set()
+    await asyncio.gather(*holders)
+    assert lane.in_flight == 0
+    assert not lane._queue
+
+
+@pytest.mark.asyncio
+async def test_token_debt_with_nothing_in_flight_is_woken_by_the_refill():
+    gateway, lane = make_gateway(tokens_per_minute=60_000)  # 1000 tokens / s
+    lane.adjust_tokens(lane.available_tokens() - 100)  # 100 left, nothing in flight
+
+    # 150 tokens short → the refill covers it in ~0.15 s, before the 0.2 s timeout
+    async with gateway.slot("test-model", 250):
+        assert lane.in_flight == 1
+
+    assert lane.in_flight == 0
+    assert lane.timeouts == 0
+
+
+@pytest.mark.asyncio
+async def test_lane_recovers_after_a_token_starved_waiter_timed_out():
+    gateway, lane = make_gateway(tokens_per_minute=6_000)  # 100 tokens / s
+    lane.adjust_tokens(lane.available_tokens() + 1_000)  # deep debt: 10 s to refill
+
+    with pytest.raises(LLMQueueTimeout):
+        async with gateway.slot("test-model", 300):
+            pass
+
+    lane.adjust_tokens(-2_000)  # budget back
+    async with asyncio.timeout(0.05):
+        async with gateway.slot("test-model", 300):
+            pass
+    assert not lane._queue
@@ -275,8 +275,9 @@ export default function Dashboard() {
   // overall_score is stored out of 10 by the AI — normalise to /100 for display
   const overallAvg    = overallAvgRaw > 10 ? overallAvgRaw : overallAvgRaw * 10;
   const highRisk      = analyses.filter(a => ['high', 'critical'].includes(a.risk_level?.toLowerCase())).length;
-  // recommendations live inside changes_data for full analyses
+  // history list items carry recommendation_count; full analyses keep the list in changes_data
   const totalIssues = analyses.reduce((acc, a) => {
+    if (a.recommendation_count != null) return acc + a.recommendation_count;
     const recs = a.recommendations ?? a.changes_data?.recommendations ?? [];
     return acc + (Array.isArray(recs) ? recs.length : 0);
   }, 0);